@@ -0,0 +1,37 @@
+"""
+Benchmark de la generación de las imágenes de los códigos de barras, compara tiempo y tamaño por formato
+
+    python -m benchmarks.codigo_barras --cantidad 200
+"""
+
+import argparse
+import time
+
+from pjecz_casiopea_api_oauth2.services.codigo_barras import BASE_12_MINIMO, FORMATOS, renderizar_ean13
+
+DPIS = (300, 200, 150)
+
+
+def digito_verificador(base_12: str) -> str:
+    """Dígito verificador EAN-13"""
+    suma = sum(int(digito) * (1 if i % 2 == 0 else 3) for i, digito in enumerate(base_12))
+    return str((10 - (suma % 10)) % 10)
+
+
+def medir(cantidad: int) -> None:
+    """Generar cantidad de imágenes por cada formato y dpi, sin usar el LRU, e imprimir los resultados"""
+    codigos = [str(BASE_12_MINIMO + numero) for numero in range(cantidad)]
+    codigos = [base_12 + digito_verificador(base_12) for base_12 in codigos]
+    print(f"{'formato':<14}{'dpi':>5}{'ms/imagen':>12}{'bytes':>10}")
+    for formato in FORMATOS:
+        for dpi in DPIS if formato != "svg" else (0,):
+            inicio = time.perf_counter()
+            tamanos = [len(renderizar_ean13.__wrapped__(codigo, formato, dpi)) for codigo in codigos]
+            duracion = time.perf_counter() - inicio
+            print(f"{formato:<14}{dpi:>5}{duracion / cantidad * 1000:>12.2f}{sum(tamanos) // cantidad:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cantidad", type=int, default=200)
+    medir(parser.parse_args().cantidad)
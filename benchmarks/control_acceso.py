@@ -0,0 +1,53 @@
+"""
+Benchmark de las solicitudes a Control Acceso con el cliente HTTP compartido
+
+Primero levantar el servidor simulado (ver control_acceso_stub.py) y después ejecutar:
+
+    python -m benchmarks.control_acceso --total 500 --concurrencia 50
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from pjecz_casiopea_api_oauth2.config.settings import get_settings
+from pjecz_casiopea_api_oauth2.dependencies.control_acceso import crear_cliente_http, solicitar_codigo_acceso
+
+
+async def medir(total: int, concurrencia: int) -> None:
+    """Enviar total solicitudes con la concurrencia dada e imprimir el rendimiento"""
+    settings = get_settings()
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias = []
+
+    async def solicitar(cliente, numero: int) -> None:
+        payload = {
+            "aplicacion": settings.CONTROL_ACCESO_APLICACION,
+            "referencia": str(numero),
+            "fecha": datetime.now().isoformat(),
+        }
+        async with semaforo:
+            inicio = time.perf_counter()
+            await solicitar_codigo_acceso(cliente, settings, payload)
+            latencias.append(time.perf_counter() - inicio)
+
+    async with crear_cliente_http(settings) as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(solicitar(cliente, numero) for numero in range(total)))
+        duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    print(f"Solicitudes: {total}, concurrencia: {concurrencia}, duración: {duracion:.2f} s")
+    print(f"Rendimiento: {total / duracion:.1f} solicitudes/s")
+    print(
+        f"Latencia p50: {latencias[len(latencias) // 2] * 1000:.1f} ms, p99: {latencias[int(len(latencias) * 0.99)] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--total", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(medir(args.total, args.concurrencia))
@@ -0,0 +1,31 @@
+"""
+Control Acceso simulado, para medir sin depender del servicio real
+
+Ejecutar con una latencia de 250 ms:
+
+    CONTROL_ACCESO_STUB_LATENCIA=0.25 uvicorn benchmarks.control_acceso_stub:app --port 8001
+
+Y configurar CONTROL_ACCESO_URL=http://127.0.0.1:8001/accesos
+"""
+
+import asyncio
+import itertools
+import os
+
+from fastapi import FastAPI, Header
+
+# PNG de un pixel
+IMAGEN_PNG = (
+    "data:image/png;base64," "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+LATENCIA = float(os.getenv("CONTROL_ACCESO_STUB_LATENCIA", "0.25"))
+
+app = FastAPI(title="Control Acceso simulado")
+consecutivo = itertools.count(1)
+
+
+@app.post("/accesos")
+async def accesos(payload: dict, x_api_key: str = Header(default="")):
+    """Entregar un código de acceso después de la latencia configurada"""
+    await asyncio.sleep(LATENCIA)
+    return {"success": True, "message": "Simulado", "idAcceso": next(consecutivo), "imagen": IMAGEN_PNG}
@@ -0,0 +1,49 @@
+"""
+Benchmark del formato de fechas en español de los correos, setlocale y strftime contra formatear_fecha
+
+    python -m benchmarks.fechas --cantidad 100000
+"""
+
+import argparse
+import locale
+import time
+from datetime import datetime, timedelta
+
+from pjecz_casiopea_api_oauth2.dependencies.fechas import formatear_fecha
+from pjecz_casiopea_api_oauth2.services.sendmail import PlantillaEmailBase
+
+
+def con_setlocale(fecha: datetime) -> str:
+    """Como antes: configurar el locale en cada correo y luego strftime"""
+    try:
+        locale.setlocale(locale.LC_TIME, "es_ES.utf8")
+    except locale.Error:
+        locale.setlocale(locale.LC_TIME, "es_ES")
+    return fecha.strftime(PlantillaEmailBase.FORMATO_FECHA_Y_HORA)
+
+
+def sin_setlocale(fecha: datetime) -> str:
+    """Ahora: tablas en español en memoria"""
+    return formatear_fecha(fecha, PlantillaEmailBase.FORMATO_FECHA_Y_HORA)
+
+
+def medir(cantidad: int) -> None:
+    """Formatear cantidad de fechas distintas con cada método e imprimir los resultados"""
+    inicio = datetime(2026, 1, 1, 8, 0)
+    fechas = [inicio + timedelta(minutes=15 * numero) for numero in range(cantidad)]
+    for nombre, funcion in (("setlocale", con_setlocale), ("formatear_fecha", sin_setlocale)):
+        try:
+            comienzo = time.perf_counter()
+            for fecha in fechas:
+                funcion(fecha)
+            duracion = time.perf_counter() - comienzo
+        except locale.Error:
+            print(f"{nombre:<16} no está instalado el locale es_ES en este sistema")
+            continue
+        print(f"{nombre:<16}{duracion / cantidad * 1_000_000:>10.2f} µs/fecha   {funcion(fechas[-1])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cantidad", type=int, default=100_000)
+    medir(parser.parse_args().cantidad)
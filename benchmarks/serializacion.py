@@ -0,0 +1,128 @@
+"""
+Benchmark de la serialización de las respuestas por tipo, compara el camino de FastAPI con json y con orjson contra directo a bytes
+
+    python -m benchmarks.serializacion --cantidad 2000
+"""
+
+import argparse
+import asyncio
+import uuid
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from types import SimpleNamespace
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from pjecz_casiopea_api_oauth2.dependencies.fastapi_pagination_custom_page import CustomPage
+from pjecz_casiopea_api_oauth2.dependencies.respuestas import RespuestaJSON
+from pjecz_casiopea_api_oauth2.schemas.cit_catalogos import CitCatalogoServicioOut, CitCatalogosOut, OneCitCatalogosOut
+from pjecz_casiopea_api_oauth2.schemas.cit_categorias import CitCategoriaOut
+from pjecz_casiopea_api_oauth2.schemas.cit_citas import CitCitaOut
+from pjecz_casiopea_api_oauth2.schemas.oficinas import OficinaOut, OneOficinaOut
+
+
+def crear_oficina(numero: int) -> OficinaOut:
+    """Oficina de ejemplo"""
+    return OficinaOut(
+        clave=f"OF{numero}",
+        descripcion=f"JUZGADO {numero} DE PRIMERA INSTANCIA EN MATERIA CIVIL DEL DISTRITO JUDICIAL DE SALTILLO",
+        descripcion_corta=f"JUZGADO {numero} CIVIL SALTILLO",
+        domicilio_clave="DOM1",
+        domicilio_completo="BLVD. NAZARIO ORTIZ GARZA S/N, COL. ALPES, SALTILLO, COAHUILA, C.P. 25270",
+        domicilio_edificio="CIUDAD JUDICIAL",
+        es_jurisdiccional=True,
+    )
+
+
+def crear_cit_cita(numero: int) -> SimpleNamespace:
+    """Cita de ejemplo, con atributos como los de un registro de SQLAlchemy"""
+    inicio = datetime(2026, 10, 19, 9, 0) + timedelta(minutes=15 * numero)
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        cit_cliente_nombre="MARÍA GUADALUPE HERNÁNDEZ LÓPEZ",
+        cit_servicio_clave="SRV1",
+        cit_servicio_descripcion="REVISIÓN DE EXPEDIENTE",
+        oficina_clave=f"OF{numero % 50}",
+        oficina_descripcion="JUZGADO PRIMERO DE PRIMERA INSTANCIA EN MATERIA CIVIL DEL DISTRITO JUDICIAL DE SALTILLO",
+        oficina_descripcion_corta="JUZGADO 1 CIVIL SALTILLO",
+        inicio=inicio,
+        termino=inicio + timedelta(minutes=15),
+        notas="Expediente 123/2026",
+        estado="PENDIENTE",
+        asistencia=False,
+        codigo_asistencia="1234",
+        codigo_acceso_url=None,
+        creado=inicio - timedelta(days=3),
+        puede_cancelarse=True,
+        codigo_barras="7501234567890",
+        codigo_barras_url="https://storage.example.com/codigos_barras/7501234567890.png",
+    )
+
+
+def crear_respuestas() -> dict:
+    """Un ejemplo de cada tipo de respuesta: detalle, paginado de catálogo, paginado de citas y paquete de catálogos"""
+    oficinas = [crear_oficina(numero) for numero in range(100)]
+    cit_citas = [CitCitaOut.model_validate(crear_cit_cita(numero)) for numero in range(100)]
+    cit_servicios = [
+        CitCatalogoServicioOut(
+            cit_categoria_clave="CAT",
+            clave=f"SRV{numero}",
+            descripcion=f"SERVICIO {numero}",
+            duracion=time(0, 15),
+            documentos_limite=10,
+            dias_habilitados="LMXJV",
+        )
+        for numero in range(20)
+    ]
+    paquete = OneCitCatalogosOut(
+        success=True,
+        message="Catálogos del formulario de citas",
+        data=CitCatalogosOut(
+            version="0" * 32,
+            cit_categorias=[CitCategoriaOut(clave="CAT", nombre="CATEGORÍA")],
+            cit_servicios=cit_servicios,
+            oficinas=oficinas,
+            oficinas_servicios={oficina.clave: [cit_servicio.clave for cit_servicio in cit_servicios] for oficina in oficinas},
+            dias_disponibles=[date(2026, 10, 19) + timedelta(days=dia) for dia in range(90)],
+        ),
+    )
+    return {
+        "OneOficinaOut": (OneOficinaOut, OneOficinaOut(success=True, message="Oficina OF1", data=oficinas[1])),
+        "CustomPage[OficinaOut] 25": (
+            CustomPage[OficinaOut],
+            CustomPage[OficinaOut](success=True, message="Consulta exitosa", data=oficinas[:25], total=100, limit=25, offset=0),
+        ),
+        "CustomPage[CitCitaOut] 100": (
+            CustomPage[CitCitaOut],
+            CustomPage[CitCitaOut](success=True, message="Consulta exitosa", data=cit_citas, total=100, limit=100, offset=0),
+        ),
+        "OneCitCatalogosOut": (OneCitCatalogosOut, paquete),
+    }
+
+
+async def medir(cantidad: int) -> None:
+    """Serializar cantidad de veces cada tipo de respuesta por cada camino e imprimir los resultados"""
+    print(f"{'tipo':<28}{'camino':<18}{'us/respuesta':>14}{'bytes':>10}")
+    for nombre, (modelo, contenido) in crear_respuestas().items():
+        # Como antes y solo con orjson: FastAPI valida contra el response_model, convierte a diccionarios y luego serializa
+        campo = create_model_field(name="Response", type_=modelo, mode="serialization")
+        for camino, clase in (("fastapi + json", JSONResponse), ("fastapi + orjson", RespuestaJSON)):
+            inicio = perf_counter()
+            for _ in range(cantidad):
+                cuerpo = clase(await serialize_response(field=campo, response_content=contenido)).body
+            duracion = perf_counter() - inicio
+            print(f"{nombre:<28}{camino:<18}{duracion / cantidad * 1_000_000:>14.1f}{len(cuerpo):>10}")
+        # Ahora con los datos confiables: el modelo directo a bytes
+        inicio = perf_counter()
+        for _ in range(cantidad):
+            cuerpo = RespuestaJSON(contenido).body
+        duracion = perf_counter() - inicio
+        print(f"{nombre:<28}{'directo a bytes':<18}{duracion / cantidad * 1_000_000:>14.1f}{len(cuerpo):>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cantidad", type=int, default=2000)
+    asyncio.run(medir(parser.parse_args().cantidad))
@@ -17,22 +17,57 @@ class Settings(BaseSettings):
 
     ACCESS_TOKEN_EXPIRE_SECONDS: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_SECONDS", "3600"))
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    ALMACENAMIENTO: str = os.getenv("ALMACENAMIENTO", "gcs")
+    ALMACENAMIENTO_DIRECTORIO: str = os.getenv("ALMACENAMIENTO_DIRECTORIO", "almacenamiento")
+    ALMACENAMIENTO_URL_BASE: str = os.getenv("ALMACENAMIENTO_URL_BASE", "")
+    CATALOGOS_TTL: int = int(os.getenv("CATALOGOS_TTL", "300"))
+    CODIGO_BARRAS_DPI: int = int(os.getenv("CODIGO_BARRAS_DPI", "300"))
+    CODIGO_BARRAS_FORMATO: str = os.getenv("CODIGO_BARRAS_FORMATO", "png")
+    CODIGO_BARRAS_LLAVE: str = os.getenv("CODIGO_BARRAS_LLAVE", "")
+    CODIGO_BARRAS_RESERVA_INTERVALO: int = int(os.getenv("CODIGO_BARRAS_RESERVA_INTERVALO", "60"))
+    CODIGO_BARRAS_RESERVA_MAXIMO: int = int(os.getenv("CODIGO_BARRAS_RESERVA_MAXIMO", "100"))
+    CODIGO_BARRAS_RESERVA_MINIMO: int = int(os.getenv("CODIGO_BARRAS_RESERVA_MINIMO", "20"))
+    CODIGO_BARRAS_URL_BASE: str = os.getenv("CODIGO_BARRAS_URL_BASE", "")
+    COMPRESION_MINIMO: int = int(os.getenv("COMPRESION_MINIMO", "1024"))
+    CONCURRENCIA_ESCRITURA_MAXIMO: int = int(os.getenv("CONCURRENCIA_ESCRITURA_MAXIMO", "15"))
+    CONCURRENCIA_ESCRITURA_OBJETIVO: float = float(os.getenv("CONCURRENCIA_ESCRITURA_OBJETIVO", "5"))
+    CONCURRENCIA_LECTURA_MAXIMO: int = int(os.getenv("CONCURRENCIA_LECTURA_MAXIMO", "100"))
+    CONCURRENCIA_LECTURA_OBJETIVO: float = float(os.getenv("CONCURRENCIA_LECTURA_OBJETIVO", "1"))
     CONTROL_ACCESO_URL: str = os.getenv("CONTROL_ACCESO_URL", "")
     CONTROL_ACCESO_API_KEY: str = os.getenv("CONTROL_ACCESO_API_KEY", "")
     CONTROL_ACCESO_APLICACION: int = int(os.getenv("CONTROL_ACCESO_APLICACION", "0"))
+    CONTROL_ACCESO_CIRCUITO_ESPERA: float = float(os.getenv("CONTROL_ACCESO_CIRCUITO_ESPERA", "30"))
+    CONTROL_ACCESO_CIRCUITO_FALLAS: int = int(os.getenv("CONTROL_ACCESO_CIRCUITO_FALLAS", "5"))
+    CONTROL_ACCESO_CONNECT_TIMEOUT: float = float(os.getenv("CONTROL_ACCESO_CONNECT_TIMEOUT", "5"))
+    CONTROL_ACCESO_MAX_CONEXIONES: int = int(os.getenv("CONTROL_ACCESO_MAX_CONEXIONES", "20"))
+    CONTROL_ACCESO_MODO_DEGRADADO: bool = os.getenv("CONTROL_ACCESO_MODO_DEGRADADO", "true").lower() == "true"
+    CONTROL_ACCESO_REINTENTOS: int = int(os.getenv("CONTROL_ACCESO_REINTENTOS", "2"))
     CONTROL_ACCESO_TIMEOUT: int = int(os.getenv("CONTROL_ACCESO_TIMEOUT", "60"))
+    CORREO_CONCURRENCIA: int = int(os.getenv("CORREO_CONCURRENCIA", "10"))
+    CORREO_DIRECTORIO: str = os.getenv("CORREO_DIRECTORIO", "correos")
+    CORREO_TRANSPORTE: str = os.getenv("CORREO_TRANSPORTE", "sendgrid")
     DB_HOST: str = os.getenv("DB_HOST", "127.0.0.1")
     DB_PORT: int = int(os.getenv("DB_PORT", "5432"))
     DB_NAME: str = os.getenv("DB_NAME", "pjecz_casiopea")
     DB_PASS: str = os.getenv("DB_PASS", "")
     DB_USER: str = os.getenv("DB_USER", "")
     HOST: str = os.getenv("HOST", "")
+    IDEMPOTENCIA_ESPERA: float = float(os.getenv("IDEMPOTENCIA_ESPERA", "30"))
+    IDEMPOTENCIA_HORAS: int = int(os.getenv("IDEMPOTENCIA_HORAS", "24"))
+    METRICAS_TOKEN: str = os.getenv("METRICAS_TOKEN", "")
     NEW_ACCOUNT_WEB_PAGE_URL: str = os.getenv("NEW_ACCOUNT_WEB_PAGE_URL", "http://localhost:3000/registros/confirmar")
     ORIGINS: str = os.getenv("ORIGINS", "http://127.0.0.1:3000,http://localhost:3000")
+    PLAZO_SEGUNDOS: float = float(os.getenv("PLAZO_SEGUNDOS", "10"))
     RECOVER_WEB_PAGE_URL: str = os.getenv("RECOVER_WEB_PAGE_URL", "http://localhost:3000/recuperaciones/confirmar")
+    SALA_ESPERA_ACTIVA: bool = os.getenv("SALA_ESPERA_ACTIVA", "false").lower() == "true"
+    SALA_ESPERA_RAFAGA: int = int(os.getenv("SALA_ESPERA_RAFAGA", "20"))
+    SALA_ESPERA_TASA: float = float(os.getenv("SALA_ESPERA_TASA", "2"))
+    SALA_ESPERA_VIGENCIA: int = int(os.getenv("SALA_ESPERA_VIGENCIA", "3600"))
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
     SENDGRID_API_KEY: str = os.getenv("SENDGRID_API_KEY", "")
     SENDGRID_FROM_EMAIL: str = os.getenv("SENDGRID_FROM_EMAIL", "")
+    SMTP_HOST: str = os.getenv("SMTP_HOST", "")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "25"))
     TASK_QUEUE: str = os.getenv("TASK_QUEUE", "pjecz_casiopea")
     TZ: str = os.getenv("TZ", "America/Mexico_City")
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
@@ -0,0 +1,118 @@
+"""
+Circuit Breaker y presupuesto de reintentos para los servicios externos
+"""
+
+import threading
+import time
+
+from .metricas import metricas
+
+CERRADO = "CERRADO"
+ABIERTO = "ABIERTO"
+SEMIABIERTO = "SEMIABIERTO"
+ESTADOS = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+
+
+class CircuitBreaker:
+    """Deja de llamar al servicio tras varias fallas seguidas y lo vuelve a probar después de una espera"""
+
+    def __init__(self, nombre: str, umbral_fallas: int, espera: float, sondeos: int = 1):
+        self.nombre = nombre
+        self.umbral_fallas = umbral_fallas
+        self.espera = espera
+        self.sondeos = sondeos
+        self._candado = threading.Lock()
+        self._estado = CERRADO
+        self._fallas = 0
+        self._abierto_desde = 0.0
+        self._sondeos_en_curso = 0
+        metricas.establecer(f"{self.nombre}.circuito_estado", ESTADOS[CERRADO])
+
+    @property
+    def estado(self) -> str:
+        """Estado actual, pasa a SEMIABIERTO cuando termina la espera"""
+        with self._candado:
+            if self._estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.espera:
+                self._cambiar(SEMIABIERTO)
+            return self._estado
+
+    def permitir(self) -> bool:
+        """¿Se puede llamar al servicio? En SEMIABIERTO solo se permiten los sondeos"""
+        estado = self.estado
+        with self._candado:
+            if estado == CERRADO:
+                return True
+            if estado == SEMIABIERTO and self._sondeos_en_curso < self.sondeos:
+                self._sondeos_en_curso += 1
+                return True
+        metricas.incrementar(f"{self.nombre}.circuito_rechazos")
+        return False
+
+    def registrar_exito(self) -> None:
+        """Registrar una llamada exitosa, cierra el circuito"""
+        with self._candado:
+            self._fallas = 0
+            self._sondeos_en_curso = 0
+            if self._estado != CERRADO:
+                self._cambiar(CERRADO)
+
+    def registrar_falla(self) -> None:
+        """Registrar una llamada fallida, abre el circuito al llegar al umbral o si falla un sondeo"""
+        metricas.incrementar(f"{self.nombre}.fallas")
+        with self._candado:
+            self._fallas += 1
+            if self._estado == SEMIABIERTO or self._fallas >= self.umbral_fallas:
+                self._sondeos_en_curso = 0
+                self._abierto_desde = time.monotonic()
+                if self._estado != ABIERTO:
+                    self._cambiar(ABIERTO)
+
+    def soltar(self) -> None:
+        """Devolver el sondeo de una llamada que no dice nada del servicio, sin contarla como éxito ni como falla"""
+        with self._candado:
+            if self._estado == SEMIABIERTO and self._sondeos_en_curso > 0:
+                self._sondeos_en_curso -= 1
+
+    def _cambiar(self, estado: str) -> None:
+        """Cambiar de estado y actualizar las métricas, se llama con el candado tomado"""
+        self._estado = estado
+        metricas.establecer(f"{self.nombre}.circuito_estado", ESTADOS[estado])
+        metricas.incrementar(f"{self.nombre}.circuito_{estado.lower()}")
+
+
+class RetryBudget:
+    """Limita los reintentos a una proporción de las solicitudes hechas en una ventana de tiempo"""
+
+    def __init__(self, nombre: str, proporcion: float, minimo: int = 3, ventana: float = 10.0):
+        self.nombre = nombre
+        self.proporcion = proporcion
+        self.minimo = minimo
+        self.ventana = ventana
+        self._candado = threading.Lock()
+        self._inicio = time.monotonic()
+        self._solicitudes = 0
+        self._reintentos = 0
+
+    def _renovar(self) -> None:
+        """Reiniciar los conteos si ya pasó la ventana, se llama con el candado tomado"""
+        if time.monotonic() - self._inicio >= self.ventana:
+            self._inicio = time.monotonic()
+            self._solicitudes = 0
+            self._reintentos = 0
+
+    def registrar_solicitud(self) -> None:
+        """Registrar una solicitud original"""
+        with self._candado:
+            self._renovar()
+            self._solicitudes += 1
+
+    def retirar(self) -> bool:
+        """¿Queda presupuesto para un reintento? Si es así, lo descuenta"""
+        with self._candado:
+            self._renovar()
+            if self._reintentos >= self.minimo + self.proporcion * self._solicitudes:
+                metricas.incrementar(f"{self.nombre}.reintentos_agotados")
+                return False
+            self._reintentos += 1
+        metricas.incrementar(f"{self.nombre}.reintentos")
+        return True
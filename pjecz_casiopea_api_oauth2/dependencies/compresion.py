@@ -0,0 +1,173 @@
+"""
+Compresión de las respuestas según el encabezado Accept-Encoding
+"""
+
+import gzip
+import threading
+from collections import OrderedDict
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metricas import metricas
+
+BROTLI_CALIDAD = 5
+BROTLI_CALIDAD_MAXIMA = 11
+CACHE_MAXIMO = 256
+CODIFICACIONES = ("br", "gzip")  # En orden de preferencia si el cliente las acepta con la misma calidad
+GZIP_NIVEL = 6
+TIPOS_COMPRIMIBLES = ("application/json", "image/svg+xml", "text/")
+
+
+def calidades_codificacion(accept_encoding: str | None) -> dict[str, float]:
+    """Codificaciones del encabezado Accept-Encoding con su calidad, q=1 si no la indica"""
+    calidades = {}
+    for valor in (accept_encoding or "").split(","):
+        nombre, _, parametros = valor.partition(";")
+        nombre = nombre.strip().lower()
+        if nombre == "":
+            continue
+        parametro = parametros.replace(" ", "")
+        try:
+            calidades[nombre] = float(parametro[2:]) if parametro.startswith("q=") else 1.0
+        except ValueError:
+            calidades[nombre] = 0.0
+    return calidades
+
+
+def elegir_codificacion(accept_encoding: str | None) -> str | None:
+    """La codificación aceptada con mayor calidad, br antes que gzip si empatan, o None para no comprimir"""
+    calidades = calidades_codificacion(accept_encoding)
+    elegida, mejor = None, 0.0
+    for codificacion in CODIFICACIONES:
+        calidad = calidades.get(codificacion, calidades.get("*", 0.0))
+        if calidad > mejor:
+            elegida, mejor = codificacion, calidad
+    return elegida
+
+
+def comprimir_gzip(contenido: bytes) -> bytes:
+    """Comprimir con gzip, mtime en cero para que el mismo contenido dé los mismos bytes"""
+    return gzip.compress(contenido, compresslevel=GZIP_NIVEL, mtime=0)
+
+
+def comprimir_brotli(contenido: bytes, calidad: int = BROTLI_CALIDAD) -> bytes:
+    """Comprimir con brotli, la calidad máxima es lenta y se reserva para lo que se comprime una sola vez"""
+    return brotli.compress(contenido, mode=brotli.MODE_TEXT, quality=calidad)
+
+
+def comprimir(contenido: bytes, codificacion: str) -> bytes:
+    """Comprimir con la codificación dada, br o gzip"""
+    if codificacion == "br":
+        return comprimir_brotli(contenido)
+    return comprimir_gzip(contenido)
+
+
+class CacheCompresion:
+    """LRU de cuerpos comprimidos, por ruta, ETag y codificación, con el cuerpo original para verificar que es el mismo"""
+
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self._candado = threading.Lock()
+        self._entradas: OrderedDict[tuple, tuple[bytes, bytes]] = OrderedDict()
+
+    def obtener(self, llave: tuple, contenido: bytes) -> bytes | None:
+        """Cuerpo comprimido si ya se tiene y el original es idéntico"""
+        with self._candado:
+            entrada = self._entradas.get(llave)
+            if entrada is None or entrada[0] != contenido:
+                return None
+            self._entradas.move_to_end(llave)
+            return entrada[1]
+
+    def guardar(self, llave: tuple, contenido: bytes, comprimido: bytes) -> None:
+        """Guardar el cuerpo comprimido, descartando el usado hace más tiempo si se llena"""
+        with self._candado:
+            self._entradas[llave] = (contenido, comprimido)
+            self._entradas.move_to_end(llave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+
+class CompresionMiddleware:
+    """
+    Comprime con br o gzip, según el Accept-Encoding, las respuestas de texto o JSON de al menos minimo bytes
+
+    Deja sin cambios las respuestas por partes, las que ya traen Content-Encoding y las que no tienen cuerpo.
+    Las respuestas con ETag fuerte, como las de los catálogos, guardan su cuerpo comprimido para no volver
+    a comprimirlo, y su ETag se vuelve débil porque los bytes cambian con la codificación.
+    """
+
+    def __init__(self, app: ASGIApp, minimo: int):
+        self.app = app
+        self.minimo = minimo
+        self.cache = CacheCompresion(CACHE_MAXIMO)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encabezados_peticion = Headers(scope=scope)
+        codificacion = elegir_codificacion(encabezados_peticion.get("accept-encoding"))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio: Message | None = None
+
+        async def enviar(mensaje: Message) -> None:
+            nonlocal inicio
+
+            # Retener el inicio hasta conocer el cuerpo
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body" or inicio is None:
+                await send(mensaje)
+                return
+            encabezados = MutableHeaders(raw=inicio["headers"])
+            contenido = mensaje.get("body", b"")
+            mensaje_inicio, inicio = inicio, None
+            etag = encabezados.get("etag", "")
+
+            # Al revalidar la versión comprimida se responde 304 con el mismo ETag débil que se entregó
+            if mensaje_inicio["status"] == 304 and etag.startswith('"'):
+                if f"W/{etag}" in encabezados_peticion.get("if-none-match", ""):
+                    encabezados["ETag"] = f"W/{etag}"
+
+            # Sin cambios si no es comprimible
+            tipo = encabezados.get("content-type", "")
+            es_comprimible = (
+                tipo.startswith(TIPOS_COMPRIMIBLES)
+                and "content-encoding" not in encabezados
+                and mensaje_inicio["status"] not in (204, 304)
+            )
+            if es_comprimible:
+                encabezados.add_vary_header("Accept-Encoding")
+            if not es_comprimible or mensaje.get("more_body", False) or len(contenido) < self.minimo:
+                await send(mensaje_inicio)
+                await send(mensaje)
+                return
+
+            # Comprimir o tomar del caché si tiene ETag fuerte
+            llave = (scope["path"], scope["query_string"], etag, codificacion) if etag.startswith('"') else None
+            comprimido = self.cache.obtener(llave, contenido) if llave else None
+            if comprimido is None:
+                comprimido = comprimir(contenido, codificacion)
+                if llave:
+                    self.cache.guardar(llave, contenido, comprimido)
+                metricas.incrementar(f"compresion.{codificacion}")
+            else:
+                metricas.incrementar("compresion.cache_aciertos")
+            metricas.incrementar("compresion.bytes_ahorrados", len(contenido) - len(comprimido))
+
+            # Entregar
+            encabezados["Content-Encoding"] = codificacion
+            encabezados["Content-Length"] = str(len(comprimido))
+            if etag.startswith('"'):
+                encabezados["ETag"] = f"W/{etag}"
+            await send(mensaje_inicio)
+            await send({"type": "http.response.body", "body": comprimido, "more_body": False})
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,178 @@
+"""
+Concurrencia adaptativa: límite de solicitudes en curso que sube y baja con la latencia (AIMD)
+
+Las escrituras (POST y PATCH, como crear y cancelar cita, registros y recuperaciones) y las lecturas tienen
+grupos separados, para que una ola de consultas no deje sin lugar a quienes agendan, ni al revés.
+Lo que excede el límite espera un momento en una cola corta y, si no alcanza lugar, recibe 503 con Retry-After.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metricas import metricas
+
+COLA_ESPERA = 0.5  # Segundos que una solicitud espera lugar antes de recibir 503
+ESCRITURAS = ("PATCH", "POST")
+EXCLUIDAS = ("/", "/docs", "/metricas", "/openapi.json")  # Siempre responden, para ver la saturación
+FACTOR_REDUCCION = 0.9
+MENSAJE_SATURADO = "El servicio está saturado, intente de nuevo en unos segundos"
+RETRY_AFTER = "1"
+
+
+class LimiteAdaptativo:
+    """
+    Límite de solicitudes en curso de un grupo
+
+    Cada solicitud que termina a tiempo suma 1/limite, así el límite crece uno por cada ronda completa;
+    si tarda más que el objetivo o falla con 5xx, el límite se multiplica por FACTOR_REDUCCION, una vez por objetivo
+    para que una ráfaga de solicitudes lentas no lo hunda de golpe. Corre en el event loop, no necesita candado.
+    El reloj de las reducciones se puede cambiar, por ejemplo en las pruebas.
+    """
+
+    def __init__(
+        self, nombre: str, maximo: int, objetivo: float, minimo: int = 1, reloj: Callable[[], float] = time.monotonic
+    ):
+        self.nombre = nombre
+        self.maximo = maximo
+        self.minimo = minimo
+        self.objetivo = objetivo
+        self.limite = float(max(minimo, maximo // 2))
+        self.en_curso = 0
+        self.cola: deque[asyncio.Future] = deque()
+        self.ultima_reduccion = 0.0
+        self.reloj = reloj
+        self.publicar()
+
+    def publicar(self) -> None:
+        """Actualizar los medidores del grupo"""
+        metricas.establecer(f"concurrencia.{self.nombre}.limite", round(self.limite, 2))
+        metricas.establecer(f"concurrencia.{self.nombre}.en_curso", self.en_curso)
+        metricas.establecer(f"concurrencia.{self.nombre}.en_cola", len(self.cola))
+
+    async def adquirir(self) -> bool:
+        """Tomar un lugar, esperando hasta COLA_ESPERA en la cola, False si no se consiguió"""
+        if self.en_curso < int(self.limite) and not self.cola:
+            self.en_curso += 1
+            self.publicar()
+            return True
+
+        # La cola no pasa del tamaño del límite, más allá la espera no tiene caso
+        if len(self.cola) >= int(self.limite):
+            return False
+        futuro = asyncio.get_running_loop().create_future()
+        self.cola.append(futuro)
+        self.publicar()
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(futuro, timeout=COLA_ESPERA)
+            return True
+        except asyncio.TimeoutError:
+            # Pudo recibir el lugar al mismo tiempo que se agotó la espera
+            return futuro.done() and not futuro.cancelled()
+        except asyncio.CancelledError:
+            # Si ya se le había cedido el lugar, se devuelve
+            if futuro.done() and not futuro.cancelled():
+                self.liberar()
+            raise
+        finally:
+            metricas.observar(f"concurrencia.{self.nombre}.espera", time.perf_counter() - inicio)
+            if futuro in self.cola:
+                self.cola.remove(futuro)
+            self.publicar()
+
+    def liberar(self) -> None:
+        """Devolver un lugar y cederlo a quien espera en la cola"""
+        self.en_curso -= 1
+        self.despertar()
+
+    def despertar(self) -> None:
+        """Ceder los lugares libres a las solicitudes en la cola, en orden de llegada"""
+        while self.cola and self.en_curso < int(self.limite):
+            futuro = self.cola.popleft()
+            if not futuro.done():
+                futuro.set_result(True)
+                self.en_curso += 1
+        self.publicar()
+
+    def ajustar(self, segundos: float, fallo: bool) -> None:
+        """Subir o bajar el límite según la duración y el resultado de una solicitud que terminó"""
+        if fallo or segundos > self.objetivo:
+            ahora = self.reloj()
+            if ahora - self.ultima_reduccion >= self.objetivo:
+                self.limite = max(float(self.minimo), self.limite * FACTOR_REDUCCION)
+                self.ultima_reduccion = ahora
+                metricas.incrementar(f"concurrencia.{self.nombre}.reducciones")
+        elif self.en_curso >= self.limite / 2:
+            # Solo crece si se está usando, si no subiría hasta el máximo sin haberlo probado
+            self.limite = min(float(self.maximo), self.limite + 1 / self.limite)
+
+
+class ConcurrenciaMiddleware:
+    """
+    Admite cada solicitud en el grupo de lecturas o de escrituras según el límite adaptativo de ese grupo
+
+    El lugar se ocupa hasta enviar el final de la respuesta, la duración hasta ese momento es la que ajusta el límite.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        escritura_maximo: int,
+        escritura_objetivo: float,
+        lectura_maximo: int,
+        lectura_objetivo: float,
+    ):
+        self.app = app
+        self.limites = {
+            "escritura": LimiteAdaptativo("escritura", escritura_maximo, escritura_objetivo),
+            "lectura": LimiteAdaptativo("lectura", lectura_maximo, lectura_objetivo, minimo=2),
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXCLUIDAS:
+            await self.app(scope, receive, send)
+            return
+        grupo = "escritura" if scope["method"] in ESCRITURAS else "lectura"
+        limite = self.limites[grupo]
+
+        # Rechazar al momento si no hay lugar
+        if not await limite.adquirir():
+            metricas.incrementar(f"concurrencia.{grupo}.rechazos")
+            respuesta = JSONResponse(
+                {"detail": MENSAJE_SATURADO},
+                status_code=503,
+                headers={"Retry-After": RETRY_AFTER},
+            )
+            await respuesta(scope, receive, send)
+            return
+        metricas.incrementar(f"concurrencia.{grupo}.admitidas")
+
+        inicio = time.monotonic()
+        status_code = 500
+        terminada = False
+
+        def terminar() -> None:
+            nonlocal terminada
+            if terminada:
+                return
+            terminada = True
+            limite.ajustar(time.monotonic() - inicio, status_code >= 500)
+            limite.liberar()
+
+        async def enviar(mensaje: Message) -> None:
+            nonlocal status_code
+            if mensaje["type"] == "http.response.start":
+                status_code = mensaje["status"]
+            if mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                terminar()
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            terminar()
@@ -2,11 +2,37 @@
 Control de Accesos es la API para obtener el código de acceso como una imagen de un QR
 """
 
+import asyncio
 import base64
 import hashlib
+import importlib.util
 import re
+import time
 from datetime import datetime
 
+import httpx
+from fastapi import Request
+
+from ..config.settings import Settings, get_settings
+from .circuit_breaker import CircuitBreaker, RetryBudget
+from .exceptions import MyConnectionError, MyNotValidAnswerError, MyRequestError, MyTimeoutError
+from .metricas import metricas
+from .plazos import limitar, restante
+
+# HTTP/2 solo si está instalado el paquete h2
+HTTP2_DISPONIBLE = importlib.util.find_spec("h2") is not None
+
+# Circuit breaker y presupuesto de reintentos compartidos por todas las peticiones del proceso
+circuit_breaker = CircuitBreaker(
+    nombre="control_acceso",
+    umbral_fallas=get_settings().CONTROL_ACCESO_CIRCUITO_FALLAS,
+    espera=get_settings().CONTROL_ACCESO_CIRCUITO_ESPERA,
+)
+retry_budget = RetryBudget(nombre="control_acceso", proporcion=0.2)
+
+# De lo que le queda a la solicitud, lo más que usan todos los intentos, el resto es para agendar en modo degradado
+FRACCION_PLAZO = 0.5
+
 
 def generar_referencia(cit_cliente_email: str, cit_servicio_clave: str, oficina_clave: str, inicio: datetime) -> str:
     """Generar una referencia para solicitar un código de acceso"""
@@ -36,3 +62,118 @@ def decodificar_imagen(data_uri_string: str) -> bytes:
 
     # Entregar
     return decoded_image_data
+
+
+def crear_cliente_http(settings: Settings) -> httpx.AsyncClient:
+    """Crear el cliente HTTP asíncrono, con conexiones persistentes, que comparten todas las peticiones"""
+    return httpx.AsyncClient(
+        headers={"X-Api-Key": settings.CONTROL_ACCESO_API_KEY},
+        http2=HTTP2_DISPONIBLE,
+        limits=httpx.Limits(
+            max_connections=settings.CONTROL_ACCESO_MAX_CONEXIONES,
+            max_keepalive_connections=settings.CONTROL_ACCESO_MAX_CONEXIONES,
+            keepalive_expiry=30.0,
+        ),
+        timeout=httpx.Timeout(settings.CONTROL_ACCESO_TIMEOUT, connect=settings.CONTROL_ACCESO_CONNECT_TIMEOUT),
+    )
+
+
+def get_control_acceso_cliente(request: Request) -> httpx.AsyncClient:
+    """Cliente HTTP de Control Acceso, creado en el lifespan de la aplicación"""
+    return request.app.state.control_acceso_cliente
+
+
+async def solicitar_codigo_acceso(
+    cliente: httpx.AsyncClient, settings: Settings, payload: dict, espera: float | None = None
+) -> tuple[int, str]:
+    """Solicitar el código de acceso, esperando hasta espera segundos o CONTROL_ACCESO_TIMEOUT, entrega idAcceso e imagen"""
+
+    if espera is None:
+        espera = settings.CONTROL_ACCESO_TIMEOUT
+
+    # Enviar la solicitud, sin esperar más de lo que le queda a la solicitud en curso
+    try:
+        tiempo = httpx.Timeout(
+            limitar(espera),
+            connect=limitar(min(espera, settings.CONTROL_ACCESO_CONNECT_TIMEOUT)),
+        )
+        respuesta = await cliente.post(url=settings.CONTROL_ACCESO_URL, json=payload, timeout=tiempo)
+    except httpx.TimeoutException as error:
+        raise MyTimeoutError(f"No responde a tiempo Control Acceso: {str(error)}") from error
+    except httpx.RequestError as error:
+        raise MyConnectionError(f"No responde Control Acceso: {str(error)}") from error
+
+    # Validar la respuesta
+    if respuesta.status_code >= 500:
+        raise MyRequestError(f"Falló Control Acceso con código {respuesta.status_code}: {respuesta.text}")
+    if respuesta.status_code != 200:
+        raise MyNotValidAnswerError(f"No fue código 200 la respuesta de Control Acceso: {respuesta.text}")
+    try:
+        contenido = respuesta.json()
+    except ValueError as error:
+        raise MyNotValidAnswerError(f"No es JSON la respuesta de Control Acceso: {respuesta.text[:200]}") from error
+    if not isinstance(contenido, dict):
+        raise MyNotValidAnswerError("No es un objeto JSON la respuesta de Control Acceso")
+    if contenido.get("success") is False:
+        raise MyNotValidAnswerError(f"Falló la obtención del Código de Acceso: {contenido.get('message')}")
+    codigo_acceso_id = contenido.get("idAcceso")
+    if not codigo_acceso_id:
+        raise MyNotValidAnswerError("Faltó la idAcceso en la respuesta de Control Acceso")
+    codigo_acceso_url = contenido.get("imagen")
+    if not codigo_acceso_url:
+        raise MyNotValidAnswerError("Faltó la imagen en la respuesta de Control Acceso")
+
+    # Entregar
+    return codigo_acceso_id, codigo_acceso_url
+
+
+async def solicitar_codigo_acceso_protegido(cliente: httpx.AsyncClient, settings: Settings, payload: dict) -> tuple[int, str]:
+    """
+    Solicitar el código de acceso a través del circuit breaker, con reintentos limitados por el presupuesto
+
+    Dentro de una solicitud, todos los intentos juntos usan a lo más FRACCION_PLAZO de lo que le queda, así con
+    Control Acceso sin responder todavía hay tiempo para agendar en modo degradado. Un intento que se agota con
+    la espera recortada por el plazo no cuenta como falla, porque no tuvo CONTROL_ACCESO_TIMEOUT para responder;
+    las que se agotan con la espera completa, como las de segundo plano, son las que abren el circuito.
+    """
+    retry_budget.registrar_solicitud()
+    queda = restante()
+    tope = None if queda is None else time.monotonic() + queda * FRACCION_PLAZO
+    intento = 0
+    while True:
+        limitar(0)  # Si ya se agotó el plazo no se intenta, ni cuenta como falla de Control Acceso
+        espera = float(settings.CONTROL_ACCESO_TIMEOUT)
+        if tope is not None:
+            espera = min(espera, tope - time.monotonic())
+            if espera <= 0:
+                raise MyTimeoutError("Se agotó el tiempo para Control Acceso dentro del plazo de la solicitud")
+        recortada = espera < settings.CONTROL_ACCESO_TIMEOUT
+        if not circuit_breaker.permitir():
+            raise MyConnectionError("Control Acceso no está disponible, el circuito está abierto")
+        registrado = False
+        try:
+            resultado = await solicitar_codigo_acceso(cliente, settings, payload, espera)
+        except (MyConnectionError, MyRequestError, MyTimeoutError) as error:
+            registrado = True
+            if isinstance(error, MyTimeoutError) and recortada:
+                circuit_breaker.soltar()
+                metricas.incrementar("control_acceso.esperas_recortadas")
+                raise
+            circuit_breaker.registrar_falla()
+            if intento >= settings.CONTROL_ACCESO_REINTENTOS or not retry_budget.retirar():
+                raise
+            intento += 1
+            await asyncio.sleep(0.1 * 2**intento)
+            continue
+        except MyNotValidAnswerError:
+            circuit_breaker.registrar_exito()  # Respondió, aunque la respuesta no sea válida
+            registrado = True
+            raise
+        else:
+            circuit_breaker.registrar_exito()
+            registrado = True
+            return resultado
+        finally:
+            # Cancelada por el plazo o con un error inesperado, cuenta como falla para no retener el sondeo
+            if not registrado:
+                circuit_breaker.registrar_falla()
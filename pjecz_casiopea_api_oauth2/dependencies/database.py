@@ -5,11 +5,12 @@ Database
 from typing import Annotated
 
 from fastapi import Depends
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 
 from ..config.settings import Settings, get_settings
+from .plazos import restante
 
 Base = declarative_base()
 
@@ -25,6 +26,14 @@ engine = get_engine()
 session_maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@event.listens_for(session_maker, "after_begin")
+def limitar_consultas(session, transaction, connection) -> None:
+    """Dentro de una solicitud, las consultas de cada transacción no pueden durar más de lo que le queda a la solicitud"""
+    queda = restante()
+    if queda is not None:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(queda * 1000))}")
+
+
 def get_db(settings: Annotated[Settings, Depends(get_settings)]) -> Session:
     """Database session"""
     database = session_maker()
@@ -0,0 +1,35 @@
+"""
+ETag y GET condicional, para responder 304 cuando el cliente ya tiene la misma versión
+"""
+
+import hashlib
+
+from fastapi import Response, status
+
+# Los datos requieren la sesión del cliente, así que solo el navegador los guarda y siempre los revalida
+CACHE_CONTROL = "private, no-cache"
+
+
+def crear_etag(*partes: str) -> str:
+    """ETag fuerte con la huella de las partes dadas"""
+    return f'"{hashlib.sha256("|".join(partes).encode()).hexdigest()[:32]}"'
+
+
+def coincide_etag(if_none_match: str | None, etag: str) -> bool:
+    """Si el encabezado If-None-Match incluye el ETag, con la comparación débil que pide el RFC 9110"""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in [valor.strip().removeprefix("W/") for valor in if_none_match.split(",")]
+
+
+def responder_etag(
+    response: Response, if_none_match: str | None, etag: str, cache_control: str = CACHE_CONTROL
+) -> Response | None:
+    """Si el cliente ya tiene esa versión regresa la respuesta 304, si no agrega el ETag a la respuesta y regresa None"""
+    encabezados = {"ETag": etag, "Cache-Control": cache_control}
+    if coincide_etag(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=encabezados)
+    response.headers.update(encabezados)
+    return None
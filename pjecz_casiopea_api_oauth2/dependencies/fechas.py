@@ -0,0 +1,56 @@
+"""
+Fechas en español, sin depender del locale del sistema operativo
+"""
+
+from datetime import datetime
+from functools import lru_cache
+
+MESES = (
+    "enero",
+    "febrero",
+    "marzo",
+    "abril",
+    "mayo",
+    "junio",
+    "julio",
+    "agosto",
+    "septiembre",
+    "octubre",
+    "noviembre",
+    "diciembre",
+)
+MESES_ABREVIADOS = ("ene", "feb", "mar", "abr", "may", "jun", "jul", "ago", "sep", "oct", "nov", "dic")
+DIAS = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+DIAS_ABREVIADOS = ("lun", "mar", "mié", "jue", "vie", "sáb", "dom")
+AM_PM = ("a. m.", "p. m.")
+
+
+@lru_cache(maxsize=256)
+def _formato_en_espanol(formato: str, mes: int, dia_semana: int, es_pm: bool) -> str:
+    """Sustituir en el formato las directivas que dependen del locale por los nombres en español"""
+    sustituciones = {
+        "%B": MESES[mes - 1],
+        "%b": MESES_ABREVIADOS[mes - 1],
+        "%A": DIAS[dia_semana],
+        "%a": DIAS_ABREVIADOS[dia_semana],
+        "%p": AM_PM[es_pm],
+    }
+    partes = []
+    i = 0
+    while i < len(formato):
+        directiva = formato[i : i + 2]
+        if directiva in sustituciones:
+            partes.append(sustituciones[directiva])
+            i += 2
+        elif directiva == "%%":
+            partes.append(directiva)
+            i += 2
+        else:
+            partes.append(formato[i])
+            i += 1
+    return "".join(partes)
+
+
+def formatear_fecha(fecha: datetime, formato: str) -> str:
+    """Como strftime pero con los nombres de meses, días y a. m./p. m. en español, sin llamar a setlocale"""
+    return fecha.strftime(_formato_en_espanol(formato, fecha.month, fecha.weekday(), fecha.hour >= 12))
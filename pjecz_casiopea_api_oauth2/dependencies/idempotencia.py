@@ -0,0 +1,296 @@
+"""
+Idempotencia: los POST de crear cita y solicitar registro con el encabezado Idempotency-Key se ejecutan una sola vez
+
+Las rutas se declaran con post_idempotente. La primera solicitud con una llave la reserva en la tabla
+cit_idempotencias y, si responde con éxito, guarda su respuesta. Los reintentos con la misma llave y el mismo cuerpo
+reciben la respuesta guardada, sin volver a ejecutar la ruta, y si llegan mientras la primera sigue en curso esperan
+a que termine.
+
+Se libera la llave, para que un reintento vuelva a ejecutar la ruta, cuando la ruta la rechaza con una
+HTTPException 4xx o responde success false, que estas rutas hacen al validar o cuando falla un servicio externo,
+sin dejar guardado nada que un reintento duplique. Si la ruta se cancela, causa otra excepción o responde un error
+del servidor, pudo haber guardado algo antes, por eso la llave queda terminada con el resultado desconocido y los
+reintentos reciben 409 hasta que expire.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Coroutine
+
+import jwt
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+
+from ..config.settings import get_settings
+from ..models.cit_idempotencias import CitIdempotencia
+from .authentications import decode_token
+from .database import session_maker
+from .exceptions import MyAnyError
+from .metricas import metricas
+
+EN_CURSO_SEGUNDOS = 300  # Si quien reservó la llave no termina en este tiempo, otro reintento puede tomarla
+ESPERA_INTERVALO_MAXIMO = 1.0
+ESPERA_INTERVALO_MINIMO = 0.05
+LLAVE_LONGITUD_MAXIMA = 256
+
+
+@dataclass(frozen=True, slots=True)
+class Guardada:
+    """Lo que se sabe de una llave ya reservada por otra solicitud"""
+
+    huella: str
+    terminado: bool
+    status_code: int | None
+    media_type: str | None
+    contenido: bytes | None
+
+
+def reservar(alcance: str, llave: str, huella: str) -> uuid.UUID | Guardada:
+    """Reservar la llave y regresar el id de la reserva, o si ya está reservada y no ha expirado, regresar la guardada"""
+    reserva_id = uuid.uuid4()
+    database = session_maker()
+    try:
+        # Insertar, o tomar la fila si ya expiró; el id nuevo invalida a quien la tenía antes
+        valores = {
+            "id": reserva_id,
+            "huella": huella,
+            "terminado": False,
+            "status_code": None,
+            "media_type": None,
+            "contenido": None,
+            "expiracion": func.now() + timedelta(seconds=EN_CURSO_SEGUNDOS),
+            "modificado": func.now(),
+        }
+        sentencia = (
+            insert(CitIdempotencia)
+            .values(alcance=alcance, llave=llave, **valores)
+            .on_conflict_do_update(
+                index_elements=["alcance", "llave"],
+                set_=valores,
+                where=CitIdempotencia.expiracion < func.now(),
+            )
+            .returning(CitIdempotencia.id)
+        )
+        while True:
+            reservada = database.execute(sentencia).scalar_one_or_none()
+            database.commit()
+            if reservada is not None:
+                return reserva_id
+
+            # Ya la tiene otra solicitud, si la liberó entre el INSERT y la consulta se vuelve a intentar
+            cit_idempotencia = database.query(CitIdempotencia).filter_by(alcance=alcance, llave=llave).one_or_none()
+            if cit_idempotencia is not None:
+                return Guardada(
+                    huella=cit_idempotencia.huella,
+                    terminado=cit_idempotencia.terminado,
+                    status_code=cit_idempotencia.status_code,
+                    media_type=cit_idempotencia.media_type,
+                    contenido=cit_idempotencia.contenido,
+                )
+    finally:
+        database.close()
+
+
+def guardar(reserva_id: uuid.UUID, respuesta: Response) -> None:
+    """Guardar la respuesta de la reserva, se conserva IDEMPOTENCIA_HORAS"""
+    database = session_maker()
+    try:
+        database.execute(
+            update(CitIdempotencia)
+            .where(CitIdempotencia.id == reserva_id)
+            .values(
+                terminado=True,
+                status_code=respuesta.status_code,
+                media_type=respuesta.headers.get("content-type"),
+                contenido=bytes(respuesta.body),
+                expiracion=func.now() + timedelta(hours=get_settings().IDEMPOTENCIA_HORAS),
+                modificado=func.now(),
+            )
+        )
+        database.commit()
+    finally:
+        database.close()
+
+
+def marcar_desconocido(reserva_id: uuid.UUID) -> None:
+    """Terminar la reserva sin respuesta, porque no se sabe si la ruta tuvo efectos, se conserva IDEMPOTENCIA_HORAS"""
+    database = session_maker()
+    try:
+        database.execute(
+            update(CitIdempotencia)
+            .where(CitIdempotencia.id == reserva_id)
+            .values(
+                terminado=True,
+                status_code=None,
+                media_type=None,
+                contenido=None,
+                expiracion=func.now() + timedelta(hours=get_settings().IDEMPOTENCIA_HORAS),
+                modificado=func.now(),
+            )
+        )
+        database.commit()
+    finally:
+        database.close()
+
+
+def liberar(reserva_id: uuid.UUID) -> None:
+    """Eliminar la reserva para que un reintento vuelva a ejecutar la ruta"""
+    database = session_maker()
+    try:
+        database.execute(delete(CitIdempotencia).where(CitIdempotencia.id == reserva_id))
+        database.commit()
+    finally:
+        database.close()
+
+
+def identificar(request: Request) -> str:
+    """Cliente del token, para que la misma llave de dos clientes no se cruce, vacío si no hay token válido"""
+    esquema, _, token = request.headers.get("authorization", "").partition(" ")
+    if esquema.lower() != "bearer" or token == "":
+        return ""
+    try:
+        return decode_token(token, get_settings())["username"]
+    except (MyAnyError, jwt.PyJWTError, KeyError):
+        return ""
+
+
+def es_exitosa(respuesta: Response) -> bool:
+    """Si la respuesta es completa, no es un error del servidor y, si es JSON con success, este es verdadero"""
+    if respuesta.status_code >= 500 or not hasattr(respuesta, "body"):
+        return False
+    if not respuesta.headers.get("content-type", "").startswith("application/json"):
+        return True
+    try:
+        contenido = json.loads(respuesta.body)
+    except ValueError:
+        return True
+    return not isinstance(contenido, dict) or contenido.get("success", True) is not False
+
+
+def responder_guardada(guardada: Guardada) -> Response:
+    """Entregar de nuevo la respuesta guardada"""
+    metricas.incrementar("idempotencia.repeticiones")
+    return Response(
+        content=guardada.contenido,
+        status_code=guardada.status_code,
+        media_type=guardada.media_type,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class RutaIdempotente(APIRoute):
+    """Ruta que atiende el encabezado Idempotency-Key, se declara con post_idempotente"""
+
+    # Solicitudes en curso en este proceso, para despertar al momento a los reintentos que esperan
+    en_curso: dict[tuple[str, str], asyncio.Event] = {}
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[None, None, Response]]:
+        manejador = super().get_route_handler()
+
+        async def manejador_idempotente(request: Request) -> Response:
+            llave = request.headers.get("idempotency-key")
+            if llave is None:
+                return await manejador(request)
+            llave = llave.strip()
+            if llave == "" or len(llave) > LLAVE_LONGITUD_MAXIMA or not llave.isprintable():
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No es válida la Idempotency-Key")
+
+            # La huella es el método, la ruta, los parámetros y el cuerpo de la solicitud
+            cuerpo = await request.body()
+            huella = hashlib.sha256(
+                b"|".join([request.method.encode(), request.url.path.encode(), request.url.query.encode(), cuerpo])
+            ).hexdigest()
+
+            # El alcance es el cliente del token; sin token es la huella, para que dos anónimos no compartan llave
+            cliente = identificar(request) or f"anonimo:{huella}"
+            alcance = f"{request.method} {self.path}|{cliente}"
+
+            # Reservar la llave, o esperar a que termine la solicitud que la tiene
+            espera = get_settings().IDEMPOTENCIA_ESPERA
+            limite = time.monotonic() + espera
+            intervalo = ESPERA_INTERVALO_MINIMO
+            while True:
+                reserva = await asyncio.to_thread(reservar, alcance, llave, huella)
+                if isinstance(reserva, uuid.UUID):
+                    break
+                if reserva.huella != huella:
+                    metricas.incrementar("idempotencia.conflictos")
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="Esa Idempotency-Key ya se usó con otra solicitud",
+                    )
+                if reserva.terminado and reserva.status_code is None:
+                    metricas.incrementar("idempotencia.desconocidas")
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="Se desconoce el resultado de la solicitud con esa Idempotency-Key, consulte antes de reintentar",
+                    )
+                if reserva.terminado:
+                    return responder_guardada(reserva)
+                if time.monotonic() >= limite:
+                    metricas.incrementar("idempotencia.esperas_agotadas")
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="Hay una solicitud en curso con esa Idempotency-Key",
+                        headers={"Retry-After": "1"},
+                    )
+                metricas.incrementar("idempotencia.esperas")
+                evento = self.en_curso.get((alcance, llave))
+                if evento is not None:
+                    try:
+                        await asyncio.wait_for(evento.wait(), timeout=intervalo)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(intervalo)
+                intervalo = min(intervalo * 2, ESPERA_INTERVALO_MAXIMO)
+
+            # Ejecutar la ruta una sola vez
+            evento = asyncio.Event()
+            self.en_curso[(alcance, llave)] = evento
+            try:
+                try:
+                    respuesta = await manejador(request)
+                except HTTPException as error:
+                    # Las 4xx se causan al validar, antes de cualquier efecto, y se pueden reintentar
+                    if error.status_code < 500:
+                        await asyncio.to_thread(liberar, reserva)
+                    else:
+                        await asyncio.to_thread(marcar_desconocido, reserva)
+                    raise
+                except BaseException:
+                    # Cancelada o con un error inesperado, pudo haber guardado algo antes de fallar
+                    await asyncio.to_thread(marcar_desconocido, reserva)
+                    raise
+
+                # Se guardan las exitosas; con success false se puede reintentar; las demás quedan desconocidas
+                if es_exitosa(respuesta):
+                    await asyncio.to_thread(guardar, reserva, respuesta)
+                elif respuesta.status_code < 500 and hasattr(respuesta, "body"):
+                    await asyncio.to_thread(liberar, reserva)
+                else:
+                    await asyncio.to_thread(marcar_desconocido, reserva)
+                return respuesta
+            finally:
+                if self.en_curso.get((alcance, llave)) is evento:
+                    del self.en_curso[(alcance, llave)]
+                evento.set()
+
+        return manejador_idempotente
+
+
+def post_idempotente(router: APIRouter, path: str, **kwargs: Any) -> Callable[[Callable], Callable]:
+    """Como router.post, pero la ruta atiende el encabezado Idempotency-Key"""
+
+    def decorador(endpoint: Callable) -> Callable:
+        router.add_api_route(path, endpoint, methods=["POST"], route_class_override=RutaIdempotente, **kwargs)
+        return endpoint
+
+    return decorador
@@ -0,0 +1,63 @@
+"""
+Métricas en memoria del proceso
+"""
+
+import hmac
+import threading
+from typing import Annotated
+
+from fastapi import Depends, Header, HTTPException, status
+
+from ..config.settings import Settings, get_settings
+
+
+class Metricas:
+    """Contadores, medidores y tiempos acumulados en memoria"""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._contadores: dict[str, int] = {}
+        self._medidores: dict[str, float] = {}
+        self._tiempos: dict[str, dict[str, float]] = {}
+
+    def incrementar(self, nombre: str, cantidad: int = 1) -> None:
+        """Incrementar un contador"""
+        with self._candado:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+
+    def establecer(self, nombre: str, valor: float) -> None:
+        """Establecer el valor de un medidor"""
+        with self._candado:
+            self._medidores[nombre] = valor
+
+    def observar(self, nombre: str, segundos: float) -> None:
+        """Acumular la duración de una operación"""
+        with self._candado:
+            tiempo = self._tiempos.setdefault(nombre, {"cantidad": 0, "suma": 0.0, "maximo": 0.0})
+            tiempo["cantidad"] += 1
+            tiempo["suma"] += segundos
+            tiempo["maximo"] = max(tiempo["maximo"], segundos)
+
+    def resumen(self) -> dict:
+        """Entregar una copia de todas las métricas"""
+        with self._candado:
+            return {
+                "contadores": dict(self._contadores),
+                "medidores": dict(self._medidores),
+                "tiempos": {nombre: dict(tiempo) for nombre, tiempo in self._tiempos.items()},
+            }
+
+
+metricas = Metricas()
+
+
+def exigir_metricas_token(
+    settings: Annotated[Settings, Depends(get_settings)],
+    authorization: Annotated[str | None, Header()] = None,
+) -> None:
+    """Solo el recolector interno con Authorization: Bearer METRICAS_TOKEN ve las métricas, sin METRICAS_TOKEN no existen"""
+    if not settings.METRICAS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    esquema, _, token = (authorization or "").partition(" ")
+    if esquema.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.METRICAS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
@@ -0,0 +1,124 @@
+"""
+Plazos de las solicitudes: cada ruta tiene un presupuesto de segundos y lo que resta se pasa a la base de datos,
+a Control Acceso, al correo y al almacenamiento; si se agota antes de responder se entrega 504
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+
+from sqlalchemy.exc import OperationalError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .exceptions import MyTimeoutError
+from .metricas import metricas
+
+# Segundos por método y ruta, las que no están usan el plazo por defecto
+PRESUPUESTOS = {
+    "PATCH /api/v5/cit_citas/cancelar": 20.0,
+    "POST /api/v5/cit_citas/crear": 30.0,
+    "POST /api/v5/cit_clientes_recuperaciones/solicitar": 20.0,
+    "POST /api/v5/cit_clientes_recuperaciones/terminar": 20.0,
+    "POST /api/v5/cit_clientes_registros/solicitar": 20.0,
+    "POST /api/v5/cit_clientes_registros/terminar": 20.0,
+}
+MENSAJE_AGOTADO = "Se agotó el tiempo para atender la solicitud"
+
+
+class Plazo:
+    """Momento límite de una solicitud, en segundos de time.monotonic, None cuando ya no aplica"""
+
+    def __init__(self, limite: float | None):
+        self.limite = limite
+
+    def restante(self) -> float | None:
+        """Segundos que le quedan, negativo si ya se agotó, None si no tiene plazo"""
+        if self.limite is None:
+            return None
+        return self.limite - time.monotonic()
+
+
+_plazo: ContextVar[Plazo] = ContextVar("plazo", default=Plazo(None))
+
+
+def restante() -> float | None:
+    """Segundos que le quedan a la solicitud en curso, None fuera de una solicitud o si ya se respondió"""
+    return _plazo.get().restante()
+
+
+def limitar(segundos: float) -> float:
+    """El tiempo de espera dado, recortado a lo que le queda a la solicitud; si ya se agotó causa MyTimeoutError"""
+    queda = restante()
+    if queda is None:
+        return segundos
+    if queda <= 0:
+        raise MyTimeoutError(MENSAJE_AGOTADO)
+    return min(segundos, queda)
+
+
+def es_consulta_cancelada(error: BaseException) -> bool:
+    """Si la base de datos canceló la consulta por statement_timeout"""
+    return isinstance(error, OperationalError) and getattr(error.orig, "pgcode", None) == "57014"
+
+
+class PlazoMiddleware:
+    """
+    Da a cada solicitud el presupuesto de su ruta y la corta con 504 si se agota antes de empezar a responder
+
+    Lo que no se puede cancelar, como el código que corre en un hilo, lo detienen los tiempos de espera recortados
+    con limitar y el statement_timeout de la base de datos. Una vez enviada la respuesta ya no hay plazo,
+    así las tareas en segundo plano de la solicitud no quedan limitadas.
+    """
+
+    def __init__(self, app: ASGIApp, defecto: float):
+        self.app = app
+        self.defecto = defecto
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        ruta = f"{scope['method']} {scope['path']}"
+        presupuesto = PRESUPUESTOS.get(ruta, self.defecto)
+        plazo = Plazo(time.monotonic() + presupuesto)
+        respondiendo = False
+
+        async def enviar(mensaje: Message) -> None:
+            nonlocal respondiendo
+            if mensaje["type"] == "http.response.start":
+                respondiendo = True
+            if mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                plazo.limite = None
+            await send(mensaje)
+
+        # La tarea copia el contexto con el plazo ya definido
+        token = _plazo.set(plazo)
+        try:
+            tarea = asyncio.create_task(self.app(scope, receive, enviar))
+        finally:
+            _plazo.reset(token)
+
+        # Esperar hasta el límite, si ya empezó a responder se deja terminar
+        try:
+            await asyncio.wait({tarea}, timeout=presupuesto)
+            if not tarea.done() and not respondiendo:
+                tarea.cancel()
+            try:
+                await tarea
+                return
+            except asyncio.CancelledError:
+                if not tarea.cancelled():
+                    raise
+            except (MyTimeoutError, OperationalError) as error:
+                if respondiendo or not (isinstance(error, MyTimeoutError) or es_consulta_cancelada(error)):
+                    raise
+        except asyncio.CancelledError:
+            tarea.cancel()
+            raise
+
+        # Entregar 504
+        metricas.incrementar("plazos.agotados")
+        metricas.incrementar(f"plazos.agotados.{ruta}")
+        respuesta = JSONResponse({"detail": MENSAJE_AGOTADO}, status_code=504)
+        await respuesta(scope, receive, send)
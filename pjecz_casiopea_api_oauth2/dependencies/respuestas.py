@@ -0,0 +1,37 @@
+"""
+Respuestas JSON, serializadas con orjson o directo a bytes desde los modelos de pydantic
+"""
+
+from typing import Any
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class RespuestaJSON(JSONResponse):
+    """Respuesta JSON por defecto, los modelos se serializan con pydantic y lo demás con orjson"""
+
+    def render(self, content: Any) -> bytes:
+        """Convertir el contenido a bytes"""
+        if isinstance(content, BaseModel):
+            return serializar(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def serializar(modelo: BaseModel) -> bytes:
+    """Serializar un modelo directo a bytes, sin pasar por diccionarios de Python"""
+    return modelo.__pydantic_serializer__.to_json(modelo)
+
+
+def respuesta_confiable(modelo: BaseModel, response: Response) -> RespuestaJSON:
+    """
+    Entregar un modelo con datos internos ya validados, como los de los catálogos en memoria
+
+    Al regresar una respuesta FastAPI omite la validación y la conversión del response_model,
+    por eso se copian los encabezados que la ruta agregó a response, como el ETag.
+    """
+    respuesta = RespuestaJSON(modelo, status_code=response.status_code or 200)
+    respuesta.raw_headers.extend(response.headers.raw)
+    return respuesta
@@ -0,0 +1,234 @@
+"""
+Sala de espera: turnos firmados por oficina que se admiten a una tasa constante
+
+Cuando una oficina libera fechas, miles de clientes piden horas disponibles y crean citas al mismo tiempo.
+Cada cliente pide un turno, un número consecutivo por oficina firmado como JWT con su usuario. La frontera
+de admitidos avanza SALA_ESPERA_TASA turnos por segundo, o la tasa propia de la oficina, sin pasar de los emitidos
+más SALA_ESPERA_RAFAGA, así cuando no hay fila los turnos se admiten al momento. Con SALA_ESPERA_ACTIVA
+solo los turnos admitidos pueden consultar las horas disponibles y crear citas de esa oficina, y cada turno
+agenda una sola cita, así la tasa de admisión es también el límite de citas que se agendan.
+"""
+
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+import jwt
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..config.settings import Settings
+from ..models.cit_salas_espera import CitSalaEspera
+from ..models.cit_salas_espera_turnos import CitSalaEsperaTurno
+from ..models.oficinas import Oficina
+from .database import session_maker
+from .exceptions import MyAuthenticationError
+from .metricas import metricas
+
+AUDIENCIA = "sala_espera"  # Distingue los turnos de los tokens de acceso, uno no sirve como el otro
+ESTADO_TTL = 1.0  # Segundos que cada proceso reutiliza el estado de una sala antes de volver a leerlo
+
+
+@dataclass(frozen=True, slots=True)
+class Estado:
+    """Turnos emitidos y frontera de admitidos de una sala, al momento admitidos_tiempo"""
+
+    emitidos: int
+    admitidos: float
+    admitidos_tiempo: float
+    tasa: float
+
+    def frontera(self, rafaga: int, ahora: float) -> float:
+        """Último turno admitido al momento dado"""
+        avance = self.tasa * max(0.0, ahora - self.admitidos_tiempo)
+        return min(self.emitidos + rafaga, self.admitidos + avance)
+
+
+@dataclass(frozen=True, slots=True)
+class Turno:
+    """Contenido de un turno firmado"""
+
+    username: str
+    oficina_id: uuid.UUID
+    oficina_clave: str
+    numero: int
+    expiracion: float
+
+
+def emitir(database: Session, oficina_id: uuid.UUID, settings: Settings) -> tuple[int, Estado]:
+    """Emitir el siguiente turno de la oficina, avanzando la frontera hasta ahora, en una sola sentencia"""
+    ahora = time.time()
+    rafaga = settings.SALA_ESPERA_RAFAGA
+    tasa = func.coalesce(CitSalaEspera.tasa, settings.SALA_ESPERA_TASA)
+    sentencia = (
+        insert(CitSalaEspera)
+        .values(oficina_id=oficina_id, emitidos=1, admitidos=float(rafaga), admitidos_tiempo=ahora)
+        .on_conflict_do_update(
+            index_elements=["oficina_id"],
+            set_={
+                "emitidos": CitSalaEspera.emitidos + 1,
+                "admitidos": func.least(
+                    CitSalaEspera.emitidos + rafaga,
+                    CitSalaEspera.admitidos + tasa * func.greatest(0.0, ahora - CitSalaEspera.admitidos_tiempo),
+                ),
+                "admitidos_tiempo": ahora,
+                "modificado": func.now(),
+            },
+        )
+        .returning(CitSalaEspera.emitidos, CitSalaEspera.admitidos, CitSalaEspera.admitidos_tiempo, CitSalaEspera.tasa)
+    )
+    emitidos, admitidos, admitidos_tiempo, tasa_oficina = database.execute(sentencia).one()
+    database.commit()
+    metricas.incrementar("sala_espera.turnos")
+    estado = Estado(emitidos, admitidos, admitidos_tiempo, tasa_oficina or settings.SALA_ESPERA_TASA)
+    return emitidos, estado
+
+
+def leer(database: Session, oficina_id: uuid.UUID, settings: Settings) -> Estado:
+    """Leer el estado de la sala de la oficina, vacía si aún no ha emitido turnos"""
+    sentencia = select(CitSalaEspera.emitidos, CitSalaEspera.admitidos, CitSalaEspera.admitidos_tiempo, CitSalaEspera.tasa)
+    fila = database.execute(sentencia.where(CitSalaEspera.oficina_id == oficina_id)).one_or_none()
+    if fila is None:
+        return Estado(0, float(settings.SALA_ESPERA_RAFAGA), time.time(), settings.SALA_ESPERA_TASA)
+    return Estado(fila.emitidos, fila.admitidos, fila.admitidos_tiempo, fila.tasa or settings.SALA_ESPERA_TASA)
+
+
+class CacheSalasEspera:
+    """Estado de cada sala en memoria, la frontera se calcula con el reloj así que solo se relee cada ESTADO_TTL"""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._entradas: dict[uuid.UUID, tuple[float, Estado]] = {}
+
+    def guardar(self, oficina_id: uuid.UUID, estado: Estado) -> None:
+        """Guardar el estado recién leído o emitido"""
+        with self._candado:
+            self._entradas[oficina_id] = (time.monotonic(), estado)
+
+    def obtener(self, oficina_id: uuid.UUID, numero: int, settings: Settings) -> Estado:
+        """Estado de la sala, se relee si venció o si el turno dado es más nuevo que lo que se tiene"""
+        entrada = self._entradas.get(oficina_id)
+        if entrada is not None and time.monotonic() - entrada[0] < ESTADO_TTL and numero <= entrada[1].emitidos:
+            return entrada[1]
+        database = session_maker()
+        try:
+            estado = leer(database, oficina_id, settings)
+        finally:
+            database.close()
+        self.guardar(oficina_id, estado)
+        return estado
+
+
+cache_salas_espera = CacheSalasEspera()
+
+
+def firmar_turno(turno: Turno, settings: Settings) -> str:
+    """Firmar el turno como JWT"""
+    payload = {
+        "sub": turno.username,
+        "oficina_id": str(turno.oficina_id),
+        "oficina_clave": turno.oficina_clave,
+        "turno": turno.numero,
+        "exp": int(turno.expiracion),
+        "aud": AUDIENCIA,
+    }
+    return jwt.encode(payload=payload, key=settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def leer_turno(token: str, settings: Settings) -> Turno:
+    """Verificar la firma y la vigencia del turno"""
+    try:
+        payload = jwt.decode(jwt=token, key=settings.SECRET_KEY, algorithms=[settings.ALGORITHM], audience=AUDIENCIA)
+        return Turno(
+            username=payload["sub"],
+            oficina_id=uuid.UUID(payload["oficina_id"]),
+            oficina_clave=payload["oficina_clave"],
+            numero=int(payload["turno"]),
+            expiracion=float(payload["exp"]),
+        )
+    except jwt.ExpiredSignatureError as error:
+        raise MyAuthenticationError("Ha caducado el turno, solicite uno nuevo") from error
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError) as error:
+        raise MyAuthenticationError("No es válido el turno") from error
+
+
+def calcular_posicion(numero: int, estado: Estado, settings: Settings) -> tuple[int, int]:
+    """Cuántos turnos faltan para que el dado sea admitido y los segundos estimados, ceros si ya lo fue"""
+    faltan = numero - estado.frontera(settings.SALA_ESPERA_RAFAGA, time.time())
+    if faltan <= 0:
+        return 0, 0
+    return math.ceil(faltan), math.ceil(faltan / estado.tasa)
+
+
+def exigir_turno_admitido(settings: Settings, username: str, oficina: Oficina, token: str | None) -> Turno | None:
+    """
+    Con SALA_ESPERA_ACTIVA, causar 403 si no trae un turno válido del cliente y la oficina o 429 si aún no pasa
+
+    Regresa el turno admitido, o None sin SALA_ESPERA_ACTIVA. Puede leer la sala de la base de datos, desde una ruta
+    async se llama con asyncio.to_thread.
+    """
+    if not settings.SALA_ESPERA_ACTIVA:
+        return None
+    if token is None:
+        metricas.incrementar("sala_espera.invalidos")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Necesita un turno de la sala de espera")
+    try:
+        turno = leer_turno(token, settings)
+    except MyAuthenticationError as error:
+        metricas.incrementar("sala_espera.invalidos")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(error))
+    if turno.username != username or turno.oficina_id != oficina.id:
+        metricas.incrementar("sala_espera.invalidos")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="El turno no es de este cliente u oficina")
+
+    # Esperar si la frontera no ha llegado al turno
+    posicion, espera = calcular_posicion(turno.numero, cache_salas_espera.obtener(oficina.id, turno.numero, settings), settings)
+    if posicion > 0:
+        metricas.incrementar("sala_espera.no_admitidos")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Su turno aún no pasa, faltan {posicion} turnos",
+            headers={"Retry-After": str(espera)},
+        )
+    metricas.incrementar("sala_espera.admitidos")
+    return turno
+
+
+def turno_usado(database: Session, turno: Turno) -> bool:
+    """Si el turno ya se usó para agendar una cita"""
+    sentencia = (
+        select(CitSalaEsperaTurno.id)
+        .where(CitSalaEsperaTurno.oficina_id == turno.oficina_id)
+        .where(CitSalaEsperaTurno.numero == turno.numero)
+    )
+    return database.execute(sentencia).first() is not None
+
+
+def exigir_turno_sin_usar(database: Session, turno: Turno) -> None:
+    """Causar 403 si el turno ya se usó para agendar una cita"""
+    if turno_usado(database, turno):
+        metricas.incrementar("sala_espera.usados")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Ese turno ya se usó, solicite uno nuevo")
+
+
+def usar_turno(database: Session, turno: Turno) -> bool:
+    """Marcar el turno como usado en la transacción de la cita, False si otra solicitud ya lo usó"""
+    sentencia = (
+        insert(CitSalaEsperaTurno)
+        .values(
+            oficina_id=turno.oficina_id,
+            numero=turno.numero,
+            expiracion=func.now() + timedelta(seconds=max(0.0, turno.expiracion - time.time())),
+        )
+        .on_conflict_do_nothing(index_elements=["oficina_id", "numero"])
+        .returning(CitSalaEsperaTurno.id)
+    )
+    if database.execute(sentencia).first() is None:
+        metricas.incrementar("sala_espera.usados")
+        return False
+    return True
@@ -2,28 +2,40 @@
 PJECZ Casiopea API OAuth2
 """
 
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from typing import Annotated
 
 from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_pagination import add_pagination
+from fastapi_pagination.utils import disable_installed_extensions_check
 
 from .config.settings import Settings, get_settings
 from .dependencies.authentications import authenticate_user, encode_token
+from .dependencies.compresion import CompresionMiddleware
+from .dependencies.concurrencia import ConcurrenciaMiddleware
+from .dependencies.control_acceso import crear_cliente_http
 from .dependencies.database import Session, get_db
 from .dependencies.exceptions import MyAnyError
+from .dependencies.metricas import exigir_metricas_token, metricas
+from .dependencies.plazos import PlazoMiddleware
+from .dependencies.respuestas import RespuestaJSON
 from .routers.autoridades import autoridades
+from .routers.cit_catalogos import cit_catalogos
 from .routers.cit_categorias import cit_categorias
 from .routers.cit_citas import cit_citas
 from .routers.cit_clientes import cit_clientes
 from .routers.cit_clientes_recuperaciones import cit_clientes_recuperaciones
 from .routers.cit_clientes_registros import cit_clientes_registros
+from .routers.cit_codigos_barras import cit_codigos_barras
 from .routers.cit_dias_disponibles import cit_dias_disponibles
 from .routers.cit_dias_inhabiles import cit_dias_inhabiles
 from .routers.cit_horas_bloqueadas import cit_horas_bloqueadas
 from .routers.cit_horas_disponibles import cit_horas_disponibles
 from .routers.cit_oficinas_servicios import cit_oficinas_servicios
+from .routers.cit_salas_espera import cit_salas_espera
 from .routers.cit_servicios import cit_servicios
 from .routers.distritos import distritos
 from .routers.domicilios import domicilios
@@ -31,6 +43,30 @@ from .routers.exp_juzgados import exp_juzgados
 from .routers.materias import materias
 from .routers.oficinas import oficinas
 from .schemas.cit_clientes import Token
+from .services.almacenamiento import cerrar_almacenamiento
+from .services.codigo_barras import reserva_codigos_barras, validar_configuracion
+from .services.invalidacion import bus_invalidacion
+from .services.sendmail import precompilar_plantillas
+from .services.transporte_correo import cerrar_transporte
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Crear al iniciar y cerrar al terminar los recursos compartidos por todas las peticiones"""
+    validar_configuracion(get_settings())
+    app.state.control_acceso_cliente = crear_cliente_http(get_settings())
+    precompilar_plantillas()
+    productor_codigos_barras = asyncio.create_task(reserva_codigos_barras.ejecutar())
+    escucha_invalidaciones = asyncio.create_task(bus_invalidacion.escuchar())
+    yield
+    for tarea in (productor_codigos_barras, escucha_invalidaciones):
+        tarea.cancel()
+        with suppress(asyncio.CancelledError):
+            await tarea
+    await app.state.control_acceso_cliente.aclose()
+    cerrar_almacenamiento()
+    cerrar_transporte()
+
 
 # FastAPI
 app = FastAPI(
@@ -39,10 +75,24 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url=None,
     version="1.4.2",
+    lifespan=lifespan,
+    default_response_class=RespuestaJSON,
 )
 
-# CORSMiddleware
+# PlazoMiddleware, se agrega antes que CORSMiddleware para quedar dentro de él y que el 504 lleve sus encabezados
 settings = get_settings()
+app.add_middleware(PlazoMiddleware, defecto=settings.PLAZO_SEGUNDOS)
+
+# ConcurrenciaMiddleware, envuelve a PlazoMiddleware para que sus 504 bajen el límite y la espera en cola no gaste el plazo
+app.add_middleware(
+    ConcurrenciaMiddleware,
+    escritura_maximo=settings.CONCURRENCIA_ESCRITURA_MAXIMO,
+    escritura_objetivo=settings.CONCURRENCIA_ESCRITURA_OBJETIVO,
+    lectura_maximo=settings.CONCURRENCIA_LECTURA_MAXIMO,
+    lectura_objetivo=settings.CONCURRENCIA_LECTURA_OBJETIVO,
+)
+
+# CORSMiddleware
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ORIGINS.split(","),
@@ -51,18 +101,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# CompresionMiddleware
+app.add_middleware(CompresionMiddleware, minimo=settings.COMPRESION_MINIMO)
+
 # Rutas
 app.include_router(autoridades, tags=["autoridades"])
+app.include_router(cit_catalogos, tags=["citas"])
 app.include_router(cit_categorias, tags=["citas"])
 app.include_router(cit_citas, tags=["citas"])
 app.include_router(cit_clientes, tags=["citas"])
 app.include_router(cit_clientes_recuperaciones, tags=["citas"])
 app.include_router(cit_clientes_registros, tags=["citas"])
+app.include_router(cit_codigos_barras, tags=["citas"])
 app.include_router(cit_dias_disponibles, tags=["citas"])
 app.include_router(cit_dias_inhabiles, tags=["citas"])
 app.include_router(cit_horas_disponibles, tags=["citas"])
 app.include_router(cit_horas_bloqueadas, tags=["citas"])
 app.include_router(cit_oficinas_servicios, tags=["citas"])
+app.include_router(cit_salas_espera, tags=["citas"])
 app.include_router(cit_servicios, tags=["citas"])
 app.include_router(distritos, tags=["autoridades"])
 app.include_router(domicilios, tags=["oficinas"])
@@ -73,6 +129,9 @@ app.include_router(materias, tags=["autoridades"])
 # Paginación
 add_pagination(app)
 
+# Los catálogos se paginan desde listas en memoria, no por la extensión de SQLAlchemy
+disable_installed_extensions_check()
+
 
 # Mensaje de Bienvenida
 @app.get("/")
@@ -81,6 +140,12 @@ async def root():
     return {"message": "API OAuth2 del sistema de citas."}
 
 
+@app.get("/metricas", include_in_schema=False, dependencies=[Depends(exigir_metricas_token)])
+async def metricas_del_proceso():
+    """Métricas en memoria de este proceso"""
+    return metricas.resumen()
+
+
 @app.post("/token", response_model=Token)
 async def login(
     database: Annotated[Session, Depends(get_db)],
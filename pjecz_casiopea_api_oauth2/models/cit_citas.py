@@ -26,7 +26,7 @@ class CitCita(Base, UniversalMixin):
         "PENDIENTE": "Pendiente",
     }
 
-    # Nombre de la tabla
+    # Nombre de la tabla, particionada por mes en inicio, en la base de datos la llave primaria es (id, inicio)
     __tablename__ = "cit_citas"
 
     # Clave primaria
@@ -51,8 +51,12 @@ class CitCita(Base, UniversalMixin):
     codigo_acceso_id: Mapped[Optional[int]]
     # codigo_acceso_imagen: Mapped[Optional[bytes]] = mapped_column(BYTEA)
     codigo_acceso_url: Mapped[Optional[str]] = mapped_column(String(512))
+    codigo_acceso_pendiente: Mapped[bool] = mapped_column(default=False)  # Creada en modo degradado, falta el código
+    codigo_acceso_intentos: Mapped[int] = mapped_column(default=0)
+    codigo_acceso_tomado_hasta: Mapped[Optional[datetime]]  # Hasta cuándo un intento tiene tomada la cita pendiente
     codigo_barras: Mapped[Optional[str]] = mapped_column(String(13))
     codigo_barras_url: Mapped[Optional[str]] = mapped_column(String(512))
+    recordatorio_enviado: Mapped[Optional[datetime]]  # Cuándo se envió el recordatorio, nulo si aún no
 
     # @property
     # def codigo_acceso_imagen_base64(self):
@@ -0,0 +1,31 @@
+"""
+Cit Códigos de Barras, modelos
+"""
+
+import uuid
+
+from sqlalchemy import String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..dependencies.database import Base
+from ..dependencies.universal_mixin import UniversalMixin
+
+
+class CitCodigoBarras(Base, UniversalMixin):
+    """Reserva de códigos de barras ya generados y subidos, listos para asignarse a una cita"""
+
+    # Nombre de la tabla
+    __tablename__ = "cit_codigos_barras"
+
+    # Clave primaria
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Columnas
+    codigo: Mapped[str] = mapped_column(String(13), unique=True)
+    url: Mapped[str] = mapped_column(String(512))
+    usado: Mapped[bool] = mapped_column(default=False)
+
+    def __repr__(self):
+        """Representación"""
+        return f"<CitCodigoBarras {self.codigo}>"
@@ -0,0 +1,38 @@
+"""
+Cit Idempotencias, modelos
+"""
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import LargeBinary, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..dependencies.database import Base
+from ..dependencies.universal_mixin import UniversalMixin
+
+
+class CitIdempotencia(Base, UniversalMixin):
+    """Huella y respuesta guardada de una solicitud con Idempotency-Key, para entregarla de nuevo en los reintentos"""
+
+    # Nombre de la tabla
+    __tablename__ = "cit_idempotencias"
+    __table_args__ = (UniqueConstraint("alcance", "llave", name="cit_idempotencias_alcance_llave_unique"),)
+
+    # Clave primaria
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Columnas
+    alcance: Mapped[str] = mapped_column(String(512))
+    llave: Mapped[str] = mapped_column(String(256))
+    huella: Mapped[str] = mapped_column(String(64))
+    terminado: Mapped[bool] = mapped_column(default=False)
+    status_code: Mapped[int | None]
+    media_type: Mapped[str | None] = mapped_column(String(128))
+    contenido: Mapped[bytes | None] = mapped_column(LargeBinary)
+    expiracion: Mapped[datetime]
+
+    def __repr__(self):
+        """Representación"""
+        return f"<CitIdempotencia {self.llave}>"
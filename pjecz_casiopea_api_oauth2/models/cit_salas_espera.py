@@ -0,0 +1,35 @@
+"""
+Cit Salas de Espera, modelos
+"""
+
+import uuid
+
+from sqlalchemy import Double, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..dependencies.database import Base
+from ..dependencies.universal_mixin import UniversalMixin
+
+
+class CitSalaEspera(Base, UniversalMixin):
+    """Sala de espera de una oficina: turnos emitidos y frontera de admitidos, que avanza tasa turnos por segundo"""
+
+    # Nombre de la tabla
+    __tablename__ = "cit_salas_espera"
+
+    # Clave primaria
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Claves foráneas
+    oficina_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("oficinas.id"), unique=True)
+
+    # Columnas
+    emitidos: Mapped[int] = mapped_column(default=0)
+    admitidos: Mapped[float] = mapped_column(Double, default=0.0)
+    admitidos_tiempo: Mapped[float] = mapped_column(Double)  # Segundos desde epoch en que se calculó admitidos
+    tasa: Mapped[float | None] = mapped_column(Double)  # Turnos por segundo de esta oficina, si no SALA_ESPERA_TASA
+
+    def __repr__(self):
+        """Representación"""
+        return f"<CitSalaEspera {self.oficina_id}>"
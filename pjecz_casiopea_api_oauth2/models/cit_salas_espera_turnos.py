@@ -0,0 +1,35 @@
+"""
+Cit Salas de Espera Turnos, modelos
+"""
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..dependencies.database import Base
+from ..dependencies.universal_mixin import UniversalMixin
+
+
+class CitSalaEsperaTurno(Base, UniversalMixin):
+    """Turno de la sala de espera ya usado para agendar una cita, cada turno admitido agenda una sola"""
+
+    # Nombre de la tabla
+    __tablename__ = "cit_salas_espera_turnos"
+    __table_args__ = (UniqueConstraint("oficina_id", "numero", name="cit_salas_espera_turnos_oficina_id_numero_unique"),)
+
+    # Clave primaria
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Claves foráneas
+    oficina_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("oficinas.id"))
+
+    # Columnas
+    numero: Mapped[int]
+    expiracion: Mapped[datetime]  # Cuando vence el turno, después la tarea de mantenimiento lo elimina
+
+    def __repr__(self):
+        """Representación"""
+        return f"<CitSalaEsperaTurno {self.oficina_id} {self.numero}>"
@@ -4,20 +4,18 @@ Autoridades, routers
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi_pagination import paginate
 
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
+from ..dependencies.etag import responder_etag
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
+from ..dependencies.respuestas import respuesta_confiable
 from ..dependencies.safe_string import safe_clave
-from ..models.autoridades import Autoridad
-from ..models.distritos import Distrito
-from ..models.materias import Materia
 from ..models.permisos import Permiso
 from ..schemas.autoridades import AutoridadOut, OneAutoridadOut
 from ..schemas.cit_clientes import CitClienteInDB
+from ..services.catalogos import Catalogos, get_catalogos
 
 autoridades = APIRouter(prefix="/api/v5/autoridades")
 
@@ -25,44 +23,50 @@ autoridades = APIRouter(prefix="/api/v5/autoridades")
 @autoridades.get("/{clave}", response_model=OneAutoridadOut)
 async def detalle(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     clave: str,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Detalle de una autoridad a partir de su clave"""
     if current_user.permissions.get("AUTORIDADES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    no_modificado = responder_etag(response, if_none_match, catalogos.autoridades.etag)
+    if no_modificado is not None:
+        return no_modificado
     try:
         clave = safe_clave(clave)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No es válida la clave")
-    try:
-        autoridad = database.query(Autoridad).filter_by(clave=clave).one()
-    except (MultipleResultsFound, NoResultFound):
+    autoridad = catalogos.autoridades.por_clave.get(clave)
+    if autoridad is None:
         return OneAutoridadOut(success=False, message="No existe esa autoridad")
     if autoridad.es_activo is False:
         return OneAutoridadOut(success=False, message="No está activa esa autoridad")
     if autoridad.estatus != "A":
         return OneAutoridadOut(success=False, message="Esta autoridad está eliminada")
-    return OneAutoridadOut(success=True, message=f"Autoridad {clave}", data=AutoridadOut.model_validate(autoridad))
+    return respuesta_confiable(OneAutoridadOut(success=True, message=f"Autoridad {clave}", data=autoridad.datos), response)
 
 
 @autoridades.get("", response_model=CustomPage[AutoridadOut])
 async def paginado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     distrito_clave: str = "",
     materia_clave: str = "",
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Paginado de autoridades"""
     if current_user.permissions.get("AUTORIDADES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    consulta = database.query(Autoridad)
+    no_modificado = responder_etag(response, if_none_match, catalogos.autoridades.etag)
+    if no_modificado is not None:
+        return no_modificado
     if distrito_clave:
         distrito_clave = safe_clave(distrito_clave)
-        if distrito_clave != "":
-            consulta = consulta.join(Distrito).filter(Distrito.clave == distrito_clave)
     if materia_clave:
         materia_clave = safe_clave(materia_clave)
-        if materia_clave != "":
-            consulta = consulta.join(Materia).filter(Materia.clave == materia_clave)
-    return paginate(consulta.filter(Autoridad.es_activo == True).filter(Autoridad.estatus == "A").order_by(Autoridad.clave))
+    return respuesta_confiable(
+        paginate(catalogos.autoridades.filtrar(distrito_clave=distrito_clave, materia_clave=materia_clave)), response
+    )
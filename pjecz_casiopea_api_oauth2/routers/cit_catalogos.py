@@ -0,0 +1,130 @@
+"""
+Cit Catálogos, routers
+"""
+
+from dataclasses import dataclass
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+
+from ..config.settings import Settings, get_settings
+from ..dependencies.authentications import get_current_active_user
+from ..dependencies.compresion import BROTLI_CALIDAD_MAXIMA, comprimir_brotli, comprimir_gzip, elegir_codificacion
+from ..dependencies.etag import CACHE_CONTROL, coincide_etag, crear_etag
+from ..dependencies.metricas import metricas
+from ..dependencies.respuestas import serializar
+from ..models.permisos import Permiso
+from ..schemas.cit_catalogos import CitCatalogoServicioOut, CitCatalogosOut, OneCitCatalogosOut
+from ..schemas.cit_clientes import CitClienteInDB
+from ..services.catalogos import Catalogos, get_catalogos
+from .cit_dias_disponibles import crear_etag_dias_disponibles, listar_dias_disponibles
+
+cit_catalogos = APIRouter(prefix="/api/v5/cit_catalogos")
+
+
+@dataclass(frozen=True, slots=True)
+class Paquete:
+    """Catálogos ya serializados, sin comprimir y comprimidos con br y gzip, de una versión"""
+
+    version: str
+    contenido: bytes
+    contenido_br: bytes
+    contenido_gzip: bytes
+
+    def cuerpo(self, codificacion: str | None) -> bytes:
+        """Cuerpo en la codificación dada, br, gzip o sin comprimir con None"""
+        if codificacion == "br":
+            return self.contenido_br
+        if codificacion == "gzip":
+            return self.contenido_gzip
+        return self.contenido
+
+
+_paquete: Paquete | None = None
+
+
+def crear_version(catalogos: Catalogos, settings: Settings) -> str:
+    """Versión del paquete, cambia si cambia algún catálogo o los días disponibles"""
+    return crear_etag(
+        catalogos.cit_categorias.etag,
+        catalogos.cit_servicios.etag,
+        catalogos.oficinas.etag,
+        catalogos.cit_oficinas_servicios.etag,
+        crear_etag_dias_disponibles(catalogos, settings),
+    ).strip('"')
+
+
+def crear_paquete(catalogos: Catalogos, settings: Settings, version: str) -> Paquete:
+    """Serializar y comprimir los catálogos del formulario de citas"""
+    cit_servicios = [CitCatalogoServicioOut.model_validate(cit_servicio) for cit_servicio in catalogos.cit_servicios.filtrar()]
+    oficinas = catalogos.oficinas.filtrar()
+
+    # Matriz de compatibilidad, las claves de los servicios vigentes que ofrece cada oficina vigente
+    cit_servicios_claves = {cit_servicio.clave for cit_servicio in cit_servicios}
+    oficinas_servicios = {oficina.clave: [] for oficina in oficinas}
+    for cit_oficina_servicio in catalogos.cit_oficinas_servicios.filtrar():
+        if cit_oficina_servicio.cit_servicio_clave not in cit_servicios_claves:
+            continue
+        if cit_oficina_servicio.oficina_clave in oficinas_servicios:
+            oficinas_servicios[cit_oficina_servicio.oficina_clave].append(cit_oficina_servicio.cit_servicio_clave)
+    for claves in oficinas_servicios.values():
+        claves.sort()
+
+    # Serializar una sola vez por versión
+    contenido = serializar(
+        OneCitCatalogosOut(
+            success=True,
+            message="Catálogos del formulario de citas",
+            data=CitCatalogosOut(
+                version=version,
+                cit_categorias=catalogos.cit_categorias.filtrar(),
+                cit_servicios=cit_servicios,
+                oficinas=oficinas,
+                oficinas_servicios=oficinas_servicios,
+                dias_disponibles=listar_dias_disponibles(catalogos, settings),
+            ),
+        )
+    )
+    metricas.incrementar("cit_catalogos.paquetes")
+    return Paquete(
+        version=version,
+        contenido=contenido,
+        contenido_br=comprimir_brotli(contenido, BROTLI_CALIDAD_MAXIMA),
+        contenido_gzip=comprimir_gzip(contenido),
+    )
+
+
+@cit_catalogos.get("", response_model=OneCitCatalogosOut)
+async def listado(
+    current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    settings: Annotated[Settings, Depends(get_settings)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+):
+    """Categorías, servicios, oficinas, servicios por oficina y días disponibles en una sola respuesta"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.CREAR:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+    # Cada codificación es una representación distinta, con su propio ETag
+    version = crear_version(catalogos, settings)
+    codificacion = elegir_codificacion(accept_encoding)
+    encabezados = {
+        "ETag": f'"{version}-{codificacion}"' if codificacion else f'"{version}"',
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if coincide_etag(if_none_match, encabezados["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=encabezados)
+
+    # Serializar y comprimir solo cuando cambia la versión
+    global _paquete
+    paquete_actual = _paquete
+    if paquete_actual is None or paquete_actual.version != version:
+        paquete_actual = crear_paquete(catalogos, settings, version)
+        _paquete = paquete_actual
+
+    # Entregar ya comprimido, el middleware de compresión no vuelve a comprimir si trae Content-Encoding
+    if codificacion:
+        encabezados["Content-Encoding"] = codificacion
+    return Response(content=paquete_actual.cuerpo(codificacion), media_type="application/json", headers=encabezados)
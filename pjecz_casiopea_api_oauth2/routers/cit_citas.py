@@ -2,34 +2,39 @@
 Cit Citas, routers
 """
 
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, time, timedelta
 from typing import Annotated
 
-import requests
-from fastapi import APIRouter, Depends, HTTPException, status
+import httpx
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status
 from fastapi_pagination.ext.sqlalchemy import paginate
 from sqlalchemy.exc import MultipleResultsFound, NoResultFound
-from sqlalchemy import func
 
 from ..config.settings import Settings, get_settings
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.control_acceso import decodificar_imagen, generar_referencia
+from ..dependencies.control_acceso import get_control_acceso_cliente, solicitar_codigo_acceso_protegido
 from ..dependencies.database import Session, get_db
+from ..dependencies.exceptions import MyAnyError, MyConnectionError, MyTimeoutError
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
+from ..dependencies.idempotencia import post_idempotente
+from ..dependencies.metricas import metricas
 from ..dependencies.pwgen import generar_codigo_asistencia
 from ..dependencies.safe_string import safe_clave, safe_string, safe_uuid
+from ..dependencies.sala_espera import exigir_turno_admitido, exigir_turno_sin_usar, usar_turno
 from ..models.cit_citas import CitCita
-from ..models.cit_dias_inhabiles import CitDiaInhabil
 from ..models.cit_oficinas_servicios import CitOficinaServicio
 from ..models.cit_servicios import CitServicio
 from ..models.oficinas import Oficina
 from ..models.permisos import Permiso
 from ..schemas.cit_citas import CitCitaIn, CitCitaOut, OneCitCitaOut
 from ..schemas.cit_clientes import CitClienteInDB
+from ..services.catalogos import Catalogos, get_catalogos
+from ..services.codigo_barras import CodigoBarras
+from ..services.codigos_acceso import completar_codigo_acceso, crear_payload
+from ..services.sendmail import Email, MyRequestError, PlantillaCitaCancelada, PlantillaCitaCreada
 from .cit_dias_disponibles import listar_dias_disponibles
 from .cit_horas_disponibles import listar_horas_disponibles
-from ..services.sendmail import MyRequestError, Email, PlantillaCitaCancelada, PlantillaCitaCreada
-from ..services.codigo_barras import CodigoBarras
 
 LIMITE_CITAS_PENDIENTES = 3
 
@@ -40,6 +45,7 @@ cit_citas = APIRouter(prefix="/api/v5/cit_citas")
 async def cancelar(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
     database: Annotated[Session, Depends(get_db)],
+    background_tasks: BackgroundTasks,
     cit_cita_id: str,
 ):
     """Cancelar una cita"""
@@ -79,12 +85,9 @@ async def cancelar(
         fecha_hora_cancelacion=datetime.now(),
     )
 
-    # Envío de email
+    # Envío de email después de entregar la respuesta, la cita ya está cancelada aunque falle
     send_email = Email(cit_cita.cit_cliente_email, plantilla_email_cita_cancelada)
-    try:
-        send_email.enviar_email()
-    except MyRequestError as error:
-        return OneCitCitaOut(success=False, message=str(error))
+    background_tasks.add_task(send_email.enviar_email_segundo_plano)
 
     # Entregar
     return OneCitCitaOut(
@@ -94,14 +97,18 @@ async def cancelar(
     )
 
 
-@cit_citas.post("/crear", response_model=OneCitCitaOut)
+@post_idempotente(cit_citas, "/crear", response_model=OneCitCitaOut)
 async def crear(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
     database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
     settings: Annotated[Settings, Depends(get_settings)],
+    control_acceso_cliente: Annotated[httpx.AsyncClient, Depends(get_control_acceso_cliente)],
+    background_tasks: BackgroundTasks,
     cit_cita_in: CitCitaIn,
+    x_turno: Annotated[str | None, Header()] = None,
 ):
-    """Crear una cita"""
+    """Crear una cita, con la sala de espera activa necesita el turno admitido en el encabezado X-Turno"""
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.CREAR:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
@@ -117,6 +124,11 @@ async def crear(
     if oficina.estatus != "A":
         return OneCitCitaOut(success=False, message="No está habilitada esa oficina")
 
+    # Validar el turno de la sala de espera, cada turno admitido agenda una sola cita
+    turno = await asyncio.to_thread(exigir_turno_admitido, settings, current_user.username, oficina, x_turno)
+    if turno is not None:
+        await asyncio.to_thread(exigir_turno_sin_usar, database, turno)
+
     # Consultar el servicio
     try:
         cit_servicio_clave = safe_clave(cit_cita_in.cit_servicio_clave)
@@ -142,7 +154,7 @@ async def crear(
         return OneCitCitaOut(success=False, message="No se puede agendar el servicio en la oficina")
 
     # Validar que la fecha sea un día disponible
-    if cit_cita_in.fecha not in listar_dias_disponibles(database, settings):
+    if cit_cita_in.fecha not in listar_dias_disponibles(catalogos, settings):
         return OneCitCitaOut(success=False, message="No es válida la fecha")
 
     # Validar la hora_minuto, respecto a las horas disponibles
@@ -181,7 +193,7 @@ async def crear(
     cit_citas_cit_cliente_cantidad = (
         database.query(CitCita)
         .filter(CitCita.cit_cliente_id == current_user.id)
-        .filter(func.date(CitCita.inicio) >= datetime.now().date())
+        .filter(CitCita.inicio >= datetime.combine(datetime.now().date(), time.min))
         .filter(CitCita.estado == "PENDIENTE")
         .filter(CitCita.estatus == "A")
         .count()
@@ -212,8 +224,7 @@ async def crear(
     cancelar_antes = inicio_dt - timedelta(hours=24)
 
     # Si cancelar_antes es un dia inhábil, domingo o sábado, se busca el dia habil anterior
-    cit_dias_inhabiles = database.query(CitDiaInhabil).filter_by(estatus="A").order_by(CitDiaInhabil.fecha).all()
-    cit_dias_inhabiles_listado = [di.fecha for di in cit_dias_inhabiles]
+    cit_dias_inhabiles_listado = catalogos.fechas_inhabiles
     while cancelar_antes.date() in cit_dias_inhabiles_listado or cancelar_antes.weekday() == 6 or cancelar_antes.weekday() == 5:
         if cancelar_antes.date() in cit_dias_inhabiles_listado:
             cancelar_antes = cancelar_antes - timedelta(days=1)
@@ -224,51 +235,29 @@ async def crear(
 
     codigo_acceso_id = None
     codigo_acceso_url = None
+    codigo_acceso_pendiente = False
     codigo_barras_num = None
     codigo_barras_url = None
     if oficina.puede_enviar_qr:
         # Obtener código de acceso, entrega idAcceso (int), imagen (str), success (bool) y message (str)
-        payload = {
-            "aplicacion": settings.CONTROL_ACCESO_APLICACION,
-            "referencia": generar_referencia(current_user.email, cit_servicio.clave, oficina.clave, inicio_dt),
-            "nombres": current_user.nombres,
-            "apellidos": f"{current_user.apellido_primero} {current_user.apellido_segundo}",
-            "correoElectronico": current_user.email,
-            "telefono": f"+52{current_user.telefono}",
-            "Duracion": 60,
-            "fecha": inicio_dt.isoformat(timespec="minutes"),
-            "cita": True,
-            "PrivilegeGroups": [],
-        }
+        payload = crear_payload(settings, current_user, cit_servicio.clave, oficina.clave, inicio_dt)
         try:
-            respuesta = requests.post(
-                url=settings.CONTROL_ACCESO_URL,
-                headers={"X-Api-Key": settings.CONTROL_ACCESO_API_KEY},
-                timeout=settings.CONTROL_ACCESO_TIMEOUT,
-                json=payload,
-            )
-        except requests.exceptions.ConnectionError as error:
-            return OneCitCitaOut(success=False, message=f"ERROR: No responde Control Acceso: {str(error)}")
-        if respuesta.status_code != 200:
-            return OneCitCitaOut(
-                success=False, message=f"ERROR: No fue código 200 la respuesta de Control Acceso: {respuesta.text}"
+            codigo_acceso_id, codigo_acceso_url = await solicitar_codigo_acceso_protegido(
+                control_acceso_cliente, settings, payload
             )
-        contenido = respuesta.json()
-        if contenido.get("success") is False:
-            return OneCitCitaOut(
-                success=False, message=f"ERROR: Falló la obtención del Código de Acceso: {contenido.get('message')}"
-            )
-        codigo_acceso_id = contenido.get("idAcceso")
-        if not codigo_acceso_id:
-            return OneCitCitaOut(success=False, message="ERROR: Faltó la idAcceso en la respuesta de Control Acceso")
-        codigo_acceso_url = contenido.get("imagen")
-        if not codigo_acceso_url:
-            return OneCitCitaOut(success=False, message="ERROR: Faltó la imagen en la respuesta de Control Acceso")
-
-        # Crear el código de barras de asistencia
+        except (MyConnectionError, MyRequestError, MyTimeoutError) as error:
+            # En modo degradado se agenda la cita y el código de acceso se obtiene después
+            if not settings.CONTROL_ACCESO_MODO_DEGRADADO:
+                return OneCitCitaOut(success=False, message=f"ERROR: {str(error)}")
+            codigo_acceso_pendiente = True
+            metricas.incrementar("control_acceso.modo_degradado")
+        except MyAnyError as error:
+            return OneCitCitaOut(success=False, message=f"ERROR: {str(error)}")
+
+        # Tomar el código de barras de asistencia de la reserva, se confirma al guardar la cita
         codigo_barras = CodigoBarras(database)
         try:
-            codigo_barras_num, codigo_barras_url = codigo_barras.crear_y_subir()
+            codigo_barras_num, codigo_barras_url = await asyncio.to_thread(codigo_barras.reclamar)
         except ConnectionError as e:
             # Captura errores de conexión o de la API de Google Storage
             return OneCitCitaOut(success=False, message=f"ERROR: Falló la comunicación para generar el código de barras de asistencia. {e}")
@@ -290,13 +279,25 @@ async def crear(
         codigo_asistencia=generar_codigo_asistencia(),
         codigo_acceso_id=codigo_acceso_id,
         codigo_acceso_url=codigo_acceso_url,
+        codigo_acceso_pendiente=codigo_acceso_pendiente,
         codigo_barras=codigo_barras_num,
         codigo_barras_url=codigo_barras_url,
     )
     database.add(cit_cita)
+    if turno is not None and not usar_turno(database, turno):
+        return OneCitCitaOut(success=False, message="No se puede crear la cita porque ese turno ya se usó")
     database.commit()
     database.refresh(cit_cita)
 
+    # Si falta el código de acceso, se obtiene y se envía el email en segundo plano
+    if codigo_acceso_pendiente:
+        background_tasks.add_task(completar_codigo_acceso, control_acceso_cliente, settings, cit_cita.id)
+        return OneCitCitaOut(
+            success=True,
+            message="Se ha creado la cita, el código de acceso se enviará a su e-mail en cuanto esté disponible",
+            data=CitCitaOut.model_validate(cit_cita),
+        )
+
     # Creación de la plantilla para el email
     plantilla_email_cita_creada = PlantillaCitaCreada(
         id=str(cit_cita.id),
@@ -309,12 +310,9 @@ async def crear(
         codigo_barras_url=cit_cita.codigo_barras_url,
     )
 
-    # Envío de email
+    # Envío de email después de entregar la respuesta, la cita ya está creada aunque falle
     send_email = Email(cit_cita.cit_cliente_email, plantilla_email_cita_creada)
-    try:
-        send_email.enviar_email()
-    except MyRequestError as error:
-        return OneCitCitaOut(success=False, message=str(error))
+    background_tasks.add_task(send_email.enviar_email_segundo_plano)
 
     # Entregar
     return OneCitCitaOut(
@@ -384,5 +382,5 @@ async def mis_citas(
     """Mis PROPIAS citas en estado PENDIENTE o ASISTIO"""
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    consulta = database.query(CitCita).filter(CitCita.cit_cliente_id == current_user.id).filter(func.date(CitCita.inicio) >= datetime.now().date()).filter(CitCita.estado.in_(["PENDIENTE", "ASISTIO"])).filter(CitCita.estatus == "A")
+    consulta = database.query(CitCita).filter(CitCita.cit_cliente_id == current_user.id).filter(CitCita.inicio >= datetime.combine(datetime.now().date(), time.min)).filter(CitCita.estado.in_(["PENDIENTE", "ASISTIO"])).filter(CitCita.estatus == "A")
     return paginate(consulta.order_by(CitCita.inicio.desc()))
@@ -12,6 +12,7 @@ from passlib.context import CryptContext
 
 from ..config.settings import Settings, get_settings
 from ..dependencies.database import Session, get_db
+from ..dependencies.exceptions import MyAnyError
 from ..dependencies.pwgen import CADENA_VALIDAR_REGEXP, generar_cadena_para_validar
 from ..dependencies.safe_string import safe_email, safe_string
 from ..models.cit_clientes import CitCliente
@@ -23,7 +24,7 @@ from ..schemas.cit_clientes_recuperaciones import (
     TerminarCitClienteRecuperacionIn,
     ValidarCitClienteRecuperacionIn,
 )
-from ..services.sendmail import MyRequestError, Email, PlantillaClienteCambiarContrasena, PlantillaClienteCompletado
+from ..services.sendmail import Email, PlantillaClienteCambiarContrasena, PlantillaClienteCompletado
 
 
 EXPIRACION_HORAS = 24
@@ -89,8 +90,8 @@ async def solicitar(
     # Enviar Email por SendGrid
     send_email = Email(cit_cliente.email, plantilla_email_cliente_cambio_contrasena)
     try:
-        send_email.enviar_email()
-    except MyRequestError as error:
+        await send_email.enviar_email_async()
+    except MyAnyError as error:
         return OneCitClienteRecuperacionOut(success=False, message=f"Error al enviar el mensaje por Sendgrid: {str(error)}")
 
     # Entregar
@@ -211,8 +212,8 @@ async def terminar(
     # Enviar Email por SendGrid
     send_email = Email(cit_cliente.email, plantilla_email_cliente_completado)
     try:
-        send_email.enviar_email()
-    except MyRequestError as error:
+        await send_email.enviar_email_async()
+    except MyAnyError as error:
         return OneCitClienteRecuperacionOut(success=False, message=str(error))
 
     # Entregar
@@ -12,6 +12,8 @@ from passlib.context import CryptContext
 
 from ..config.settings import Settings, get_settings
 from ..dependencies.database import Session, get_db
+from ..dependencies.exceptions import MyAnyError
+from ..dependencies.idempotencia import post_idempotente
 from ..dependencies.pwgen import CADENA_VALIDAR_REGEXP, generar_cadena_para_validar
 from ..dependencies.safe_string import safe_curp, safe_email, safe_string, safe_telefono
 from ..models.cit_clientes import CitCliente
@@ -23,7 +25,7 @@ from ..schemas.cit_clientes_registros import (
     TerminarCitClienteRegistroIn,
     ValidarCitClienteRegistroIn,
 )
-from ..services.sendmail import MyRequestError, Email, PlantillaClienteCompletado, PlantillaClienteValidarCuenta
+from ..services.sendmail import Email, PlantillaClienteCompletado, PlantillaClienteValidarCuenta
 
 EXPIRACION_HORAS = 24
 LIMITE_CITAS_PENDIENTES = 3
@@ -32,7 +34,7 @@ RENOVACION_DIAS = 365
 cit_clientes_registros = APIRouter(prefix="/api/v5/cit_clientes_registros")
 
 
-@cit_clientes_registros.post("/solicitar", response_model=OneCitClienteRegistroOut)
+@post_idempotente(cit_clientes_registros, "/solicitar", response_model=OneCitClienteRegistroOut)
 async def solicitar(
     database: Annotated[Session, Depends(get_db)],
     settings: Annotated[Settings, Depends(get_settings)],
@@ -125,8 +127,8 @@ async def solicitar(
     # Enviar Email por SendGrid
     send_email = Email(cit_cliente_registro.email, plantilla_email_cliente_validar)
     try:
-        send_email.enviar_email()
-    except MyRequestError as error:
+        await send_email.enviar_email_async()
+    except MyAnyError as error:
         return OneCitClienteRegistroOut(success=False, message=f"Error al enviar el mensaje por Sendgrid: {str(error)}")
 
     # Entregar
@@ -255,8 +257,8 @@ async def terminar(
     # Enviar Email por SendGrid
     send_email = Email(cit_cliente.email, plantilla_email_cliente_completado)
     try:
-        send_email.enviar_email()
-    except MyRequestError as error:
+        await send_email.enviar_email_async()
+    except MyAnyError as error:
         return OneCitClienteRegistroOut(success=False, message=f"Error al enviar el mensaje por Sendgrid: {str(error)}")
 
     # Entregar
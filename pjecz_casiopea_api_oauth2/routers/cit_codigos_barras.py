@@ -0,0 +1,46 @@
+"""
+Cit Códigos de Barras, routers
+"""
+
+import hmac
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Response, status
+
+from ..config.settings import Settings, get_settings
+from ..dependencies.etag import coincide_etag
+from ..services.codigo_barras import DISENO_VERSION, EXTENSIONES, FORMATOS, es_ean13_valido, firmar_imagen, renderizar_ean13
+
+# La imagen nunca cambia para el mismo código, formato y dpi, los tres van en la ruta
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Límite de los dpi de la ruta, el SVG va con cero
+DPI_MAXIMO = 600
+
+cit_codigos_barras = APIRouter(prefix="/api/v5/cit_codigos_barras")
+
+
+@cit_codigos_barras.get("/{formato}/{dpi}/{firma}/{codigo}.{extension}")
+def imagen(
+    settings: Annotated[Settings, Depends(get_settings)],
+    formato: Literal["png", "png_compacto", "svg"],
+    dpi: Annotated[int, Path(ge=0, le=DPI_MAXIMO)],
+    firma: str,
+    codigo: str,
+    extension: str,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    Imagen del código de barras de asistencia, se genera al pedirla y se puede guardar en caché para siempre.
+    Solo responde a las URL firmadas que entrega la API, así no se puede usar para generar imágenes de cualquier código.
+    Es def y no async def para que FastAPI la genere en su grupo de hilos y no detenga el event loop.
+    """
+    if extension != EXTENSIONES[formato] or not es_ean13_valido(codigo) or (formato == "svg") != (dpi == 0):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No es válido el código de barras")
+    if not hmac.compare_digest(firma, firmar_imagen(codigo, formato, dpi, settings.CODIGO_BARRAS_LLAVE)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No es válido el código de barras")
+    etag = f'"{codigo}-{formato}-{dpi}-v{DISENO_VERSION}"'
+    encabezados = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if coincide_etag(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=encabezados)
+    return Response(content=renderizar_ean13(codigo, formato, dpi), media_type=FORMATOS[formato], headers=encabezados)
@@ -6,15 +6,16 @@ from datetime import date, datetime, timedelta
 from typing import Annotated
 
 import pytz
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 
 from ..config.settings import Settings, get_settings
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
-from ..models.cit_dias_inhabiles import CitDiaInhabil
+from ..dependencies.etag import crear_etag, responder_etag
+from ..dependencies.respuestas import respuesta_confiable
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.cit_dias_disponibles import ListCitDiaDisponibleOut
+from ..services.catalogos import Catalogos, get_catalogos
 
 LIMITE_DIAS = 90
 QUITAR_PRIMER_DIA_DESPUES_HORAS = 14
@@ -23,20 +24,13 @@ cit_dias_disponibles = APIRouter(prefix="/api/v5/cit_dias_disponibles")
 
 
 def listar_dias_disponibles(
-    database: Session,
+    catalogos: Catalogos,
     settings: Settings,
 ) -> list[date]:
     """Listar los días disponibles"""
 
-    # Consultar los días inhábiles
-    cit_dias_inhabiles = (
-        database.query(CitDiaInhabil)
-        .filter(CitDiaInhabil.fecha >= date.today())
-        .filter(CitDiaInhabil.estatus == "A")
-        .order_by(CitDiaInhabil.fecha)
-        .all()
-    )
-    dias_inhabiles = [item.fecha for item in cit_dias_inhabiles]
+    # Tomar los días inhábiles de los catálogos en memoria
+    dias_inhabiles = catalogos.fechas_inhabiles
 
     # Acumular los días
     dias_disponibles = []
@@ -65,19 +59,41 @@ def listar_dias_disponibles(
     return dias_disponibles
 
 
+def crear_etag_dias_disponibles(
+    catalogos: Catalogos,
+    settings: Settings,
+) -> str:
+    """ETag de los días disponibles, cambian con los días inhábiles, con el día y al pasar la hora de corte"""
+    local_ts = datetime.now(tz=pytz.timezone(settings.TZ))
+    return crear_etag(
+        catalogos.cit_dias_inhabiles.etag,
+        date.today().isoformat(),
+        local_ts.date().isoformat(),
+        str(local_ts.hour > QUITAR_PRIMER_DIA_DESPUES_HORAS),
+    )
+
+
 @cit_dias_disponibles.get("", response_model=ListCitDiaDisponibleOut)
 async def listado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
     settings: Annotated[Settings, Depends(get_settings)],
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Días disponibles"""
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.CREAR:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    no_modificado = responder_etag(response, if_none_match, crear_etag_dias_disponibles(catalogos, settings))
+    if no_modificado is not None:
+        return no_modificado
 
     # Entregar
-    return ListCitDiaDisponibleOut(
-        success=True,
-        message="Listado de días disponibles",
-        data=listar_dias_disponibles(database, settings),
+    return respuesta_confiable(
+        ListCitDiaDisponibleOut(
+            success=True,
+            message="Listado de días disponibles",
+            data=listar_dias_disponibles(catalogos, settings),
+        ),
+        response,
     )
@@ -5,17 +5,17 @@ Cit Días Inhábiles, routers
 from datetime import date
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi_pagination import paginate
 
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
+from ..dependencies.etag import responder_etag
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
-from ..models.cit_dias_inhabiles import CitDiaInhabil
+from ..dependencies.respuestas import respuesta_confiable
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.cit_dias_inhabiles import CitDiaInhabilOut, OneCitDiaInhabilOut
+from ..services.catalogos import Catalogos, get_catalogos
 
 cit_dias_inhabiles = APIRouter(prefix="/api/v5/cit_dias_inhabiles")
 
@@ -23,38 +23,50 @@ cit_dias_inhabiles = APIRouter(prefix="/api/v5/cit_dias_inhabiles")
 @cit_dias_inhabiles.get("/{fecha}", response_model=OneCitDiaInhabilOut)
 async def detalle(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     fecha: date,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Detalle de una día inhábil a partir de su clave"""
     if current_user.permissions.get("CIT DIAS INHABILES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    try:
-        cit_dia_inhabil = database.query(CitDiaInhabil).filter_by(fecha=fecha).one()
-    except (MultipleResultsFound, NoResultFound):
+    no_modificado = responder_etag(response, if_none_match, catalogos.cit_dias_inhabiles.etag)
+    if no_modificado is not None:
+        return no_modificado
+    cit_dia_inhabil = catalogos.cit_dias_inhabiles.por_clave.get(str(fecha))
+    if cit_dia_inhabil is None:
         return OneCitDiaInhabilOut(success=False, message="No existe ese día inhábil")
     if cit_dia_inhabil.estatus != "A":
         return OneCitDiaInhabilOut(success=False, message="No está habilitado ese día inhábil")
-    return OneCitDiaInhabilOut(
-        success=True,
-        message=f"Día inhábil {fecha}",
-        data=CitDiaInhabilOut.model_validate(cit_dia_inhabil),
+    return respuesta_confiable(
+        OneCitDiaInhabilOut(
+            success=True,
+            message=f"Día inhábil {fecha}",
+            data=cit_dia_inhabil.datos,
+        ),
+        response,
     )
 
 
 @cit_dias_inhabiles.get("", response_model=CustomPage[CitDiaInhabilOut])
 async def paginado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     desde: date | None = None,
     hasta: date | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Paginado de días inhábiles"""
     if current_user.permissions.get("CIT DIAS INHABILES", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    consulta = database.query(CitDiaInhabil)
-    if desde is not None:
-        consulta = consulta.filter(CitDiaInhabil.fecha >= desde)
-    if hasta is not None:
-        consulta = consulta.filter(CitDiaInhabil.fecha <= hasta)
-    return paginate(consulta.filter_by(estatus="A").order_by(CitDiaInhabil.fecha.desc()))
+    no_modificado = responder_etag(response, if_none_match, catalogos.cit_dias_inhabiles.etag)
+    if no_modificado is not None:
+        return no_modificado
+    cit_dias_inhabiles_filtrados = [
+        cit_dia_inhabil
+        for cit_dia_inhabil in catalogos.cit_dias_inhabiles.filtrar()
+        if (desde is None or cit_dia_inhabil.fecha >= desde) and (hasta is None or cit_dia_inhabil.fecha <= hasta)
+    ]
+    return respuesta_confiable(paginate(cit_dias_inhabiles_filtrados), response)
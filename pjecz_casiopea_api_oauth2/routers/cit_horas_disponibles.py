@@ -2,23 +2,26 @@
 Cit Horas Disponibles, routers
 """
 
+import asyncio
 from datetime import date, datetime, time, timedelta
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy.exc import MultipleResultsFound, NoResultFound
 
 from ..config.settings import Settings, get_settings
 from ..dependencies.authentications import get_current_active_user
 from ..dependencies.database import Session, get_db
 from ..dependencies.safe_string import safe_clave
+from ..dependencies.sala_espera import exigir_turno_admitido
 from ..models.cit_citas import CitCita
-from ..models.cit_horas_bloqueadas import CitHoraBloqueada
 from ..models.cit_servicios import CitServicio
 from ..models.oficinas import Oficina
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.cit_horas_disponibles import ListCitHoraDisponibleOut
+from ..services.catalogos import Catalogos, get_catalogos
+from ..services.horas_bloqueadas import cache_horas_bloqueadas
 from .cit_dias_disponibles import listar_dias_disponibles
 
 cit_horas_disponibles = APIRouter(prefix="/api/v5/cit_horas_disponibles")
@@ -66,33 +69,26 @@ def listar_horas_disponibles(
         minutes=cit_servicio.duracion.minute,
     )
 
-    # Consultar las horas bloqueadas de la oficina en la fecha dada
-    cit_horas_bloqueadas = (
-        database.query(CitHoraBloqueada)
-        .filter_by(oficina_id=oficina.id)
-        .filter_by(fecha=fecha)
-        .filter_by(estatus="A")
-        .order_by(CitHoraBloqueada.id)
-        .all()
-    )
+    # Tomar las horas bloqueadas de la oficina en la fecha dada, del caché en memoria
+    cit_horas_bloqueadas = cache_horas_bloqueadas.obtener(database, oficina.id, fecha)
 
     # Determinar los tiempos bloqueados
     tiempos_bloqueados = []
-    for cit_hora_bloqueada in cit_horas_bloqueadas:
+    for bloqueo_inicio, bloqueo_termino in cit_horas_bloqueadas:
         tiempo_bloquedo_inicia = datetime(
             year=fecha.year,
             month=fecha.month,
             day=fecha.day,
-            hour=cit_hora_bloqueada.inicio.hour,
-            minute=cit_hora_bloqueada.inicio.minute,
+            hour=bloqueo_inicio.hour,
+            minute=bloqueo_inicio.minute,
             second=0,
         )
         tiempo_bloquedo_termina = datetime(
             year=fecha.year,
             month=fecha.month,
             day=fecha.day,
-            hour=cit_hora_bloqueada.termino.hour,
-            minute=cit_hora_bloqueada.termino.minute,
+            hour=bloqueo_termino.hour,
+            minute=bloqueo_termino.minute,
             second=0,
         ) - timedelta(minutes=1)
         tiempos_bloqueados.append((tiempo_bloquedo_inicia, tiempo_bloquedo_termina))
@@ -149,12 +145,14 @@ def listar_horas_disponibles(
 async def listado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
     database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
     settings: Annotated[Settings, Depends(get_settings)],
     cit_servicio_clave: str,
     fecha: date,
     oficina_clave: str,
+    x_turno: Annotated[str | None, Header()] = None,
 ):
-    """Horas disponibles"""
+    """Horas disponibles, con la sala de espera activa necesita el turno admitido en el encabezado X-Turno"""
     if current_user.permissions.get("CIT CITAS", 0) < Permiso.CREAR:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
@@ -169,6 +167,9 @@ async def listado(
     if oficina.estatus != "A":
         return ListCitHoraDisponibleOut(success=False, message="No está habilitada esa oficina")
 
+    # Validar el turno de la sala de espera
+    await asyncio.to_thread(exigir_turno_admitido, settings, current_user.username, oficina, x_turno)
+
     # Consultar el servicio
     cit_servicio_clave = safe_clave(cit_servicio_clave)
     if cit_servicio_clave == "":
@@ -181,7 +182,7 @@ async def listado(
         return ListCitHoraDisponibleOut(success=False, message="No está habilitado ese servicio")
 
     # Validar la fecha
-    if fecha not in listar_dias_disponibles(database, settings):
+    if fecha not in listar_dias_disponibles(catalogos, settings):
         return ListCitHoraDisponibleOut(success=False, message="La fecha proporcionada no es válida")
 
     # Listar las horas disponibles
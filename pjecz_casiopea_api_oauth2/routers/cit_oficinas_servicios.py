@@ -4,19 +4,18 @@ Cit Oficinas Servicios, routers
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_pagination.ext.sqlalchemy import paginate
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi_pagination import paginate
 
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
+from ..dependencies.etag import responder_etag
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
+from ..dependencies.respuestas import respuesta_confiable
 from ..dependencies.safe_string import safe_clave
-from ..models.cit_oficinas_servicios import CitOficinaServicio
-from ..models.cit_servicios import CitServicio
-from ..models.oficinas import Oficina
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.cit_oficinas_servicios import CitOficinaServicioOut
+from ..services.catalogos import Catalogos, get_catalogos
 
 cit_oficinas_servicios = APIRouter(prefix="/api/v5/cit_oficinas_servicios")
 
@@ -24,24 +23,23 @@ cit_oficinas_servicios = APIRouter(prefix="/api/v5/cit_oficinas_servicios")
 @cit_oficinas_servicios.get("", response_model=CustomPage[CitOficinaServicioOut])
 async def paginado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     cit_servicio_clave: str = "",
     oficina_clave: str = "",
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Paginado de oficinas-servicios"""
     if current_user.permissions.get("CIT OFICINAS SERVICIOS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    consulta = database.query(CitOficinaServicio)
+    no_modificado = responder_etag(response, if_none_match, catalogos.cit_oficinas_servicios.etag)
+    if no_modificado is not None:
+        return no_modificado
     if cit_servicio_clave:
         cit_servicio_clave = safe_clave(cit_servicio_clave)
-        if cit_servicio_clave != "":
-            consulta = consulta.join(CitServicio).filter(CitServicio.clave == cit_servicio_clave)
     if oficina_clave:
         oficina_clave = safe_clave(oficina_clave)
-        if oficina_clave != "":
-            consulta = consulta.join(Oficina).filter(Oficina.clave == oficina_clave)
-    return paginate(
-        consulta.filter(CitOficinaServicio.es_activo == True)
-        .filter(CitOficinaServicio.estatus == "A")
-        .order_by(CitOficinaServicio.creado.desc())
+    cit_oficinas_servicios_filtrados = catalogos.cit_oficinas_servicios.filtrar(
+        cit_servicio_clave=cit_servicio_clave, oficina_clave=oficina_clave
     )
+    return respuesta_confiable(paginate(cit_oficinas_servicios_filtrados), response)
@@ -0,0 +1,113 @@
+"""
+Cit Salas de Espera, routers
+"""
+
+import time
+from datetime import datetime
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+
+from ..config.settings import Settings, get_settings
+from ..dependencies.authentications import get_current_active_user
+from ..dependencies.database import Session, get_db
+from ..dependencies.exceptions import MyAuthenticationError
+from ..dependencies.safe_string import safe_clave
+from ..dependencies.sala_espera import (
+    Estado,
+    Turno,
+    cache_salas_espera,
+    calcular_posicion,
+    emitir,
+    firmar_turno,
+    leer_turno,
+    turno_usado,
+)
+from ..models.oficinas import Oficina
+from ..models.permisos import Permiso
+from ..schemas.cit_clientes import CitClienteInDB
+from ..schemas.cit_salas_espera import CitSalaEsperaIn, CitSalaEsperaOut, OneCitSalaEsperaOut
+
+cit_salas_espera = APIRouter(prefix="/api/v5/cit_salas_espera")
+
+
+def entregar_turno(turno: Turno, token: str, estado: Estado, settings: Settings) -> OneCitSalaEsperaOut:
+    """Entregar el turno con su posición en la fila"""
+    posicion, espera = calcular_posicion(turno.numero, estado, settings)
+    return OneCitSalaEsperaOut(
+        success=True,
+        message="Su turno ya fue admitido" if posicion == 0 else f"Faltan {posicion} turnos",
+        data=CitSalaEsperaOut(
+            oficina_clave=turno.oficina_clave,
+            numero=turno.numero,
+            posicion=posicion,
+            espera_segundos=espera,
+            admitido=posicion == 0,
+            expiracion=datetime.fromtimestamp(turno.expiracion),
+            turno=token,
+        ),
+    )
+
+
+@cit_salas_espera.post("/solicitar", response_model=OneCitSalaEsperaOut)
+def solicitar(
+    current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
+    database: Annotated[Session, Depends(get_db)],
+    settings: Annotated[Settings, Depends(get_settings)],
+    cit_sala_espera_in: CitSalaEsperaIn,
+    x_turno: Annotated[str | None, Header()] = None,
+):
+    """Solicitar un turno en la sala de espera de una oficina, si trae uno vigente y sin usar de la misma oficina lo conserva"""
+    if current_user.permissions.get("CIT CITAS", 0) < Permiso.CREAR:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+    # Consultar la oficina
+    oficina_clave = safe_clave(cit_sala_espera_in.oficina_clave)
+    if oficina_clave == "":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No es válida la clave de la oficina")
+    try:
+        oficina = database.query(Oficina).filter_by(clave=oficina_clave).one()
+    except (MultipleResultsFound, NoResultFound):
+        return OneCitSalaEsperaOut(success=False, message="No existe esa oficina")
+    if oficina.estatus != "A":
+        return OneCitSalaEsperaOut(success=False, message="No está habilitada esa oficina")
+
+    # Conservar el turno vigente del mismo cliente y oficina, para que volver a pedirlo no lo mande al final
+    if x_turno is not None:
+        try:
+            turno = leer_turno(x_turno, settings)
+        except MyAuthenticationError:
+            turno = None
+        if (
+            turno is not None
+            and turno.username == current_user.username
+            and turno.oficina_id == oficina.id
+            and not turno_usado(database, turno)
+        ):
+            return entregar_turno(turno, x_turno, cache_salas_espera.obtener(oficina.id, turno.numero, settings), settings)
+
+    # Emitir un turno nuevo
+    numero, estado = emitir(database, oficina.id, settings)
+    cache_salas_espera.guardar(oficina.id, estado)
+    turno = Turno(
+        username=current_user.username,
+        oficina_id=oficina.id,
+        oficina_clave=oficina.clave,
+        numero=numero,
+        expiracion=time.time() + settings.SALA_ESPERA_VIGENCIA,
+    )
+    return entregar_turno(turno, firmar_turno(turno, settings), estado, settings)
+
+
+@cit_salas_espera.get("", response_model=OneCitSalaEsperaOut)
+def posicion(
+    settings: Annotated[Settings, Depends(get_settings)],
+    x_turno: Annotated[str, Header()],
+):
+    """Posición del turno en la fila, el turno firmado identifica al cliente y la sala se lee a lo más una vez por segundo"""
+    try:
+        turno = leer_turno(x_turno, settings)
+    except MyAuthenticationError as error:
+        return OneCitSalaEsperaOut(success=False, message=str(error))
+    return entregar_turno(turno, x_turno, cache_salas_espera.obtener(turno.oficina_id, turno.numero, settings), settings)
@@ -4,18 +4,18 @@ Distritos, routers
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi_pagination import paginate
 
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
+from ..dependencies.etag import responder_etag
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
+from ..dependencies.respuestas import respuesta_confiable
 from ..dependencies.safe_string import safe_clave
-from ..models.distritos import Distrito
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.distritos import DistritoOut, OneDistritoOut
+from ..services.catalogos import Catalogos, get_catalogos
 
 distritos = APIRouter(prefix="/api/v5/distritos")
 
@@ -23,33 +23,42 @@ distritos = APIRouter(prefix="/api/v5/distritos")
 @distritos.get("/{clave}", response_model=OneDistritoOut)
 async def detalle(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     clave: str,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Detalle de un distrito a partir de su clave"""
     if current_user.permissions.get("DISTRITOS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    no_modificado = responder_etag(response, if_none_match, catalogos.distritos.etag)
+    if no_modificado is not None:
+        return no_modificado
     try:
         clave = safe_clave(clave)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No es válida la clave")
-    try:
-        distrito = database.query(Distrito).filter_by(clave=clave).one()
-    except (MultipleResultsFound, NoResultFound):
+    distrito = catalogos.distritos.por_clave.get(clave)
+    if distrito is None:
         return OneDistritoOut(success=False, message="No existe ese distrito")
     if distrito.es_activo is False:
         return OneDistritoOut(success=False, message="No está activo ese distrito")
     if distrito.estatus != "A":
         return OneDistritoOut(success=False, message="Este distrito está eliminado")
-    return OneDistritoOut(success=True, message=f"Detalle de {clave}", data=DistritoOut.model_validate(distrito))
+    return respuesta_confiable(OneDistritoOut(success=True, message=f"Detalle de {clave}", data=distrito.datos), response)
 
 
 @distritos.get("", response_model=CustomPage[DistritoOut])
 async def paginado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Paginado de distritos"""
     if current_user.permissions.get("DISTRITOS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    return paginate(database.query(Distrito).filter_by(es_activo=True).filter_by(estatus="A").order_by(Distrito.clave))
+    no_modificado = responder_etag(response, if_none_match, catalogos.distritos.etag)
+    if no_modificado is not None:
+        return no_modificado
+    return respuesta_confiable(paginate(catalogos.distritos.filtrar()), response)
@@ -4,18 +4,18 @@ Exp Juzgados, routers
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi_pagination import paginate
 
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
+from ..dependencies.etag import responder_etag
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
+from ..dependencies.respuestas import respuesta_confiable
 from ..dependencies.safe_string import safe_clave
-from ..models.exp_juzgados import ExpJuzgado
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.exp_juzgados import ExpJuzgadoOut, OneExpJuzgadoOut
+from ..services.catalogos import Catalogos, get_catalogos
 
 exp_juzgados = APIRouter(prefix="/api/v5/exp_juzgados")
 
@@ -23,32 +23,40 @@ exp_juzgados = APIRouter(prefix="/api/v5/exp_juzgados")
 @exp_juzgados.get("/{clave}", response_model=OneExpJuzgadoOut)
 async def detalle(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     clave: str,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Detalle de un juzgado para expedientes a partir de su clave"""
     if current_user.permissions.get("EXP JUZGADOS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    no_modificado = responder_etag(response, if_none_match, catalogos.exp_juzgados.etag)
+    if no_modificado is not None:
+        return no_modificado
     try:
         clave = safe_clave(clave)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No es válida la clave")
-    try:
-        exp_juzgado = database.query(ExpJuzgado).filter_by(clave=clave).one()
-    except (MultipleResultsFound, NoResultFound):
+    exp_juzgado = catalogos.exp_juzgados.por_clave.get(clave)
+    if exp_juzgado is None:
         return OneExpJuzgadoOut(success=False, message="No existe ese juzgado")
     if exp_juzgado.estatus != "A":
         return OneExpJuzgadoOut(success=False, message="Ese juzgado está eliminado")
-    return OneExpJuzgadoOut(success=True, message=f"Detalle de {clave}", data=ExpJuzgadoOut.model_validate(exp_juzgado))
+    return respuesta_confiable(OneExpJuzgadoOut(success=True, message=f"Detalle de {clave}", data=exp_juzgado.datos), response)
 
 
 @exp_juzgados.get("", response_model=CustomPage[ExpJuzgadoOut])
 async def paginado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Paginado de exp-juzgados"""
     if current_user.permissions.get("EXP JUZGADOS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    consulta = database.query(ExpJuzgado)
-    return paginate(consulta.filter(ExpJuzgado.estatus == "A").order_by(ExpJuzgado.clave))
+    no_modificado = responder_etag(response, if_none_match, catalogos.exp_juzgados.etag)
+    if no_modificado is not None:
+        return no_modificado
+    return respuesta_confiable(paginate(catalogos.exp_juzgados.filtrar()), response)
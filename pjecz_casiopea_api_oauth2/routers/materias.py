@@ -4,18 +4,18 @@ Materias, routers
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi_pagination import paginate
 
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
+from ..dependencies.etag import responder_etag
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
+from ..dependencies.respuestas import respuesta_confiable
 from ..dependencies.safe_string import safe_clave
-from ..models.materias import Materia
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.materias import MateriaOut, OneMateriaOut
+from ..services.catalogos import Catalogos, get_catalogos
 
 materias = APIRouter(prefix="/api/v5/materias")
 
@@ -23,31 +23,40 @@ materias = APIRouter(prefix="/api/v5/materias")
 @materias.get("/{clave}", response_model=OneMateriaOut)
 async def detalle(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     clave: str,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Detalle de una materia a partir de su clave"""
     if current_user.permissions.get("MATERIAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    no_modificado = responder_etag(response, if_none_match, catalogos.materias.etag)
+    if no_modificado is not None:
+        return no_modificado
     try:
         clave = safe_clave(clave)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No es válida la clave")
-    try:
-        materia = database.query(Materia).filter_by(clave=clave).one()
-    except (MultipleResultsFound, NoResultFound):
+    materia = catalogos.materias.por_clave.get(clave)
+    if materia is None:
         return OneMateriaOut(success=False, message="No existe esa materia")
     if materia.estatus != "A":
         return OneMateriaOut(success=False, message="No está habilitada esa materia")
-    return OneMateriaOut(success=True, message=f"Detalle de {clave}", data=MateriaOut.model_validate(materia))
+    return respuesta_confiable(OneMateriaOut(success=True, message=f"Detalle de {clave}", data=materia.datos), response)
 
 
 @materias.get("", response_model=CustomPage[MateriaOut])
 async def paginado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Paginado de materias"""
     if current_user.permissions.get("MATERIAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    return paginate(database.query(Materia).filter_by(estatus="A").order_by(Materia.clave))
+    no_modificado = responder_etag(response, if_none_match, catalogos.materias.etag)
+    if no_modificado is not None:
+        return no_modificado
+    return respuesta_confiable(paginate(catalogos.materias.filtrar()), response)
@@ -4,20 +4,18 @@ Oficinas, routers
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy.exc import MultipleResultsFound, NoResultFound
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi_pagination import paginate
 
 from ..dependencies.authentications import get_current_active_user
-from ..dependencies.database import Session, get_db
+from ..dependencies.etag import responder_etag
 from ..dependencies.fastapi_pagination_custom_page import CustomPage
+from ..dependencies.respuestas import respuesta_confiable
 from ..dependencies.safe_string import safe_clave
-from ..models.distritos import Distrito
-from ..models.domicilios import Domicilio
-from ..models.oficinas import Oficina
 from ..models.permisos import Permiso
 from ..schemas.cit_clientes import CitClienteInDB
 from ..schemas.oficinas import OficinaOut, OneOficinaOut
+from ..services.catalogos import Catalogos, get_catalogos
 
 oficinas = APIRouter(prefix="/api/v5/oficinas")
 
@@ -25,44 +23,50 @@ oficinas = APIRouter(prefix="/api/v5/oficinas")
 @oficinas.get("/{clave}", response_model=OneOficinaOut)
 async def detalle(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     clave: str,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Detalle de una oficina a partir de su clave"""
     if current_user.permissions.get("OFICINAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    no_modificado = responder_etag(response, if_none_match, catalogos.oficinas.etag)
+    if no_modificado is not None:
+        return no_modificado
     try:
         clave = safe_clave(clave)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No es válida la clave")
-    try:
-        oficina = database.query(Oficina).filter_by(clave=clave).one()
-    except (MultipleResultsFound, NoResultFound):
+    oficina = catalogos.oficinas.por_clave.get(clave)
+    if oficina is None:
         return OneOficinaOut(success=False, message="No existe esa oficina")
     if oficina.es_activo is False:
         return OneOficinaOut(success=False, message="No está activa ese oficina")
     if oficina.estatus != "A":
         return OneOficinaOut(success=False, message="Esta oficina está eliminada")
-    return OneOficinaOut(success=True, message=f"Detalle de {clave}", data=OficinaOut.model_validate(oficina))
+    return respuesta_confiable(OneOficinaOut(success=True, message=f"Detalle de {clave}", data=oficina.datos), response)
 
 
 @oficinas.get("", response_model=CustomPage[OficinaOut])
 async def paginado(
     current_user: Annotated[CitClienteInDB, Depends(get_current_active_user)],
-    database: Annotated[Session, Depends(get_db)],
+    catalogos: Annotated[Catalogos, Depends(get_catalogos)],
+    response: Response,
     distrito_clave: str = "",
     domicilio_clave: str = "",
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """Paginado de oficinas"""
     if current_user.permissions.get("OFICINAS", 0) < Permiso.VER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    consulta = database.query(Oficina)
+    no_modificado = responder_etag(response, if_none_match, catalogos.oficinas.etag)
+    if no_modificado is not None:
+        return no_modificado
     if distrito_clave:
         distrito_clave = safe_clave(distrito_clave)
-        if distrito_clave != "":
-            consulta = consulta.join(Distrito).filter(Distrito.clave == distrito_clave)
     if domicilio_clave:
         domicilio_clave = safe_clave(domicilio_clave)
-        if domicilio_clave != "":
-            consulta = consulta.join(Domicilio).filter(Domicilio.clave == domicilio_clave)
-    return paginate(consulta.filter(Oficina.es_activo == True).filter(Oficina.estatus == "A").order_by(Oficina.clave))
+    return respuesta_confiable(
+        paginate(catalogos.oficinas.filtrar(distrito_clave=distrito_clave, domicilio_clave=domicilio_clave)), response
+    )
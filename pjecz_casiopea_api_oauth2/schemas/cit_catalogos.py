@@ -0,0 +1,44 @@
+"""
+Cit Catálogos, esquemas de pydantic
+"""
+
+from datetime import date, time
+
+from pydantic import BaseModel, ConfigDict
+
+from .cit_categorias import CitCategoriaOut
+from .oficinas import OficinaOut
+
+
+class CitCatalogoServicioOut(BaseModel):
+    """Esquema compacto de un servicio, el nombre de la categoría ya va en las categorías"""
+
+    cit_categoria_clave: str
+    clave: str
+    descripcion: str
+    duracion: time
+    documentos_limite: int
+    desde: time | None = None
+    hasta: time | None = None
+    dias_habilitados: str
+    instrucciones: str | None = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CitCatalogosOut(BaseModel):
+    """Esquema con los catálogos del formulario de citas, oficinas_servicios relaciona cada oficina con sus servicios"""
+
+    version: str
+    cit_categorias: list[CitCategoriaOut]
+    cit_servicios: list[CitCatalogoServicioOut]
+    oficinas: list[OficinaOut]
+    oficinas_servicios: dict[str, list[str]]
+    dias_disponibles: list[date]
+
+
+class OneCitCatalogosOut(BaseModel):
+    """Esquema para entregar los catálogos del formulario de citas"""
+
+    success: bool
+    message: str
+    data: CitCatalogosOut | None = None
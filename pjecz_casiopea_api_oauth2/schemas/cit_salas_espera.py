@@ -0,0 +1,33 @@
+"""
+Cit Salas de Espera, esquemas de pydantic
+"""
+
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class CitSalaEsperaIn(BaseModel):
+    """Esquema para solicitar un turno en la sala de espera de una oficina"""
+
+    oficina_clave: str
+
+
+class CitSalaEsperaOut(BaseModel):
+    """Esquema para entregar un turno, se envía en el encabezado X-Turno a horas disponibles y a crear cita"""
+
+    oficina_clave: str
+    numero: int
+    posicion: int
+    espera_segundos: int
+    admitido: bool
+    expiracion: datetime
+    turno: str
+
+
+class OneCitSalaEsperaOut(BaseModel):
+    """Esquema para entregar un turno de la sala de espera"""
+
+    success: bool
+    message: str
+    data: CitSalaEsperaOut | None = None
@@ -0,0 +1,161 @@
+"""
+Servicio de almacenamiento de archivos, en Google Cloud Storage, en un directorio local o en memoria
+"""
+
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import requests
+from google.api_core import exceptions
+from google.cloud import storage
+
+from ..config.settings import Settings, get_settings
+from ..dependencies.exceptions import (
+    MyAnyError,
+    MyBucketNotFoundError,
+    MyMissingConfigurationError,
+    MyTimeoutError,
+    MyUploadError,
+)
+from ..dependencies.metricas import metricas
+from ..dependencies.plazos import limitar
+
+GCS_TIEMPO_ESPERA = 60.0  # El mismo que usa por defecto la librería de Google
+
+
+class Almacenamiento(ABC):
+    """Clase base abstracta para los almacenamientos"""
+
+    nombre: str
+
+    def subir(self, ruta: str, contenido: bytes, content_type: str) -> str:
+        """Sube el contenido a la ruta dada, registra el tiempo y regresa la URL pública"""
+        inicio = time.perf_counter()
+        try:
+            return self._subir(ruta, contenido, content_type)
+        except MyAnyError:
+            metricas.incrementar(f"almacenamiento.{self.nombre}.errores")
+            raise
+        finally:
+            metricas.observar(f"almacenamiento.{self.nombre}.subir", time.perf_counter() - inicio)
+
+    async def subir_async(self, ruta: str, contenido: bytes, content_type: str) -> str:
+        """Sube el contenido en un hilo aparte para no bloquear el event loop"""
+        return await asyncio.to_thread(self.subir, ruta, contenido, content_type)
+
+    @abstractmethod
+    def _subir(self, ruta: str, contenido: bytes, content_type: str) -> str:
+        """Subir el contenido y regresar la URL pública"""
+
+    def cerrar(self) -> None:
+        """Liberar los recursos, se llama al terminar la aplicación"""
+
+
+class AlmacenamientoGCS(Almacenamiento):
+    """Almacenamiento en un bucket de Google Cloud Storage, con un solo cliente para todo el proceso"""
+
+    nombre = "gcs"
+
+    def __init__(self, settings: Settings):
+        if settings.GCS_BUCKET_NAME == "":
+            raise MyMissingConfigurationError("Falta GCS_BUCKET_NAME para el almacenamiento en Google Cloud Storage")
+        self._bucket_name = settings.GCS_BUCKET_NAME
+        self._candado = threading.Lock()
+        self._cliente = None
+        self._bucket = None
+
+    def _obtener_bucket(self) -> storage.Bucket:
+        """Crear el cliente y el bucket la primera vez que se necesitan"""
+        with self._candado:
+            if self._bucket is None:
+                self._cliente = storage.Client()
+                self._bucket = self._cliente.bucket(self._bucket_name)
+            return self._bucket
+
+    def _subir(self, ruta: str, contenido: bytes, content_type: str) -> str:
+        blob = self._obtener_bucket().blob(ruta)
+        try:
+            blob.upload_from_string(contenido, content_type=content_type, timeout=limitar(GCS_TIEMPO_ESPERA))
+        except exceptions.NotFound as error:
+            raise MyBucketNotFoundError(f"No existe el bucket {self._bucket_name}") from error
+        except requests.exceptions.Timeout as error:
+            raise MyTimeoutError(f"No respondió a tiempo Google Storage: {error}") from error
+        except (exceptions.GoogleAPICallError, ValueError) as error:
+            raise MyUploadError(f"Error al subir a Google Storage: {error}") from error
+        return blob.public_url
+
+    def cerrar(self) -> None:
+        with self._candado:
+            if self._cliente is not None:
+                self._cliente.close()
+            self._cliente = None
+            self._bucket = None
+
+
+class AlmacenamientoLocal(Almacenamiento):
+    """Almacenamiento en un directorio local, para desarrollo y pruebas sin conexión"""
+
+    nombre = "local"
+
+    def __init__(self, settings: Settings):
+        self._directorio = Path(settings.ALMACENAMIENTO_DIRECTORIO).resolve()
+        self._url_base = settings.ALMACENAMIENTO_URL_BASE.rstrip("/")
+
+    def _subir(self, ruta: str, contenido: bytes, content_type: str) -> str:
+        archivo = self._directorio / ruta
+        try:
+            archivo.parent.mkdir(parents=True, exist_ok=True)
+            archivo.write_bytes(contenido)
+        except OSError as error:
+            raise MyUploadError(f"Error al guardar en {archivo}: {error}") from error
+        if self._url_base:
+            return f"{self._url_base}/{ruta}"
+        return archivo.as_uri()
+
+
+class AlmacenamientoMemoria(Almacenamiento):
+    """Almacenamiento en memoria, para benchmarks y pruebas"""
+
+    nombre = "memoria"
+
+    def __init__(self, settings: Settings):
+        self.archivos: dict[str, tuple[bytes, str]] = {}
+
+    def _subir(self, ruta: str, contenido: bytes, content_type: str) -> str:
+        self.archivos[ruta] = (contenido, content_type)
+        return f"memoria://{ruta}"
+
+
+ALMACENAMIENTOS = {
+    "gcs": AlmacenamientoGCS,
+    "local": AlmacenamientoLocal,
+    "memoria": AlmacenamientoMemoria,
+}
+
+_almacenamiento: Almacenamiento | None = None
+
+
+def crear_almacenamiento(settings: Settings) -> Almacenamiento:
+    """Crear el almacenamiento elegido en ALMACENAMIENTO"""
+    if settings.ALMACENAMIENTO not in ALMACENAMIENTOS:
+        raise MyMissingConfigurationError(f"No es válido el almacenamiento {settings.ALMACENAMIENTO}")
+    return ALMACENAMIENTOS[settings.ALMACENAMIENTO](settings)
+
+
+def get_almacenamiento() -> Almacenamiento:
+    """Almacenamiento compartido por todo el proceso, se crea la primera vez que se usa"""
+    global _almacenamiento
+    if _almacenamiento is None:
+        _almacenamiento = crear_almacenamiento(get_settings())
+    return _almacenamiento
+
+
+def cerrar_almacenamiento() -> None:
+    """Cerrar el almacenamiento compartido"""
+    global _almacenamiento
+    if _almacenamiento is not None:
+        _almacenamiento.cerrar()
+    _almacenamiento = None
@@ -0,0 +1,219 @@
+"""
+Catálogos en memoria: distritos, materias, domicilios, oficinas, autoridades, categorías, servicios,
+oficinas-servicios, juzgados y días inhábiles se leen juntos en una instantánea inmutable y versionada
+que se renueva al vencer CATALOGOS_TTL o al invalidarla, por ejemplo al notificar un cambio en sus tablas
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from operator import attrgetter
+
+from pydantic import BaseModel
+
+from ..config.settings import get_settings
+from ..dependencies.database import session_maker
+from ..dependencies.etag import crear_etag
+from ..dependencies.metricas import metricas
+from ..models.autoridades import Autoridad
+from ..models.cit_categorias import CitCategoria
+from ..models.cit_dias_inhabiles import CitDiaInhabil
+from ..models.cit_oficinas_servicios import CitOficinaServicio
+from ..models.cit_servicios import CitServicio
+from ..models.distritos import Distrito
+from ..models.domicilios import Domicilio
+from ..models.exp_juzgados import ExpJuzgado
+from ..models.materias import Materia
+from ..models.oficinas import Oficina
+from ..schemas.autoridades import AutoridadOut
+from ..schemas.cit_categorias import CitCategoriaOut
+from ..schemas.cit_dias_inhabiles import CitDiaInhabilOut
+from ..schemas.cit_oficinas_servicios import CitOficinaServicioOut
+from ..schemas.cit_servicios import CitServicioOut
+from ..schemas.distritos import DistritoOut
+from ..schemas.domicilios import DomicilioOut
+from ..schemas.exp_juzgados import ExpJuzgadoOut
+from ..schemas.materias import MateriaOut
+from ..schemas.oficinas import OficinaOut
+from .invalidacion import bus_invalidacion
+
+bitacora = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Registro:
+    """Un registro del catálogo con su esquema de salida ya validado"""
+
+    clave: str
+    es_activo: bool
+    estatus: str
+    datos: BaseModel
+    foraneas: dict[str, str]
+
+
+@dataclass(frozen=True, slots=True)
+class Definicion:
+    """Cómo se lee un catálogo: modelo, esquema, orden del paginado, claves foráneas para filtrar y columna de la clave"""
+
+    modelo: type
+    esquema: type[BaseModel]
+    orden: tuple
+    foraneas: dict[str, str]
+    clave: str = "clave"
+
+
+# En este orden se leen, así las relaciones muchos a uno se resuelven desde la sesión sin más consultas
+DEFINICIONES = {
+    "materias": Definicion(Materia, MateriaOut, (Materia.clave,), {}),
+    "distritos": Definicion(Distrito, DistritoOut, (Distrito.clave,), {}),
+    "domicilios": Definicion(Domicilio, DomicilioOut, (Domicilio.edificio,), {}),
+    "exp_juzgados": Definicion(ExpJuzgado, ExpJuzgadoOut, (ExpJuzgado.clave,), {}),
+    "cit_categorias": Definicion(CitCategoria, CitCategoriaOut, (CitCategoria.nombre,), {}),
+    "cit_dias_inhabiles": Definicion(CitDiaInhabil, CitDiaInhabilOut, (CitDiaInhabil.fecha.desc(),), {}, clave="fecha"),
+    "autoridades": Definicion(
+        Autoridad,
+        AutoridadOut,
+        (Autoridad.clave,),
+        {"distrito_clave": "distrito.clave", "materia_clave": "materia.clave"},
+    ),
+    "oficinas": Definicion(
+        Oficina,
+        OficinaOut,
+        (Oficina.clave,),
+        {"distrito_clave": "distrito.clave", "domicilio_clave": "domicilio.clave"},
+    ),
+    "cit_servicios": Definicion(
+        CitServicio, CitServicioOut, (CitServicio.clave,), {"cit_categoria_clave": "cit_categoria.clave"}
+    ),
+    "cit_oficinas_servicios": Definicion(
+        CitOficinaServicio,
+        CitOficinaServicioOut,
+        (CitOficinaServicio.creado.desc(),),
+        {"cit_servicio_clave": "cit_servicio.clave", "oficina_clave": "oficina.clave"},
+        clave="id",
+    ),
+}
+
+
+class Catalogo:
+    """Registros de un catálogo con índices por clave y por clave foránea, y el ETag de su contenido"""
+
+    def __init__(self, registros: list[Registro], foraneas: list[str]):
+        # El ETag depende solo de los datos, así es el mismo en todos los procesos que tengan la misma versión
+        self.etag = crear_etag(
+            *(
+                f"{registro.clave}|{registro.es_activo}|{registro.estatus}|{registro.datos.model_dump_json()}"
+                for registro in registros
+            )
+        )
+        self.por_clave = {registro.clave: registro for registro in registros}
+        self.vigentes = [registro for registro in registros if registro.es_activo and registro.estatus == "A"]
+        self.indices: dict[str, dict[str, list[Registro]]] = {foranea: {} for foranea in foraneas}
+        for registro in self.vigentes:
+            for foranea, indice in self.indices.items():
+                indice.setdefault(registro.foraneas[foranea], []).append(registro)
+
+    def filtrar(self, **filtros: str) -> list[BaseModel]:
+        """Esquemas de los registros vigentes, en el orden del paginado, que coincidan con las claves foráneas no vacías"""
+        filtros = {foranea: valor for foranea, valor in filtros.items() if valor}
+        if not filtros:
+            return [registro.datos for registro in self.vigentes]
+        primera, valor = next(iter(filtros.items()))
+        return [
+            registro.datos
+            for registro in self.indices[primera].get(valor, [])
+            if all(registro.foraneas[foranea] == valor for foranea, valor in filtros.items())
+        ]
+
+
+class Catalogos:
+    """Instantánea inmutable de todos los catálogos"""
+
+    def __init__(self, version: int, catalogos: dict[str, Catalogo]):
+        self.version = version
+        self.creado = time.monotonic()
+        self.materias = catalogos["materias"]
+        self.distritos = catalogos["distritos"]
+        self.domicilios = catalogos["domicilios"]
+        self.exp_juzgados = catalogos["exp_juzgados"]
+        self.cit_categorias = catalogos["cit_categorias"]
+        self.cit_dias_inhabiles = catalogos["cit_dias_inhabiles"]
+        self.autoridades = catalogos["autoridades"]
+        self.oficinas = catalogos["oficinas"]
+        self.cit_servicios = catalogos["cit_servicios"]
+        self.cit_oficinas_servicios = catalogos["cit_oficinas_servicios"]
+        self.fechas_inhabiles: frozenset[date] = frozenset(
+            registro.datos.fecha for registro in self.cit_dias_inhabiles.vigentes
+        )
+
+
+def leer_catalogos(version: int) -> Catalogos:
+    """Leer todos los catálogos de la base de datos en una sola sesión"""
+    inicio = time.perf_counter()
+    catalogos = {}
+    database = session_maker()
+    try:
+        for nombre, definicion in DEFINICIONES.items():
+            obtener = {foranea: attrgetter(ruta) for foranea, ruta in definicion.foraneas.items()}
+            registros = [
+                Registro(
+                    clave=str(getattr(fila, definicion.clave)),
+                    es_activo=getattr(fila, "es_activo", True),
+                    estatus=fila.estatus,
+                    datos=definicion.esquema.model_validate(fila),
+                    foraneas={foranea: funcion(fila) for foranea, funcion in obtener.items()},
+                )
+                for fila in database.query(definicion.modelo).order_by(*definicion.orden)
+            ]
+            catalogos[nombre] = Catalogo(registros, list(definicion.foraneas))
+    finally:
+        database.close()
+    metricas.observar("catalogos.leer", time.perf_counter() - inicio)
+    metricas.establecer("catalogos.version", version)
+    return Catalogos(version, catalogos)
+
+
+class CacheCatalogos:
+    """Guarda la instantánea vigente, la renueva al vencer el TTL o al invalidarla, un solo hilo la lee a la vez"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._candado = threading.Lock()
+        self._catalogos: Catalogos | None = None
+        self._version = 0
+        self._invalidaciones = 0
+
+    def obtener(self) -> Catalogos:
+        """Instantánea vigente, sin consultar la base de datos mientras no venza"""
+        catalogos = self._catalogos
+        if catalogos is not None and time.monotonic() - catalogos.creado < self.ttl:
+            metricas.incrementar("catalogos.aciertos")
+            return catalogos
+        with self._candado:
+            catalogos = self._catalogos
+            if catalogos is None or time.monotonic() - catalogos.creado >= self.ttl:
+                invalidaciones = self._invalidaciones
+                self._version += 1
+                catalogos = leer_catalogos(self._version)
+                # Si la invalidaron mientras se leía, puede traer datos viejos, se usa pero no se guarda
+                if invalidaciones == self._invalidaciones:
+                    self._catalogos = catalogos
+                metricas.incrementar("catalogos.renovaciones")
+            return catalogos
+
+    def invalidar(self) -> None:
+        """Descartar la instantánea, la siguiente petición la vuelve a leer"""
+        self._invalidaciones += 1
+        self._catalogos = None
+        metricas.incrementar("catalogos.invalidaciones")
+
+
+cache_catalogos = CacheCatalogos(ttl=get_settings().CATALOGOS_TTL)
+bus_invalidacion.suscribir([definicion.modelo.__tablename__ for definicion in DEFINICIONES.values()], cache_catalogos.invalidar)
+
+
+def get_catalogos() -> Catalogos:
+    """Dependencia con la instantánea de los catálogos, FastAPI la ejecuta en un hilo porque puede consultar la base de datos"""
+    return cache_catalogos.obtener()
@@ -1,21 +1,143 @@
 """
 Servicio para crear un código de barras
 """
-import barcode
-import os
-from google.cloud import storage
-from google.api_core import exceptions
+import asyncio
+import hashlib
+import hmac
 import io
-import secrets
+import logging
+import os
+import time
 from datetime import datetime
+from functools import lru_cache
 from typing import Tuple
 
+import barcode
+from barcode.writer import ImageWriter, SVGWriter
+from sqlalchemy import func, text, update
+from sqlalchemy.dialects.postgresql import insert
+
 from ..config.settings import Settings, get_settings
-from ..dependencies.database import Session
+from ..dependencies.database import Session, engine, session_maker
+from ..dependencies.exceptions import MyAnyError, MyMissingConfigurationError
+from ..dependencies.metricas import metricas
+from ..models.cit_citas import CitCita
+from ..models.cit_codigos_barras import CitCodigoBarras
+from .almacenamiento import get_almacenamiento
 
-from barcode.writer import ImageWriter
+bitacora = logging.getLogger(__name__)
+
+# Los 12 dígitos base van de 100000000000 a 999999999999, sin ceros a la izquierda
+BASE_12_MINIMO = 100000000000
+BASE_12_CANTIDAD = 900000000000
+
+# Permutación Feistel de 40 bits (dos mitades de 20 bits), que cubre los 9 x 10^11 números base
+FEISTEL_BITS_MITAD = 20
+FEISTEL_MASCARA = (1 << FEISTEL_BITS_MITAD) - 1
+FEISTEL_RONDAS = 4
+
+# Intentos de asignación si choca con un código que ya existe, por ejemplo uno aleatorio anterior
+ASIGNAR_INTENTOS = 5
+
+# Formatos de imagen, su tipo MIME y su extensión
+# El PNG compacto es de un bit por pixel, mucho más ligero para el email
+FORMATOS = {
+    "png": "image/png",
+    "png_compacto": "image/png",
+    "svg": "image/svg+xml",
+}
+EXTENSIONES = {
+    "png": "png",
+    "png_compacto": "png",
+    "svg": "svg",
+}
+
+# Candado de PostgreSQL de la reserva, solo un proceso la rellena a la vez para no pasar del máximo
+RESERVA_CANDADO = "cit_codigos_barras_reserva"
+
+# Versión del diseño, cambiarla si cambian las opciones para invalidar los ETag ya entregados
+DISENO_VERSION = 1
+
+# Caracteres hexadecimales de la firma de la URL de la imagen, 64 bits
+FIRMA_LONGITUD = 16
+
+
+def permutar(numero: int, llave: bytes) -> int:
+    """
+    Permuta un número de 0 a BASE_12_CANTIDAD - 1 con una red Feistel con llave,
+    mediante cycle-walking, de modo que números consecutivos dan códigos dispersos y sin repetir
+    """
+    while True:
+        izquierda, derecha = numero >> FEISTEL_BITS_MITAD, numero & FEISTEL_MASCARA
+        for ronda in range(FEISTEL_RONDAS):
+            resumen = hmac.new(llave, f"{ronda}:{derecha}".encode(), hashlib.sha256).digest()
+            izquierda, derecha = derecha, izquierda ^ (int.from_bytes(resumen[:4], "big") & FEISTEL_MASCARA)
+        numero = (izquierda << FEISTEL_BITS_MITAD) | derecha
+        if numero < BASE_12_CANTIDAD:
+            return numero
+
+
+def validar_configuracion(settings: Settings) -> None:
+    """Causar error al iniciar si falta la llave de la permutación, sin ella los códigos serían predecibles"""
+    if not settings.CODIGO_BARRAS_LLAVE:
+        raise MyMissingConfigurationError("Falta CODIGO_BARRAS_LLAVE para asignar los códigos de barras")
+
+
+def firmar_imagen(numero_codigo: str, formato: str, dpi: int, llave: str) -> str:
+    """Firma HMAC del código, el formato y los dpi, para que el endpoint solo genere las imágenes de las URL que entregamos"""
+    mensaje = f"{numero_codigo}/{formato}/{dpi}".encode()
+    return hmac.new(llave.encode(), mensaje, hashlib.sha256).hexdigest()[:FIRMA_LONGITUD]
+
+
+def es_ean13_valido(numero_codigo: str) -> bool:
+    """¿Son 13 dígitos con el dígito verificador correcto?"""
+    if len(numero_codigo) != 13 or not numero_codigo.isdigit():
+        return False
+    suma = sum(int(digito) * (1 if i % 2 == 0 else 3) for i, digito in enumerate(numero_codigo[:12]))
+    return str((10 - (suma % 10)) % 10) == numero_codigo[12]
+
+
+@lru_cache(maxsize=512)
+def renderizar_ean13(numero_codigo: str, formato: str = "png", dpi: int = 300) -> bytes:
+    """
+    Genera la imagen de un código de barras EAN-13 en PNG, PNG compacto o SVG y la devuelve como bytes.
+    Es una función pura del número, el formato y los dpi, por eso se guarda en un LRU en memoria.
+    """
+
+    # 1. Validar que la longitud sea la correcta para EAN-13
+    if len(numero_codigo) != 13 or not numero_codigo.isdigit():
+        raise ValueError("El código EAN-13 debe tener exactamente 13 dígitos numéricos.")
+    if formato not in FORMATOS:
+        raise ValueError(f"No es válido el formato {formato}.")
+
+    # 2. Crear un buffer en memoria para la imagen
+    buffer = io.BytesIO()
+
+    # 3. Obtener la clase del formato EAN-13
+    EAN13 = barcode.get_barcode_class('ean13')
+
+    # 4. Configurar el diseño visual del código de barras
+    # Ajustamos opciones para que sea altamente legible por escáneres
+    opciones_diseno = {
+        'module_height': 10.0,   # Altura de las barras
+        'module_width': 0.2,     # Ancho de cada barra individual
+        'font_size': 10,         # Tamaño del texto que sale abajo
+        'text_distance': 4.0,    # Distancia entre las barras y el texto
+        'quiet_zone': 5.0        # Margen blanco a los lados para que el lector enfoque bien
+    }
+    if formato == "svg":
+        writer = SVGWriter()
+    else:
+        opciones_diseno['format'] = 'PNG'
+        opciones_diseno['dpi'] = dpi  # Alta resolución para impresión o pantallas
+        writer = ImageWriter(mode="1" if formato == "png_compacto" else "RGB", dpi=dpi)
+
+    # 5. Escribir la imagen en el buffer en memoria en lugar de un archivo
+    EAN13(numero_codigo, writer=writer).write(buffer, options=opciones_diseno)
+
+    # 6. Devolver su contenido
+    return buffer.getvalue()
 
-from ..models.cit_citas import CitCita
 
 class CodigoBarras():
     """Código de Barras"""
@@ -34,49 +156,115 @@ class CodigoBarras():
     def crear_y_subir(self) -> Tuple[str, str]:
         """
         Crea un nuevo código de barras y regresa al URL donde fue guardado
-        en el registro de la cita indicada
+        en el registro de la cita indicada, o la URL del endpoint que lo genera
+        """
+
+        # 1. Asignar un código numérico desde la secuencia de la base de datos
+        codigo_barras_numerico_unico = self._asignar_codigo_barras_ean13()
+
+        # Si está configurado el endpoint de imágenes, la imagen se genera al pedirla y no se sube
+        if self._settings.CODIGO_BARRAS_URL_BASE:
+            return codigo_barras_numerico_unico, self._url_del_endpoint(codigo_barras_numerico_unico)
+
+        # 2. Generar la imagen del código de barras y subirla al almacenamiento configurado
+        return codigo_barras_numerico_unico, self.subir_imagen(codigo_barras_numerico_unico)
+
+    def crear_y_reservar(self, usado: bool = False) -> Tuple[str, str]:
+        """
+        Crea un código de barras y lo inserta en la reserva, sin hacer commit.
+        Si el código choca con uno existente, la inserción no hace nada y se crea otro.
+        """
+        for _ in range(ASIGNAR_INTENTOS):
+            codigo, url = self.crear_y_subir()
+            if self._insertar_en_la_reserva(codigo, url, usado):
+                return codigo, url
+        raise ValueError("No se pudo asignar un código de barras sin repetir")
+
+    def crear_sin_imagen(self) -> Tuple[str, str | None]:
+        """
+        Asigna un código de barras y lo inserta en la reserva como usado, sin generar ni subir la imagen.
+        La URL es la del endpoint que la genera al pedirla, o None si no está configurado,
+        entonces el productor de la reserva sube la imagen después y la guarda en la cita.
         """
+        for _ in range(ASIGNAR_INTENTOS):
+            codigo = self._asignar_codigo_barras_ean13()
+            url = self._url_del_endpoint(codigo) if self._settings.CODIGO_BARRAS_URL_BASE else None
+            if self._insertar_en_la_reserva(codigo, url or "", usado=True):
+                return codigo, url
+        raise ValueError("No se pudo asignar un código de barras sin repetir")
 
-        # 1. Generar un código numérico único que no exista en la base de datos
-        codigo_barras_numerico_unico = None
-        codigo_barras_repetido = True
-        while codigo_barras_repetido:
-            codigo_barras_numerico_unico = self._generar_codigo_barras_ean13()
-            cita_existente = self._database.query(CitCita).filter_by(codigo_barras=codigo_barras_numerico_unico).first()
-            codigo_barras_repetido = cita_existente is not None
+    def reclamar(self) -> Tuple[str, str | None]:
+        """
+        Toma un código de barras de la reserva y lo marca como usado, sin hacer commit,
+        para que se confirme en la misma transacción que guarda la cita.
+        Si la reserva está vacía, asigna uno sin generar ni subir la imagen.
+        Como cit_citas está particionada no tiene UNIQUE (codigo_barras), la unicidad la garantiza
+        cit_codigos_barras: tiene los códigos de todas las citas y cada uno se toma una sola vez.
+        """
+        return self._tomar_de_la_reserva()
+
+    def _tomar_de_la_reserva(self) -> Tuple[str, str | None]:
+        """Toma el código disponible más antiguo de la reserva, o si está vacía asigna uno sin imagen, marcado como usado"""
+        cit_codigo_barras = (
+            self._database.query(CitCodigoBarras)
+            .filter_by(usado=False)
+            .filter_by(estatus="A")
+            .order_by(CitCodigoBarras.creado)
+            .with_for_update(skip_locked=True)
+            .limit(1)
+            .first()
+        )
+        if cit_codigo_barras is None:
+            metricas.incrementar("codigos_barras.reserva_vacia")
+            reserva_codigos_barras.avisar()
+            return self.crear_sin_imagen()
+        cit_codigo_barras.usado = True
+        self._database.add(cit_codigo_barras)
+        self._database.flush()
+        metricas.incrementar("codigos_barras.reclamados")
+        reserva_codigos_barras.avisar()
+        return cit_codigo_barras.codigo, cit_codigo_barras.url
+
+    def _insertar_en_la_reserva(self, codigo: str, url: str, usado: bool) -> bool:
+        """Inserta el código en la reserva, False si choca con uno que ya existe"""
+        insertado = self._database.execute(
+            insert(CitCodigoBarras)
+            .values(codigo=codigo, url=url, usado=usado)
+            .on_conflict_do_nothing(index_elements=["codigo"])
+            .returning(CitCodigoBarras.id)
+        ).first()
+        if insertado is None:
+            metricas.incrementar("codigos_barras.colisiones")
+            return False
+        return True
 
-        # 2. Generar la imagen del código de barras en memoria
-        codigo_barras_img = self._crear_imagen_ean13(codigo_barras_numerico_unico)
+    def _url_del_endpoint(self, numero_codigo: str) -> str:
+        """URL firmada del endpoint que genera la imagen al pedirla, con el formato y los dpi configurados"""
+        url_base = self._settings.CODIGO_BARRAS_URL_BASE.rstrip("/")
+        formato = self._settings.CODIGO_BARRAS_FORMATO
+        dpi = 0 if formato == "svg" else self._settings.CODIGO_BARRAS_DPI  # El SVG es vectorial, no depende de los dpi
+        firma = firmar_imagen(numero_codigo, formato, dpi, self._settings.CODIGO_BARRAS_LLAVE)
+        return f"{url_base}/{formato}/{dpi}/{firma}/{numero_codigo}.{EXTENSIONES[formato]}"
 
-        # 3. Subirla a Google Cloud Storage
+    def subir_imagen(self, numero_codigo: str) -> str:
+        """Genera la imagen de un código ya asignado, la sube y regresa la URL"""
         try:
-            codigo_barras_url = self._subir_a_google_storage(
-                imagen=codigo_barras_img,
-                numero_codigo=codigo_barras_numerico_unico
-            )
-        except (exceptions.GoogleAPICallError, ValueError) as e:
-            # Manejar posibles errores durante la subida
-            # Aquí podrías loggear el error o lanzar una excepción más específica
-            raise ConnectionError(f"Error al subir imagen a Google Storage: {e}") from e
-
-        return codigo_barras_numerico_unico, codigo_barras_url
-    
-    def _subir_a_google_storage(self, imagen: bytes, numero_codigo: str) -> str:
-        """Sube la imagen generada a Google Storage y regresa la URL pública."""
-
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self._settings.GCS_BUCKET_NAME)
-        
-        # Generar ruta con formato AÑO/MES/archivo.png
+            return self._subir_al_almacenamiento(imagen=self._crear_imagen_ean13(numero_codigo), numero_codigo=numero_codigo)
+        except MyAnyError as e:
+            raise ConnectionError(f"Error al subir la imagen del código de barras: {e}") from e
+
+    def _subir_al_almacenamiento(self, imagen: bytes, numero_codigo: str) -> str:
+        """Sube la imagen generada al almacenamiento y regresa la URL pública."""
+
+        # Generar ruta con formato AÑO/MES/archivo.extension
+        formato = self._settings.CODIGO_BARRAS_FORMATO
         ahora = datetime.now()
-        nombre_archivo = f"pjecz-citas/{ahora.strftime('%Y')}/{ahora.strftime('%m')}/{numero_codigo}.png"
-        blob = bucket.blob(nombre_archivo)
+        nombre_archivo = f"pjecz-citas/{ahora.strftime('%Y')}/{ahora.strftime('%m')}/{numero_codigo}.{EXTENSIONES[formato]}"
 
-        blob.upload_from_string(imagen, content_type="image/png")
+        return get_almacenamiento().subir(nombre_archivo, imagen, FORMATOS[formato])
 
-        return blob.public_url
-    
-    def _calcular_digito_verificador_ean13(self, base_12_digitos: str) -> str:
+    @staticmethod
+    def _calcular_digito_verificador_ean13(base_12_digitos: str) -> str:
         """Calcula el 13º dígito de control para un código EAN-13."""
         suma = 0
         for i, digito in enumerate(base_12_digitos):
@@ -91,55 +279,124 @@ class CodigoBarras():
         digito_control = (10 - (suma % 10)) % 10
         return str(digito_control)
 
-    def _generar_codigo_barras_ean13(self) -> str:
-        """Genera un código EAN-13 aleatorio de 13 dígitos válido para lectores."""
-        # 1. Generamos un número aleatorio de 12 dígitos
-        # Usamos secrets.randbelow para garantizar un rango limpio de 12 posiciones
-        numero_aleatorio = secrets.randbelow(900000000000) + 100000000000
-        base_12 = str(numero_aleatorio)
-        
-        # 2. Calculamos el dígito 13
+    def _asignar_codigo_barras_ean13(self) -> str:
+        """Asigna un código EAN-13 de 13 dígitos a partir del siguiente valor de la secuencia, sin consultar si existe."""
+        # 1. Tomamos el siguiente número de la secuencia, que nunca se repite
+        consecutivo = self._database.execute(text("SELECT nextval('cit_codigos_barras_seq')")).scalar_one()
+
+        # 2. Lo permutamos con la llave para obtener 12 dígitos que no sean predecibles
+        llave = self._settings.CODIGO_BARRAS_LLAVE.encode()
+        base_12 = str(BASE_12_MINIMO + permutar(consecutivo, llave))
+
+        # 3. Calculamos el dígito 13
         digito_13 = self._calcular_digito_verificador_ean13(base_12)
-        
-        # 3. Retornamos el código EAN-13 completo
+
+        # 4. Retornamos el código EAN-13 completo
         return base_12 + digito_13
-    
+
     def _crear_imagen_ean13(self, numero_codigo: str) -> bytes:
         """
-        Genera una imagen PNG de un código de barras EAN-13 y la devuelve como bytes.
+        Genera la imagen de un código de barras EAN-13, en el formato y dpi configurados, y la devuelve como bytes.
         
         :param numero_codigo: String de 13 dígitos numéricos válidos.
         :return: Los datos de la imagen en formato bytes.
         """
+        return renderizar_ean13(numero_codigo, self._settings.CODIGO_BARRAS_FORMATO, self._settings.CODIGO_BARRAS_DPI)
 
-        # 1. Validar que la longitud sea la correcta para EAN-13
-        if len(numero_codigo) != 13 or not numero_codigo.isdigit():
-            raise ValueError("El código EAN-13 debe tener exactamente 13 dígitos numéricos.")
 
-        # 2. Crear un buffer en memoria para la imagen
-        buffer = io.BytesIO()
+class ReservaCodigosBarras():
+    """Productor en segundo plano que mantiene una reserva de códigos de barras generados y subidos"""
+
+    def __init__(self):
+        self._settings = get_settings()
+        self._evento = asyncio.Event()
+        self._loop = None
 
-        # 2. Obtener la clase del formato EAN-13
-        EAN13 = barcode.get_barcode_class('ean13')
+    def avisar(self) -> None:
+        """Despertar al productor para que revise si debe rellenar la reserva"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._evento.set)
 
-        # 3. Configurar el diseño visual del código de barras
-        # Ajustamos opciones para que sea altamente legible por escáneres
-        opciones_diseno = {
-            'format': 'PNG',
-            'dpi': 300,              # Alta resolución para impresión o pantallas
-            'module_height': 10.0,   # Altura de las barras
-            'module_width': 0.2,     # Ancho de cada barra individual
-            'font_size': 10,         # Tamaño del texto que sale abajo
-            'text_distance': 4.0,    # Distancia entre las barras y el texto
-            'quiet_zone': 5.0        # Margen blanco a los lados para que el lector enfoque bien
-        }
+    def contar_disponibles(self, database: Session) -> int:
+        """Cantidad de códigos de barras disponibles en la reserva"""
+        return database.query(CitCodigoBarras).filter_by(usado=False).filter_by(estatus="A").count()
+
+    def completar_imagenes(self, database: Session) -> int:
+        """
+        Subir la imagen de las citas por venir que tomaron su código con la reserva vacía,
+        sin CODIGO_BARRAS_URL_BASE no tienen URL, y guardarla en la cita y en la reserva
+        """
+        citas = (
+            database.query(CitCita)
+            .filter(CitCita.inicio >= datetime.now())
+            .filter(CitCita.codigo_barras.is_not(None))
+            .filter(CitCita.codigo_barras_url.is_(None))
+            .limit(self._settings.CODIGO_BARRAS_RESERVA_MAXIMO)
+            .all()
+        )
+        codigo_barras = CodigoBarras(database)
+        for cit_cita in citas:
+            cit_cita.codigo_barras_url = codigo_barras.subir_imagen(cit_cita.codigo_barras)
+            database.execute(
+                update(CitCodigoBarras)
+                .where(CitCodigoBarras.codigo == cit_cita.codigo_barras)
+                .values(url=cit_cita.codigo_barras_url, modificado=func.now())
+            )
+            database.commit()
+            metricas.incrementar("codigos_barras.imagenes_completadas")
+        return len(citas)
+
+    def rellenar(self) -> int:
+        """
+        Si la reserva está debajo del mínimo, producir códigos hasta llegar al máximo.
+        Antes sube las imágenes que le falten a las citas por venir.
+        Toma el candado de la reserva en su propia conexión, si otro proceso lo tiene ya la está rellenando.
+        """
+        with engine.connect() as conexion:
+            candado = text("SELECT pg_try_advisory_lock(hashtext(:nombre))").bindparams(nombre=RESERVA_CANDADO)
+            if not conexion.execute(candado).scalar_one():
+                metricas.incrementar("codigos_barras.reserva_ocupada")
+                return 0
+            conexion.commit()
+            database = session_maker(bind=conexion)
+            try:
+                if not self._settings.CODIGO_BARRAS_URL_BASE:
+                    self.completar_imagenes(database)
+                disponibles = self.contar_disponibles(database)
+                metricas.establecer("codigos_barras.reserva_disponibles", disponibles)
+                if disponibles >= self._settings.CODIGO_BARRAS_RESERVA_MINIMO:
+                    return 0
+                producidos = 0
+                codigo_barras = CodigoBarras(database)
+                for _ in range(self._settings.CODIGO_BARRAS_RESERVA_MAXIMO - disponibles):
+                    inicio = time.perf_counter()
+                    codigo_barras.crear_y_reservar()
+                    database.commit()
+                    metricas.observar("codigos_barras.producir", time.perf_counter() - inicio)
+                    metricas.incrementar("codigos_barras.producidos")
+                    producidos += 1
+                metricas.establecer("codigos_barras.reserva_disponibles", disponibles + producidos)
+                return producidos
+            finally:
+                database.close()
+                conexion.rollback()
+                conexion.execute(text("SELECT pg_advisory_unlock(hashtext(:nombre))").bindparams(nombre=RESERVA_CANDADO))
+                conexion.commit()
 
-        # 4. Instanciar el código con el ImageWriter (necesario para generar archivos de imagen)
-        codigo_objeto = EAN13(numero_codigo, writer=ImageWriter())
+    async def ejecutar(self) -> None:
+        """Bucle del productor, revisa cada intervalo o cuando se reclama un código"""
+        self._loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.to_thread(self.rellenar)
+            except Exception as error:
+                metricas.incrementar("codigos_barras.errores_productor")
+                bitacora.warning("Falló el rellenado de la reserva de códigos de barras: %s", error)
+            self._evento.clear()
+            try:
+                await asyncio.wait_for(self._evento.wait(), timeout=self._settings.CODIGO_BARRAS_RESERVA_INTERVALO)
+            except asyncio.TimeoutError:
+                pass
 
-        # 5. Escribir la imagen en el buffer en memoria en lugar de un archivo
-        codigo_objeto.write(buffer, options=opciones_diseno)
 
-        # 6. Regresar al inicio del buffer y devolver su contenido
-        buffer.seek(0)
-        return buffer.read()
\ No newline at end of file
+reserva_codigos_barras = ReservaCodigosBarras()
@@ -0,0 +1,177 @@
+"""
+Códigos de acceso pendientes de las citas creadas en modo degradado
+
+La cita se guarda con codigo_acceso_pendiente, así si el proceso se reinicia antes de obtener el código,
+la tarea python -m pjecz_casiopea_api_oauth2.tareas.codigos_acceso lo retoma desde la base de datos.
+Cada intento toma la cita marcando codigo_acceso_tomado_hasta en una transacción corta, así la tarea y la API nunca
+trabajan la misma cita a la vez, consulta Control Acceso sin transacción abierta y guarda el resultado en otra.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import func, or_
+
+from ..config.settings import Settings
+from ..dependencies.control_acceso import generar_referencia, solicitar_codigo_acceso_protegido
+from ..dependencies.database import session_maker
+from ..dependencies.exceptions import MyAnyError, MyNotValidAnswerError
+from ..dependencies.metricas import metricas
+from ..models.cit_citas import CitCita
+from .sendmail import Email, PlantillaCitaCreada
+
+CODIGO_ACCESO_DIFERIDO_INTENTOS = 5  # Intentos en segundo plano de la API, luego sigue la tarea codigos_acceso
+CODIGO_ACCESO_INTENTOS_MAXIMO = 12  # Al llegar a estos intentos se envía el email sin el código de acceso
+
+
+def calcular_espera_diferida(settings: Settings) -> float:
+    """Segundos que la API espera en total entre sus intentos en segundo plano"""
+    return settings.CONTROL_ACCESO_CIRCUITO_ESPERA * CODIGO_ACCESO_DIFERIDO_INTENTOS * (CODIGO_ACCESO_DIFERIDO_INTENTOS + 1) / 2
+
+
+def calcular_toma(settings: Settings) -> float:
+    """Segundos que un intento tiene tomada la cita, lo más que tarda la solicitud a Control Acceso con sus reintentos"""
+    return (settings.CONTROL_ACCESO_TIMEOUT + settings.CONTROL_ACCESO_CONNECT_TIMEOUT + 1) * (
+        settings.CONTROL_ACCESO_REINTENTOS + 1
+    )
+
+
+def crear_payload(settings: Settings, cit_cliente, cit_servicio_clave: str, oficina_clave: str, inicio: datetime) -> dict:
+    """Datos para solicitar el código de acceso, cit_cliente puede ser el modelo o el esquema del cliente"""
+    return {
+        "aplicacion": settings.CONTROL_ACCESO_APLICACION,
+        "referencia": generar_referencia(cit_cliente.email, cit_servicio_clave, oficina_clave, inicio),
+        "nombres": cit_cliente.nombres,
+        "apellidos": f"{cit_cliente.apellido_primero} {cit_cliente.apellido_segundo}",
+        "correoElectronico": cit_cliente.email,
+        "telefono": f"+52{cit_cliente.telefono}",
+        "Duracion": 60,
+        "fecha": inicio.isoformat(timespec="minutes"),
+        "cita": True,
+        "PrivilegeGroups": [],
+    }
+
+
+def crear_email_cita_creada(cit_cita: CitCita) -> Email:
+    """Email de la cita creada, con el código de acceso si ya lo tiene"""
+    return Email(
+        cit_cita.cit_cliente_email,
+        PlantillaCitaCreada(
+            id=str(cit_cita.id),
+            nombre_cliente=cit_cita.cit_cliente.nombre,
+            oficina=cit_cita.oficina_descripcion,
+            servicio=cit_cita.cit_servicio_descripcion,
+            fecha_hora_cita=cit_cita.inicio,
+            notas=cit_cita.notas,
+            codigo_qr_url=cit_cita.codigo_acceso_url,
+            codigo_barras_url=cit_cita.codigo_barras_url,
+        ),
+    )
+
+
+def tomar_cita(settings: Settings, cit_cita_id: uuid.UUID) -> dict | None:
+    """Tomar la cita pendiente por calcular_toma segundos y regresar los datos para solicitar su código, None si no se puede"""
+    database = session_maker()
+    try:
+        cit_cita = (
+            database.query(CitCita)
+            .filter(CitCita.id == cit_cita_id)
+            .filter(CitCita.codigo_acceso_pendiente.is_(True))
+            .filter(or_(CitCita.codigo_acceso_tomado_hasta.is_(None), CitCita.codigo_acceso_tomado_hasta < func.now()))
+            .with_for_update(skip_locked=True, of=CitCita)
+            .one_or_none()
+        )
+        if cit_cita is None:
+            return None
+        payload = crear_payload(
+            settings, cit_cita.cit_cliente, cit_cita.cit_servicio_clave, cit_cita.oficina_clave, cit_cita.inicio
+        )
+        cit_cita.codigo_acceso_tomado_hasta = func.now() + timedelta(seconds=calcular_toma(settings))
+        database.commit()
+        return payload
+    finally:
+        database.close()
+
+
+def terminar_intento(cit_cita_id: uuid.UUID, codigo_acceso: tuple[int, str] | None, fallo: bool) -> tuple[bool, Email | None]:
+    """
+    Guardar el resultado del intento y soltar la cita, regresa si sigue pendiente y el email por enviar si ya no
+
+    Con fallo se cuenta el intento y sigue pendiente hasta llegar a CODIGO_ACCESO_INTENTOS_MAXIMO.
+    """
+    database = session_maker()
+    try:
+        cit_cita = (
+            database.query(CitCita)
+            .filter(CitCita.id == cit_cita_id)
+            .filter(CitCita.codigo_acceso_pendiente.is_(True))
+            .with_for_update(of=CitCita)
+            .one_or_none()
+        )
+        if cit_cita is None:
+            return False, None
+        cit_cita.codigo_acceso_tomado_hasta = None
+        if fallo:
+            cit_cita.codigo_acceso_intentos += 1
+            if cit_cita.codigo_acceso_intentos < CODIGO_ACCESO_INTENTOS_MAXIMO:
+                database.commit()
+                return True, None
+            metricas.incrementar("control_acceso.diferido_fallas")
+
+        # Ya no está pendiente, con o sin el código de acceso se envía el email
+        if codigo_acceso is not None:
+            cit_cita.codigo_acceso_id, cit_cita.codigo_acceso_url = codigo_acceso
+        cit_cita.codigo_acceso_pendiente = False
+        email = crear_email_cita_creada(cit_cita)
+        database.commit()
+        return False, email
+    finally:
+        database.close()
+
+
+async def intentar_codigo_acceso(cliente: httpx.AsyncClient, settings: Settings, cit_cita_id: uuid.UUID) -> bool:
+    """
+    Intentar una vez obtener el código de acceso pendiente de la cita, regresa True si la cita ya no está pendiente
+
+    Si lo obtiene, o si Control Acceso lo rechaza, o si se llega a CODIGO_ACCESO_INTENTOS_MAXIMO, se quita la marca
+    y se envía el email de la cita creada; si no, solo se cuenta el intento para reintentarlo después.
+    Control Acceso se consulta sin transacción abierta, la cita queda tomada con codigo_acceso_tomado_hasta.
+    """
+    payload = await asyncio.to_thread(tomar_cita, settings, cit_cita_id)
+    if payload is None:
+        return True  # Ya se completó o la está trabajando otro proceso
+
+    # Solicitar el código de acceso, sin pasar del tiempo que se tiene tomada la cita
+    codigo_acceso = None
+    fallo = False
+    try:
+        async with asyncio.timeout(calcular_toma(settings)):
+            codigo_acceso = await solicitar_codigo_acceso_protegido(cliente, settings, payload)
+        metricas.incrementar("control_acceso.diferido_exitos")
+    except MyNotValidAnswerError:
+        metricas.incrementar("control_acceso.diferido_fallas")
+    except (MyAnyError, TimeoutError):
+        fallo = True
+
+    # Guardar el resultado en otra transacción corta y enviar el email si ya no está pendiente
+    pendiente, email = await asyncio.to_thread(terminar_intento, cit_cita_id, codigo_acceso, fallo)
+    if email is not None:
+        try:
+            await email.enviar_email_async()
+        except MyAnyError:
+            metricas.incrementar("control_acceso.diferido_email_fallas")
+    return not pendiente
+
+
+async def completar_codigo_acceso(cliente: httpx.AsyncClient, settings: Settings, cit_cita_id: uuid.UUID) -> None:
+    """
+    Obtener en segundo plano el código de acceso de una cita creada en modo degradado y enviar su email
+
+    Lo que no se complete aquí, por ejemplo si el proceso se reinicia, lo retoma la tarea codigos_acceso.
+    """
+    for intento in range(1, CODIGO_ACCESO_DIFERIDO_INTENTOS + 1):
+        await asyncio.sleep(settings.CONTROL_ACCESO_CIRCUITO_ESPERA * intento)
+        if await intentar_codigo_acceso(cliente, settings, cit_cita_id):
+            return
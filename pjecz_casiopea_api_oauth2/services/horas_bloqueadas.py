@@ -0,0 +1,65 @@
+"""
+Horas bloqueadas en memoria, por oficina y fecha, se descartan al vencer CATALOGOS_TTL
+o cuando se notifica un cambio en cit_horas_bloqueadas
+"""
+
+import threading
+import time
+import uuid
+from datetime import date
+from datetime import time as hora
+
+from sqlalchemy.orm import Session
+
+from ..config.settings import get_settings
+from ..dependencies.metricas import metricas
+from ..models.cit_horas_bloqueadas import CitHoraBloqueada
+from .invalidacion import bus_invalidacion
+
+MAXIMO_ENTRADAS = 10000  # Al llegar a este tamaño se vacía, las oficinas por los días disponibles caben de sobra
+
+
+class CacheHorasBloqueadas:
+    """Guarda los intervalos de inicio y término bloqueados de cada oficina y fecha"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._candado = threading.Lock()
+        self._entradas: dict[tuple[uuid.UUID, date], tuple[float, tuple[tuple[hora, hora], ...]]] = {}
+        self._invalidaciones = 0
+
+    def obtener(self, database: Session, oficina_id: uuid.UUID, fecha: date) -> tuple[tuple[hora, hora], ...]:
+        """Intervalos bloqueados de la oficina en la fecha, solo consulta la base de datos si no están o ya vencieron"""
+        llave = (oficina_id, fecha)
+        entrada = self._entradas.get(llave)
+        if entrada is not None and time.monotonic() - entrada[0] < self.ttl:
+            metricas.incrementar("horas_bloqueadas.aciertos")
+            return entrada[1]
+        metricas.incrementar("horas_bloqueadas.fallos")
+        invalidaciones = self._invalidaciones
+        intervalos = tuple(
+            (cit_hora_bloqueada.inicio, cit_hora_bloqueada.termino)
+            for cit_hora_bloqueada in database.query(CitHoraBloqueada)
+            .filter_by(oficina_id=oficina_id)
+            .filter_by(fecha=fecha)
+            .filter_by(estatus="A")
+            .order_by(CitHoraBloqueada.id)
+        )
+        with self._candado:
+            # Si la invalidaron mientras se consultaba, puede traer datos viejos, se usa pero no se guarda
+            if invalidaciones == self._invalidaciones:
+                if len(self._entradas) >= MAXIMO_ENTRADAS:
+                    self._entradas.clear()
+                self._entradas[llave] = (time.monotonic(), intervalos)
+        return intervalos
+
+    def invalidar(self) -> None:
+        """Descartar todas las entradas"""
+        with self._candado:
+            self._invalidaciones += 1
+            self._entradas.clear()
+        metricas.incrementar("horas_bloqueadas.invalidaciones")
+
+
+cache_horas_bloqueadas = CacheHorasBloqueadas(ttl=get_settings().CATALOGOS_TTL)
+bus_invalidacion.suscribir([CitHoraBloqueada.__tablename__], cache_horas_bloqueadas.invalidar)
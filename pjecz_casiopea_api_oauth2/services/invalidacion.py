@@ -0,0 +1,92 @@
+"""
+Bus de invalidación de los cachés en memoria, escucha con LISTEN las notificaciones que emiten los triggers
+de las tablas y llama a las funciones suscritas a cada tabla, así cada proceso descarta sus copias
+cuando el sistema de administración cambia los datos
+"""
+
+import asyncio
+import logging
+from typing import Callable
+
+import psycopg2
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..dependencies.database import engine
+from ..dependencies.metricas import metricas
+
+CANAL = "cache_invalidacion"  # El mismo de la función notificar_cache_invalidacion en la migración v1.5.0-05
+ESPERA_RECONECTAR = 5  # Segundos entre intentos de reconexión
+INTERVALO_VERIFICAR = 60  # Segundos sin notificaciones tras los que se verifica que la conexión siga viva
+
+bitacora = logging.getLogger(__name__)
+
+
+class BusInvalidacion:
+    """Reparte las notificaciones de cambios en las tablas a las funciones suscritas"""
+
+    def __init__(self):
+        self._suscriptores: dict[str, list[Callable[[], None]]] = {}
+
+    def suscribir(self, tablas: list[str], funcion: Callable[[], None]) -> None:
+        """Llamar a la función cuando cambie alguna de las tablas"""
+        for tabla in tablas:
+            self._suscriptores.setdefault(tabla, []).append(funcion)
+
+    def invalidar(self, tabla: str) -> None:
+        """Llamar a las funciones suscritas a la tabla"""
+        metricas.incrementar("invalidacion.notificaciones")
+        for funcion in self._suscriptores.get(tabla, []):
+            funcion()
+
+    def invalidar_todo(self) -> None:
+        """Llamar a todas las funciones suscritas, por si se perdieron notificaciones mientras no se escuchaba"""
+        for funcion in {funcion for funciones in self._suscriptores.values() for funcion in funciones}:
+            funcion()
+
+    @staticmethod
+    def conectar():
+        """Conexión de psycopg2 propia, fuera del pool y en autocommit, que queda escuchando el canal"""
+        proxy = engine.raw_connection()
+        proxy.detach()
+        conexion = proxy.dbapi_connection
+        conexion.autocommit = True
+        with conexion.cursor() as cursor:
+            cursor.execute(f"LISTEN {CANAL}")
+        return conexion
+
+    async def escuchar(self) -> None:
+        """Bucle del escucha, se reconecta si se pierde la conexión"""
+        loop = asyncio.get_running_loop()
+        while True:
+            conexion = None
+            try:
+                conexion = await asyncio.to_thread(self.conectar)
+                self.invalidar_todo()
+                evento = asyncio.Event()
+                descriptor = conexion.fileno()
+                loop.add_reader(descriptor, evento.set)
+                try:
+                    while True:
+                        try:
+                            await asyncio.wait_for(evento.wait(), timeout=INTERVALO_VERIFICAR)
+                        except asyncio.TimeoutError:
+                            with conexion.cursor() as cursor:
+                                cursor.execute("SELECT 1")
+                        evento.clear()
+                        conexion.poll()
+                        tablas = {notificacion.payload for notificacion in conexion.notifies}
+                        conexion.notifies.clear()
+                        for tabla in tablas:
+                            self.invalidar(tabla)
+                finally:
+                    loop.remove_reader(descriptor)
+            except (psycopg2.Error, SQLAlchemyError, OSError) as error:
+                metricas.incrementar("invalidacion.reconexiones")
+                bitacora.warning("Se perdió la escucha de invalidaciones de caché: %s", error)
+            finally:
+                if conexion is not None and not conexion.closed:
+                    conexion.close()
+            await asyncio.sleep(ESPERA_RECONECTAR)
+
+
+bus_invalidacion = BusInvalidacion()
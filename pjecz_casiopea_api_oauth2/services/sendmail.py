@@ -1,27 +1,61 @@
 """
 Servicio para enviar correos electrónicos
 """
+import logging
 import os
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, fields
 from datetime import datetime
-import locale
+from functools import lru_cache
 import pytz
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import escape
 
-import sendgrid
-from sendgrid.helpers.mail import Content, Email as EmailSendGrid, Mail, To
+from sendgrid.helpers.mail import Content, To
 from ..config.settings import Settings, get_settings
 from ..dependencies.exceptions import MyRequestError
+from ..dependencies.fechas import formatear_fecha
+from ..dependencies.metricas import metricas
+from .transporte_correo import Mensaje, get_transporte
+
+# Directorio de las plantillas de correo, relativo a la ubicación de este archivo
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', 'templates', 'email')
+
+bitacora = logging.getLogger(__name__)
+
+
+@lru_cache()
+def get_jinja_environment() -> Environment:
+    """Entorno de Jinja2 compartido por todo el proceso, las plantillas compiladas se quedan en memoria"""
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=False,  # Las plantillas no cambian mientras corre la aplicación
+        bytecode_cache=FileSystemBytecodeCache(),  # Los procesos siguientes no vuelven a compilar
+    )
+
+
+def precompilar_plantillas() -> list[str]:
+    """Compilar todas las plantillas de correo, se llama al iniciar la aplicación"""
+    environment = get_jinja_environment()
+    nombres = environment.list_templates(extensions=['jinja2'])
+    for nombre in nombres:
+        environment.get_template(nombre)
+    return nombres
 
 
 class PlantillaEmailBase(ABC):
-    """Clase base abstracta para las plantillas de correo."""
+    """
+    Clase base abstracta para las plantillas de correo.
 
-    FORMATO_FECHA_Y_HORA = "%d de %B del %Y a las %I:%M %p"
+    Cada plantilla es una dataclass inmutable con sus propias variables,
+    así una misma instancia se puede renderizar desde varios hilos sin mezclar datos.
+    """
+
+    __slots__ = ()
 
-    _enviroment: Environment
-    _fecha_hora_envio_str: str
+    FORMATO_FECHA_Y_HORA = "%d de %B del %Y a las %I:%M %p"
 
     @property
     @abstractmethod
@@ -34,202 +68,179 @@ class PlantillaEmailBase(ABC):
     def subject(self) -> str:
         """Asunto del correo electrónico."""
         pass
-    
-    @property
-    @abstractmethod
-    def _variables_contenido(self) -> dict[str, str]:
-        """Variables para la plantilla."""
-        pass
-
-    def __init__(self):
-        """Constructor de la clase."""
-
-        # Configurar el locale a español
-        try:
-            locale.setlocale(locale.LC_TIME, 'es_ES.utf8')
-        except locale.Error:
-            locale.setlocale(locale.LC_TIME, 'es_ES')
-
-        # Por defecto se establece al fecha de envío en el momento de creación de la plantilla
-        self.set_fecha_envio(datetime.now())
-
-        # Configurar el entorno de Jinja2 para cargar plantillas desde el directorio 'templates/email'
-        # La ruta se construye de forma relativa a la ubicación de este archivo.
-        template_dir = os.path.join(os.path.dirname(__file__), '..', 'templates', 'email')
-        self._enviroment = Environment(loader=FileSystemLoader(template_dir), autoescape=True)
-
-    def set_fecha_envio(self, fecha_envio:datetime) -> None:
-        """Establece la fecha y hora de envío"""
-        
-        self._fecha_hora_envio_str = fecha_envio.strftime(self.FORMATO_FECHA_Y_HORA)
-
-    @abstractmethod
-    def get_contenido(self) -> dict:
-        """Diccionario con las variables para renderizar la plantilla."""
-        pass
-
-    def get_contenido(self) -> Content:
-        """Carga las variables en la plantilla y la regresa como contenido HTML"""
-
-        # Cargar la plantilla específica
-        template = self._enviroment.get_template(self.template_name)
-        # Renderizar la plantilla con las variables proporcionadas
-        return Content("text/html", template.render(**self._variables_contenido, fecha_hora_envio=self._fecha_hora_envio_str))
-
 
+    def _variables_contenido(self, fecha_envio: datetime) -> dict[str, str]:
+        """Variables para la plantilla, tomadas de los campos de la instancia, las fechas ya con formato."""
+        variables = {}
+        for campo in fields(self):
+            valor = getattr(self, campo.name)
+            if isinstance(valor, datetime):
+                valor = formatear_fecha(valor, self.FORMATO_FECHA_Y_HORA)
+            variables[campo.name] = valor
+        variables["fecha_hora_envio"] = formatear_fecha(fecha_envio, self.FORMATO_FECHA_Y_HORA)
+        return variables
+
+    def _renderizar(self, variables: dict[str, str]) -> str:
+        """Renderiza la plantilla, ya compilada en el entorno compartido, con las variables dadas."""
+        return get_jinja_environment().get_template(self.template_name).render(**variables)
+
+    def get_contenido(self, fecha_envio: datetime | None = None) -> Content:
+        """Carga las variables en la plantilla y la regresa como contenido HTML, por defecto con la fecha de envío de ahora"""
+        if fecha_envio is None:
+            fecha_envio = datetime.now()
+        return Content("text/html", self._renderizar(self._variables_contenido(fecha_envio)))
+
+    def get_contenido_y_sustituciones(self, fecha_envio: datetime) -> tuple[str, str, tuple[tuple[str, str], ...]]:
+        """
+        Regresa el HTML, el mismo HTML con una etiqueta %campo% en lugar de cada valor del destinatario,
+        y las sustituciones que lo reconstruyen. Así SendGrid envía a muchos destinatarios con un solo cuerpo.
+        Si las sustituciones no reconstruyen exactamente el HTML, se regresa sin etiquetas.
+        """
+        variables = self._variables_contenido(fecha_envio)
+        html = self._renderizar(variables)
+
+        # Reemplazar los valores más largos primero, ya escapados como los pone la plantilla
+        cuerpo = html
+        sustituciones = []
+        for campo, valor in sorted(variables.items(), key=lambda variable: -len(str(variable[1] or ""))):
+            etiqueta = f"%{campo}%"
+            texto = str(escape(valor)) if valor else ""
+            if texto == "" or etiqueta in html or texto not in cuerpo:
+                continue
+            cuerpo = cuerpo.replace(texto, etiqueta)
+            sustituciones.append((etiqueta, texto))
+
+        # Comprobar que las sustituciones dan el mismo HTML, sin importar el orden en que se apliquen
+        reconstruido = cuerpo
+        for etiqueta, texto in sustituciones:
+            if any(otra in texto for otra, _ in sustituciones):
+                return html, html, ()
+            reconstruido = reconstruido.replace(etiqueta, texto)
+        if reconstruido != html:
+            return html, html, ()
+        return html, cuerpo, tuple(sustituciones)
+
+
+@dataclass(frozen=True, slots=True)
 class PlantillaClienteValidarCuenta(PlantillaEmailBase):
     """
     Define los datos necesarios para la plantilla de validación de una cuenta de un cliente.
     """
     template_name = "cliente_validar_cuenta.jinja2"
     subject = "Valida tu email para utilizar el Sistema de Citas SAJI"
-    _variables_contenido: dict[str, str] = {
-        'nombre_cliente': '',
-        'cliente_id': '',
-        'url_sistema_citas': '',
-    }
 
-    def __init__(self, nombre_cliente: str, cliente_id: str, url_sistema_citas: str):
-        super().__init__()
-
-        self._variables_contenido['nombre_cliente'] = nombre_cliente
-        self._variables_contenido['cliente_id'] = cliente_id
-        self._variables_contenido['url_sistema_citas'] = url_sistema_citas
+    nombre_cliente: str
+    cliente_id: str
+    url_sistema_citas: str
 
 
+@dataclass(frozen=True, slots=True)
 class PlantillaClienteCambiarContrasena(PlantillaEmailBase):
     """
     Define los datos necesarios para la plantilla de cambio de contraseña de un cliente.
     """
     template_name = "cliente_cambiar_contrasena.jinja2"
     subject = "Cambiar su contraseña"
-    _variables_contenido: dict[str, str] = {
-        'nombre_cliente': '',
-        'cliente_id': '',
-        'cliente_email': '',
-        'url_cambio_contrasena': '',
-    }
-
-    def __init__(self, nombre_cliente: str, cliente_id: str, cliente_email: str, url_cambio_contrasena: str):
-        super().__init__()
 
-        self._variables_contenido['nombre_cliente'] = nombre_cliente
-        self._variables_contenido['cliente_id'] = cliente_id
-        self._variables_contenido['cliente_email'] = cliente_email
-        self._variables_contenido['url_cambio_contrasena'] = url_cambio_contrasena
+    nombre_cliente: str
+    cliente_id: str
+    cliente_email: str
+    url_cambio_contrasena: str
 
 
+@dataclass(frozen=True, slots=True)
 class PlantillaClienteCompletado(PlantillaEmailBase):
     """
     Representa la plantilla de correo electrónico para notificar a un cliente
     que su proceso o registro ha sido completado con éxito.
+
+    Esta clase hereda de `PlantillaEmailBase` y extiende su funcionalidad para
+    personalizar el contenido del mensaje con los datos específicos del cliente
+    y el acceso al sistema de citas.
+
+    ## Atributos:
+        nombre_cliente (str): Nombre completo del cliente para el saludo.
+        cliente_id (str): Identificador único del cliente en la base de datos.
+        cliente_email (str): Dirección de correo electrónico del destinatario.
+        url_sistema_citas (str): Enlace directo para que el cliente gestione sus citas.
+
+    ## Ejemplo:
+    ```python
+    plantilla = PlantillaClienteCompletado(
+        nombre_cliente="Juan Pérez",
+        cliente_id="CLI-123",
+        cliente_email="juan.perez@email.com",
+        url_sistema_citas="https://citas.empresa.com"
+    )
+    ```
     """
 
     template_name = "cliente_completado.jinja2"
     subject = "Se ha completado el registro"
-    _variables_contenido: dict[str, str] = {
-        'nombre_cliente': '',
-        'cliente_id': '',
-        'cliente_email': '',
-        'url_sistema_citas': '',
-    }
-
-    def __init__(self, nombre_cliente: str, cliente_id: str, cliente_email: str, url_sistema_citas: str):
-        """
-        Representa la plantilla de correo electrónico para notificar a un cliente
-        que su proceso o registro ha sido completado con éxito.
-
-        Esta clase hereda de `PlantillaEmailBase` y extiende su funcionalidad para
-        personalizar el contenido del mensaje con los datos específicos del cliente
-        y el acceso al sistema de citas.
-
-        ## Atributos:
-            nombre_cliente (str): Nombre completo del cliente para el saludo.
-            cliente_id (str): Identificador único del cliente en la base de datos.
-            cliente_email (str): Dirección de correo electrónico del destinatario.
-            url_sistema_citas (str): Enlace directo para que el cliente gestione sus citas.
-
-        ## Ejemplo:
-        ```python
-        plantilla = PlantillaClienteCompletado(
-            nombre_cliente="Juan Pérez",
-            cliente_id="CLI-123",
-            cliente_email="juan.perez@email.com",
-            url_sistema_citas="https://citas.empresa.com"
-        )
-        ```
-        """
-        super().__init__()
 
-        self._variables_contenido['nombre_cliente'] = nombre_cliente
-        self._variables_contenido['cliente_id'] = cliente_id
-        self._variables_contenido['cliente_email'] = cliente_email
-        self._variables_contenido['url_sistema_citas'] = url_sistema_citas
+    nombre_cliente: str
+    cliente_id: str
+    cliente_email: str
+    url_sistema_citas: str
 
 
+@dataclass(frozen=True, slots=True)
 class PlantillaCitaCreada(PlantillaEmailBase):
     """
     Plantilla para la creación de una cita.
     """
     template_name = "cita_creada.jinja2"
     subject = "Cita Agendada"
-    _variables_contenido: dict[str, str] = {
-        'nombre_cliente': '',
-        'id': '',
-        'oficina': '',
-        'servicio': '',
-        'fecha_hora_cita': '',
-        'notas': '',
-        'codigo_qr_url': '',
-        'codigo_barras_url': '',
-    }
-
-    def __init__(self, id: str, nombre_cliente: str, oficina: str, servicio: str, fecha_hora_cita: datetime, notas: str, codigo_qr_url: str, codigo_barras_url: str):
-        super().__init__()
-
-        self._variables_contenido['id'] = id
-        self._variables_contenido['nombre_cliente'] = nombre_cliente
-        self._variables_contenido['oficina'] = oficina
-        self._variables_contenido['servicio'] = servicio
-        self._variables_contenido['fecha_hora_cita'] = fecha_hora_cita.strftime(self.FORMATO_FECHA_Y_HORA)
-        self._variables_contenido['notas'] = notas
-        self._variables_contenido['codigo_qr_url'] = codigo_qr_url
-        self._variables_contenido['codigo_barras_url'] = codigo_barras_url
 
+    id: str
+    nombre_cliente: str
+    oficina: str
+    servicio: str
+    fecha_hora_cita: datetime
+    notas: str
+    codigo_qr_url: str
+    codigo_barras_url: str
+
+
+@dataclass(frozen=True, slots=True)
+class PlantillaCitaRecordatorio(PlantillaEmailBase):
+    """
+    Plantilla para el recordatorio de una cita, se envía un día antes.
+    """
+    template_name = "cita_recordatorio.jinja2"
+    subject = "Recordatorio de Cita"
+
+    id: str
+    nombre_cliente: str
+    oficina: str
+    servicio: str
+    fecha_hora_cita: datetime
+    notas: str
+    codigo_qr_url: str
+    codigo_barras_url: str
 
+
+@dataclass(frozen=True, slots=True)
 class PlantillaCitaCancelada(PlantillaEmailBase):
     """
     Plantilla para la cancelación de una cita.
     """
     template_name = "cita_cancelada.jinja2"
     subject = "Cita Cancelada"
-    _variables_contenido: dict[str, str] = {
-        'nombre_cliente': '',
-        'id': '',
-        'oficina': '',
-        'servicio': '',
-        'fecha_hora_cita': '',
-        'notas': '',
-        'fecha_hora_cancelacion': '',
-    }
-
-    def __init__(self, id: str, nombre_cliente: str, oficina: str, servicio: str, fecha_hora_cita: datetime, notas: str, fecha_hora_cancelacion: datetime):
-        super().__init__()
-
-        self._variables_contenido['id'] = id
-        self._variables_contenido['nombre_cliente'] = nombre_cliente
-        self._variables_contenido['oficina'] = oficina
-        self._variables_contenido['servicio'] = servicio
-        self._variables_contenido['fecha_hora_cita'] = fecha_hora_cita.strftime(self.FORMATO_FECHA_Y_HORA)
-        self._variables_contenido['notas'] = notas
-        self._variables_contenido['fecha_hora_cancelacion'] = fecha_hora_cancelacion.strftime(self.FORMATO_FECHA_Y_HORA)
+
+    id: str
+    nombre_cliente: str
+    oficina: str
+    servicio: str
+    fecha_hora_cita: datetime
+    notas: str
+    fecha_hora_cancelacion: datetime
 
 
 class Email():
     """Email"""
 
     _settings: Settings
-    _remitente_email: EmailSendGrid
     plantilla: PlantillaEmailBase
     to_email: To
 
@@ -237,39 +248,44 @@ class Email():
         """Inicializa el servicio de email, especifica el destinatario y si quieres una plantilla"""
 
         self._settings = get_settings()
-        self._remitente_email = EmailSendGrid(self._settings.SENDGRID_FROM_EMAIL)
 
         self.plantilla = plantilla
         self.to_email = To(to_email)
 
-        # Configurar el locale a español
-        try:
-            locale.setlocale(locale.LC_TIME, 'es_ES.utf8')
-        except locale.Error:
-            locale.setlocale(locale.LC_TIME, 'es_ES')
-
     def set_plantilla(self, plantilla: PlantillaEmailBase) -> None:
         """Establece una nueva plantilla a utilizar"""
         self.plantilla = plantilla
 
-    def enviar_email(self):
-        """ Envío de email por SendGrid """
-
-        # Establecer la fecha y hora de envío
-        self.plantilla.set_fecha_envio(datetime.now(tz=pytz.timezone(self._settings.TZ)))
-
-        # Enviar el e-mail
-        send_grid = sendgrid.SendGridAPIClient(api_key=self._settings.SENDGRID_API_KEY)
-        
-        mail = Mail(
-            from_email=self._remitente_email,
-            to_emails=self.to_email,
+    def get_mensaje(self) -> Mensaje:
+        """Renderiza la plantilla con la fecha y hora de envío de ahora y entrega el mensaje listo para el transporte"""
+        fecha_envio = datetime.now(tz=pytz.timezone(self._settings.TZ))
+        html, cuerpo, sustituciones = self.plantilla.get_contenido_y_sustituciones(fecha_envio)
+        return Mensaje(
+            to_email=self.to_email.email,
             subject=self.plantilla.subject,
-            html_content=self.plantilla.get_contenido(),
+            html=html,
+            cuerpo=cuerpo,
+            sustituciones=sustituciones,
         )
 
-        # Enviar mensaje de correo electrónico
+    def enviar_email(self):
+        """ Envío de email con el transporte compartido por todo el proceso """
+        get_transporte().enviar(self.get_mensaje())
+
+    async def enviar_email_async(self):
+        """ Envío de email sin bloquear el event loop """
+        await get_transporte().enviar_async(self.get_mensaje())
+
+    async def enviar_email_segundo_plano(self):
+        """ Envío de email como tarea de segundo plano, después de entregar la respuesta; si falla solo se registra """
         try:
-            send_grid.send(mail)
-        except Exception as error:
-            raise MyRequestError(f"Error al enviar el mensaje por Sendgrid: {str(error)}") from error
+            await self.enviar_email_async()
+        except Exception:
+            # Cualquier excepción, porque en la tarea de segundo plano nadie más la atrapa
+            metricas.incrementar("correo.segundo_plano_fallas")
+            bitacora.exception("Falló el email a %s", self.to_email.email)
+
+
+def enviar_emails(emails: list[Email]) -> int:
+    """Envío de varios emails en lotes, regresa la cantidad de solicitudes hechas"""
+    return get_transporte().enviar_lote([email.get_mensaje() for email in emails])
@@ -0,0 +1,265 @@
+"""
+Transporte de correos electrónicos intercambiable: SendGrid, SMTP, archivos en un directorio o en memoria
+"""
+
+import asyncio
+import smtplib
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from email.message import EmailMessage
+from pathlib import Path
+
+import httpx
+from sendgrid.helpers.mail import Content
+from sendgrid.helpers.mail import Email as EmailSendGrid
+from sendgrid.helpers.mail import Mail, Personalization, Substitution, To
+
+from ..config.settings import Settings, get_settings
+from ..dependencies.exceptions import MyAnyError, MyMissingConfigurationError, MyRequestError
+from ..dependencies.metricas import metricas
+from ..dependencies.plazos import limitar
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+SENDGRID_MAXIMO_PERSONALIZACIONES = 1000  # Límite de la API por solicitud
+TIEMPO_CONECTAR = 5.0
+TIEMPO_ESPERA = 30.0
+
+
+@dataclass(frozen=True, slots=True)
+class Mensaje:
+    """
+    Un correo ya renderizado, listo para enviarse. Opcionalmente el cuerpo con etiquetas %campo% y las sustituciones
+    de este destinatario que lo vuelven el html, para que SendGrid envíe varios destinatarios con un solo cuerpo.
+    """
+
+    to_email: str
+    subject: str
+    html: str
+    cuerpo: str = ""
+    sustituciones: tuple[tuple[str, str], ...] = ()
+
+
+class TransporteCorreo(ABC):
+    """Clase base abstracta para los transportes, limita los envíos simultáneos a CORREO_CONCURRENCIA"""
+
+    nombre: str
+
+    def __init__(self, settings: Settings):
+        self._remitente = settings.SENDGRID_FROM_EMAIL
+        self._semaforo = threading.BoundedSemaphore(settings.CORREO_CONCURRENCIA)
+
+    def enviar(self, mensaje: Mensaje) -> None:
+        """Enviar un solo mensaje"""
+        self.enviar_lote([mensaje])
+
+    def enviar_lote(self, mensajes: list[Mensaje]) -> int:
+        """Enviar varios mensajes y regresar la cantidad de solicitudes hechas, causa el primer error si alguno falló"""
+        solicitudes, fallidos = self.enviar_lote_parcial(mensajes)
+        if fallidos:
+            raise fallidos[0][1]
+        return solicitudes
+
+    def enviar_lote_parcial(self, mensajes: list[Mensaje]) -> tuple[int, list[tuple[Mensaje, MyAnyError]]]:
+        """Enviar varios mensajes, registra el tiempo y regresa las solicitudes hechas y los mensajes que fallaron"""
+        inicio = time.perf_counter()
+        try:
+            with self._semaforo:
+                solicitudes, fallidos = self._enviar_lote(mensajes)
+        finally:
+            metricas.observar(f"correo.{self.nombre}.enviar", time.perf_counter() - inicio)
+        metricas.incrementar(f"correo.{self.nombre}.mensajes", len(mensajes) - len(fallidos))
+        metricas.incrementar(f"correo.{self.nombre}.solicitudes", solicitudes)
+        if fallidos:
+            metricas.incrementar(f"correo.{self.nombre}.errores", len(fallidos))
+        return solicitudes, fallidos
+
+    async def enviar_async(self, mensaje: Mensaje) -> None:
+        """Enviar un solo mensaje en un hilo aparte para no bloquear el event loop"""
+        await asyncio.to_thread(self.enviar, mensaje)
+
+    async def enviar_lote_async(self, mensajes: list[Mensaje]) -> int:
+        """Enviar varios mensajes en un hilo aparte para no bloquear el event loop"""
+        return await asyncio.to_thread(self.enviar_lote, mensajes)
+
+    @abstractmethod
+    def _enviar_lote(self, mensajes: list[Mensaje]) -> tuple[int, list[tuple[Mensaje, MyAnyError]]]:
+        """Enviar los mensajes, sin detenerse si uno falla, y regresar las solicitudes hechas y los que fallaron"""
+
+    def cerrar(self) -> None:
+        """Liberar los recursos, se llama al terminar la aplicación"""
+
+
+class TransporteSendGrid(TransporteCorreo):
+    """Envía por la API de SendGrid con un cliente HTTP con conexiones persistentes compartido por todo el proceso"""
+
+    nombre = "sendgrid"
+
+    def __init__(self, settings: Settings):
+        super().__init__(settings)
+        self._remitente_email = EmailSendGrid(self._remitente)
+        self._cliente = httpx.Client(
+            headers={"Authorization": f"Bearer {settings.SENDGRID_API_KEY}"},
+            limits=httpx.Limits(
+                max_connections=settings.CORREO_CONCURRENCIA,
+                max_keepalive_connections=settings.CORREO_CONCURRENCIA,
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(TIEMPO_ESPERA, connect=TIEMPO_CONECTAR),
+        )
+
+    def _enviar_lote(self, mensajes: list[Mensaje]) -> tuple[int, list[tuple[Mensaje, MyAnyError]]]:
+        """Los mensajes con el mismo asunto y cuerpo van juntos en una solicitud, con las sustituciones de cada uno"""
+
+        # Agrupar por asunto y cuerpo, o por el html si no tiene etiquetas
+        grupos: dict[tuple[str, str], list[Mensaje]] = {}
+        for mensaje in mensajes:
+            grupos.setdefault((mensaje.subject, mensaje.cuerpo or mensaje.html), []).append(mensaje)
+
+        # Enviar cada grupo en solicitudes de hasta SENDGRID_MAXIMO_PERSONALIZACIONES destinatarios,
+        # cada destinatario en su propia personalización para que no se vean entre sí y con sus propios valores
+        solicitudes = 0
+        fallidos = []
+        for (subject, cuerpo), grupo in grupos.items():
+            for inicio in range(0, len(grupo), SENDGRID_MAXIMO_PERSONALIZACIONES):
+                parte = grupo[inicio : inicio + SENDGRID_MAXIMO_PERSONALIZACIONES]
+                mail = Mail(from_email=self._remitente_email, subject=subject, html_content=Content("text/html", cuerpo))
+                for mensaje in parte:
+                    personalizacion = Personalization()
+                    personalizacion.add_to(To(mensaje.to_email))
+                    if mensaje.cuerpo:
+                        for etiqueta, valor in mensaje.sustituciones:
+                            personalizacion.add_substitution(Substitution(etiqueta, valor))
+                    mail.add_personalization(personalizacion)
+                solicitudes += 1
+                try:
+                    self._publicar(mail.get())
+                except MyAnyError as error:
+                    fallidos.extend((mensaje, error) for mensaje in parte)  # La solicitud falla o pasa completa
+        return solicitudes, fallidos
+
+    def _publicar(self, contenido: dict) -> None:
+        """Hacer la solicitud a SendGrid, sin esperar más de lo que le queda a la solicitud en curso"""
+        tiempo = httpx.Timeout(limitar(TIEMPO_ESPERA), connect=limitar(TIEMPO_CONECTAR))
+        try:
+            respuesta = self._cliente.post(SENDGRID_URL, json=contenido, timeout=tiempo)
+        except httpx.HTTPError as error:
+            raise MyRequestError(f"Error al enviar el mensaje por Sendgrid: {str(error)}") from error
+        if respuesta.status_code >= 400:
+            raise MyRequestError(f"Error al enviar el mensaje por Sendgrid: {respuesta.status_code} {respuesta.text}")
+
+    def cerrar(self) -> None:
+        self._cliente.close()
+
+
+def crear_email_message(remitente: str, mensaje: Mensaje) -> EmailMessage:
+    """Convertir el mensaje a un EmailMessage de la librería estándar"""
+    email_message = EmailMessage()
+    email_message["From"] = remitente
+    email_message["To"] = mensaje.to_email
+    email_message["Subject"] = mensaje.subject
+    email_message.set_content(mensaje.html, subtype="html")
+    return email_message
+
+
+class TransporteSMTP(TransporteCorreo):
+    """Envía por un servidor SMTP, como un relay local, una conexión por lote"""
+
+    nombre = "smtp"
+
+    def __init__(self, settings: Settings):
+        super().__init__(settings)
+        if settings.SMTP_HOST == "":
+            raise MyMissingConfigurationError("Falta SMTP_HOST para el transporte de correo por SMTP")
+        self._host = settings.SMTP_HOST
+        self._port = settings.SMTP_PORT
+
+    def _enviar_lote(self, mensajes: list[Mensaje]) -> tuple[int, list[tuple[Mensaje, MyAnyError]]]:
+        fallidos = []
+        enviados = 0
+        try:
+            with smtplib.SMTP(self._host, self._port, timeout=limitar(TIEMPO_ESPERA)) as smtp:
+                for mensaje in mensajes:
+                    try:
+                        smtp.send_message(crear_email_message(self._remitente, mensaje))
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as error:
+                        fallidos.append((mensaje, MyRequestError(f"Error al enviar el mensaje por SMTP: {str(error)}")))
+                    enviados += 1
+        except (smtplib.SMTPException, OSError) as error:
+            # Sin conexión fallan los que faltaban, el que estaba en curso incluido
+            falla = MyRequestError(f"Error al enviar el mensaje por SMTP: {str(error)}")
+            fallidos.extend((mensaje, falla) for mensaje in mensajes[enviados:])
+        return len(mensajes), fallidos
+
+
+class TransporteArchivo(TransporteCorreo):
+    """Guarda cada mensaje como un archivo .eml en un directorio, para desarrollo y pruebas sin conexión"""
+
+    nombre = "archivo"
+
+    def __init__(self, settings: Settings):
+        super().__init__(settings)
+        self._directorio = Path(settings.CORREO_DIRECTORIO).resolve()
+
+    def _enviar_lote(self, mensajes: list[Mensaje]) -> tuple[int, list[tuple[Mensaje, MyAnyError]]]:
+        fallidos = []
+        for mensaje in mensajes:
+            try:
+                self._directorio.mkdir(parents=True, exist_ok=True)
+                archivo = self._directorio / f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex}.eml"
+                archivo.write_bytes(crear_email_message(self._remitente, mensaje).as_bytes())
+            except OSError as error:
+                fallidos.append((mensaje, MyRequestError(f"Error al guardar el mensaje en {self._directorio}: {error}")))
+        return len(mensajes), fallidos
+
+
+class TransporteMemoria(TransporteCorreo):
+    """Guarda los mensajes en memoria, para benchmarks y pruebas"""
+
+    nombre = "memoria"
+
+    def __init__(self, settings: Settings):
+        super().__init__(settings)
+        self.mensajes: list[Mensaje] = []
+
+    def _enviar_lote(self, mensajes: list[Mensaje]) -> tuple[int, list[tuple[Mensaje, MyAnyError]]]:
+        self.mensajes.extend(mensajes)
+        return 1, []
+
+
+TRANSPORTES = {
+    "archivo": TransporteArchivo,
+    "memoria": TransporteMemoria,
+    "sendgrid": TransporteSendGrid,
+    "smtp": TransporteSMTP,
+}
+
+_transporte: TransporteCorreo | None = None
+_transporte_candado = threading.Lock()
+
+
+def crear_transporte(settings: Settings) -> TransporteCorreo:
+    """Crear el transporte elegido en CORREO_TRANSPORTE"""
+    if settings.CORREO_TRANSPORTE not in TRANSPORTES:
+        raise MyMissingConfigurationError(f"No es válido el transporte de correo {settings.CORREO_TRANSPORTE}")
+    return TRANSPORTES[settings.CORREO_TRANSPORTE](settings)
+
+
+def get_transporte() -> TransporteCorreo:
+    """Transporte compartido por todo el proceso, se crea la primera vez que se usa"""
+    global _transporte
+    with _transporte_candado:
+        if _transporte is None:
+            _transporte = crear_transporte(get_settings())
+        return _transporte
+
+
+def cerrar_transporte() -> None:
+    """Cerrar el transporte compartido"""
+    global _transporte
+    with _transporte_candado:
+        if _transporte is not None:
+            _transporte.cerrar()
+        _transporte = None
@@ -0,0 +1,27 @@
+"""
+Tareas programadas, se ejecutan fuera de la API con python -m
+
+Se importan todos los modelos para que SQLAlchemy pueda resolver las relaciones
+"""
+
+from ..models import (  # noqa: F401
+    autoridades,
+    cit_categorias,
+    cit_citas,
+    cit_clientes,
+    cit_clientes_recuperaciones,
+    cit_clientes_registros,
+    cit_codigos_barras,
+    cit_dias_inhabiles,
+    cit_horas_bloqueadas,
+    cit_idempotencias,
+    cit_oficinas_servicios,
+    cit_salas_espera,
+    cit_servicios,
+    distritos,
+    domicilios,
+    exp_juzgados,
+    materias,
+    oficinas,
+    permisos,
+)
@@ -0,0 +1,74 @@
+"""
+Códigos de acceso pendientes: retomar las citas creadas en modo degradado que aún no tienen su código de acceso
+
+    python -m pjecz_casiopea_api_oauth2.tareas.codigos_acceso [--limite 100]
+
+Se programa cada cinco minutos. Solo toma las citas que la API dejó de intentar, las que no se han tocado
+en más tiempo del que la API espera entre sus intentos, así no se cruza con la tarea en segundo plano de la API.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from ..config.settings import get_settings
+from ..dependencies.control_acceso import crear_cliente_http
+from ..dependencies.database import session_maker
+from ..models.cit_citas import CitCita
+from ..services.codigos_acceso import calcular_espera_diferida, intentar_codigo_acceso
+
+LIMITE = 100
+
+
+async def completar_pendientes(limite: int = LIMITE) -> dict:
+    """Intentar una vez cada cita con código de acceso pendiente, regresa el resumen"""
+    settings = get_settings()
+    espera = timedelta(seconds=calcular_espera_diferida(settings))
+    database = session_maker()
+    try:
+        cit_citas_ids = (
+            database.execute(
+                select(CitCita.id)
+                .where(CitCita.codigo_acceso_pendiente.is_(True))
+                .where(CitCita.modificado < func.now() - espera)
+                .order_by(CitCita.modificado)
+                .limit(limite)
+            )
+            .scalars()
+            .all()
+        )
+    finally:
+        database.close()
+
+    resumen = {"pendientes": len(cit_citas_ids), "completadas": 0, "reintentar": 0}
+    cliente = crear_cliente_http(settings)
+    try:
+        for cit_cita_id in cit_citas_ids:
+            if await intentar_codigo_acceso(cliente, settings, cit_cita_id):
+                resumen["completadas"] += 1
+            else:
+                resumen["reintentar"] += 1
+    finally:
+        await cliente.aclose()
+    return resumen
+
+
+def main() -> None:
+    """Leer los argumentos, completar los códigos de acceso pendientes e imprimir el resumen"""
+    parser = argparse.ArgumentParser(description="Retomar los códigos de acceso pendientes de las citas")
+    parser.add_argument("--limite", type=int, default=LIMITE, help="Citas por ejecución")
+    args = parser.parse_args()
+    inicio = time.perf_counter()
+    resumen = asyncio.run(completar_pendientes(args.limite))
+    print(
+        "Códigos de acceso: "
+        + ", ".join(f"{clave} {valor}" for clave, valor in resumen.items())
+        + f", segundos {time.perf_counter() - inicio:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Mantenimiento nocturno: citas PENDIENTES pasadas a INASISTENCIA, registros y recuperaciones expirados
+respuestas guardadas por Idempotency-Key y turnos usados de la sala de espera expirados
+
+    python -m pjecz_casiopea_api_oauth2.tareas.mantenimiento [--lote 1000] [--pausa 0.05]
+
+Cada UPDATE toma un lote de ids con FOR UPDATE SKIP LOCKED y hace COMMIT, así los candados duran poco
+y no se espera por las filas que la API esté usando, esas se toman en la siguiente ejecución.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import pytz
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from ..config.settings import get_settings
+from ..dependencies.database import session_maker
+from ..models.cit_citas import CitCita
+from ..models.cit_clientes_recuperaciones import CitClienteRecuperacion
+from ..models.cit_clientes_registros import CitClienteRegistro
+from ..models.cit_idempotencias import CitIdempotencia
+from ..models.cit_salas_espera_turnos import CitSalaEsperaTurno
+
+LOTE = 1000
+PAUSA = 0.05  # Segundos entre lotes para dejar pasar a las demás transacciones
+
+
+def actualizar_por_lotes(
+    database: Session, nombre: str, modelo, condiciones: list, valores: dict, lote: int, pausa: float
+) -> int:
+    """Actualizar las filas que cumplan las condiciones de lote en lote, con COMMIT en cada uno, regresa las actualizadas"""
+    ids = select(modelo.id).where(*condiciones).limit(lote).with_for_update(skip_locked=True)
+    sentencia = update(modelo).where(modelo.id.in_(ids.scalar_subquery())).values(**valores, modificado=func.now())
+    total = 0
+    inicio = time.perf_counter()
+    while True:
+        cantidad = database.execute(sentencia, execution_options={"synchronize_session": False}).rowcount
+        database.commit()
+        total += cantidad
+        if cantidad:
+            print(f"{nombre}: {total} actualizados, {total / (time.perf_counter() - inicio):.0f} por segundo")
+        if cantidad < lote:
+            return total
+        time.sleep(pausa)
+
+
+def eliminar_por_lotes(database: Session, nombre: str, modelo, condiciones: list, lote: int, pausa: float) -> int:
+    """Eliminar las filas que cumplan las condiciones de lote en lote, con COMMIT en cada uno, regresa las eliminadas"""
+    ids = select(modelo.id).where(*condiciones).limit(lote).with_for_update(skip_locked=True)
+    sentencia = delete(modelo).where(modelo.id.in_(ids.scalar_subquery()))
+    total = 0
+    inicio = time.perf_counter()
+    while True:
+        cantidad = database.execute(sentencia, execution_options={"synchronize_session": False}).rowcount
+        database.commit()
+        total += cantidad
+        if cantidad:
+            print(f"{nombre}: {total} eliminados, {total / (time.perf_counter() - inicio):.0f} por segundo")
+        if cantidad < lote:
+            return total
+        time.sleep(pausa)
+
+
+def mantener(lote: int = LOTE, pausa: float = PAUSA) -> dict:
+    """Ejecutar todas las actualizaciones, regresa cuántas filas se actualizaron de cada una"""
+    settings = get_settings()
+    ahora = datetime.now(tz=pytz.timezone(settings.TZ)).replace(tzinfo=None)
+    hoy = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+    resumen = {}
+    database = session_maker()
+    try:
+        resumen["inasistencias"] = actualizar_por_lotes(
+            database,
+            "Citas PENDIENTES de días pasados a INASISTENCIA",
+            CitCita,
+            [CitCita.estado == "PENDIENTE", CitCita.estatus == "A", CitCita.inicio < hoy],
+            {"estado": "INASISTENCIA"},
+            lote,
+            pausa,
+        )
+        resumen["registros"] = actualizar_por_lotes(
+            database,
+            "Registros de clientes expirados",
+            CitClienteRegistro,
+            [CitClienteRegistro.estatus == "A", CitClienteRegistro.expiracion < ahora],
+            {"estatus": "B"},
+            lote,
+            pausa,
+        )
+        resumen["recuperaciones"] = actualizar_por_lotes(
+            database,
+            "Recuperaciones de clientes expiradas",
+            CitClienteRecuperacion,
+            [CitClienteRecuperacion.estatus == "A", CitClienteRecuperacion.expiracion < ahora],
+            {"estatus": "B"},
+            lote,
+            pausa,
+        )
+        resumen["idempotencias"] = eliminar_por_lotes(
+            database,
+            "Respuestas guardadas por Idempotency-Key expiradas",
+            CitIdempotencia,
+            [CitIdempotencia.expiracion < func.now()],
+            lote,
+            pausa,
+        )
+        resumen["turnos"] = eliminar_por_lotes(
+            database,
+            "Turnos usados de la sala de espera expirados",
+            CitSalaEsperaTurno,
+            [CitSalaEsperaTurno.expiracion < func.now()],
+            lote,
+            pausa,
+        )
+    finally:
+        database.close()
+    return resumen
+
+
+def main() -> None:
+    """Leer los argumentos, ejecutar el mantenimiento e imprimir el resumen"""
+    parser = argparse.ArgumentParser(
+        description="Mantenimiento nocturno de citas, registros, recuperaciones, idempotencias y turnos"
+    )
+    parser.add_argument("--lote", type=int, default=LOTE, help="Filas por UPDATE")
+    parser.add_argument("--pausa", type=float, default=PAUSA, help="Segundos de espera entre lotes")
+    args = parser.parse_args()
+    inicio = time.perf_counter()
+    resumen = mantener(args.lote, args.pausa)
+    print(
+        "Mantenimiento: "
+        + ", ".join(f"{clave} {valor}" for clave, valor in resumen.items())
+        + f", segundos {time.perf_counter() - inicio:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Particiones mensuales de cit_citas: crear las de los meses siguientes y desprender o archivar las antiguas
+
+    python -m pjecz_casiopea_api_oauth2.tareas.particiones [--meses-adelante 3] [--meses-retener 24] [--archivo-esquema archivo]
+
+Al crear una partición se mueven a ella las citas de ese mes que hayan caído en cit_citas_default.
+Al desprender, la partición se mueve al esquema de archivo, o se elimina con --eliminar.
+"""
+
+import argparse
+import re
+from datetime import date, datetime
+
+import pytz
+from sqlalchemy import Connection, text
+
+from ..config.settings import get_settings
+from ..dependencies.database import engine
+
+TABLA = "cit_citas"
+PARTICION_DEFAULT = f"{TABLA}_default"
+PARTICION_REGEXP = re.compile(rf"^{TABLA}_(\d{{4}})_(\d{{2}})$")
+ESQUEMA_REGEXP = r"^[a-z_][a-z0-9_]*$"
+LOCK_TIMEOUT = "5s"  # No hacer fila detrás de consultas largas, mejor fallar y reintentar otra noche
+
+
+def sumar_meses(mes: date, meses: int) -> date:
+    """Primer día del mes que está a la cantidad de meses dada"""
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(mes: date) -> str:
+    """Nombre de la partición del mes"""
+    return f"{TABLA}_{mes:%Y_%m}"
+
+
+def listar_particiones(conexion: Connection) -> dict[str, date]:
+    """Particiones mensuales de cit_citas y el mes de cada una"""
+    nombres = conexion.execute(
+        text(
+            "SELECT hija.relname FROM pg_inherits"
+            " JOIN pg_class AS hija ON hija.oid = pg_inherits.inhrelid"
+            " WHERE pg_inherits.inhparent = CAST(:tabla AS regclass)"
+        ),
+        {"tabla": TABLA},
+    ).scalars()
+    particiones = {}
+    for nombre in nombres:
+        coincidencia = PARTICION_REGEXP.match(nombre)
+        if coincidencia:
+            particiones[nombre] = date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)
+    return particiones
+
+
+def crear_particion(conexion: Connection, mes: date) -> int:
+    """Crear la partición del mes, moviendo las citas de ese mes que estén en la partición por omisión, regresa las movidas"""
+    nombre = nombre_particion(mes)
+    limites = {"desde": mes, "hasta": sumar_meses(mes, 1)}
+    with conexion.begin():
+        conexion.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        conexion.execute(text(f"CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        movidas = conexion.execute(
+            text(
+                f"WITH movidas AS (DELETE FROM {PARTICION_DEFAULT} WHERE inicio >= :desde AND inicio < :hasta RETURNING *)"
+                f" INSERT INTO {nombre} SELECT * FROM movidas"
+            ),
+            limites,
+        ).rowcount
+        conexion.execute(
+            text(
+                f"ALTER TABLE {TABLA} ATTACH PARTITION {nombre} FOR VALUES FROM ('{limites['desde']}') TO ('{limites['hasta']}')"
+            )
+        )
+    return movidas
+
+
+def desprender_particion(conexion: Connection, nombre: str, archivo_esquema: str | None) -> None:
+    """Desprender la partición de cit_citas y moverla al esquema de archivo, o eliminarla si no hay esquema"""
+    with conexion.begin():
+        conexion.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        conexion.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}"))
+        if archivo_esquema is None:
+            conexion.execute(text(f"DROP TABLE {nombre}"))
+        else:
+            conexion.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archivo_esquema}"))
+            conexion.execute(text(f"ALTER TABLE {nombre} SET SCHEMA {archivo_esquema}"))
+
+
+def mantener_particiones(meses_adelante: int, meses_retener: int, archivo_esquema: str | None) -> dict:
+    """Crear las particiones que falten y desprender las más antiguas que los meses a retener, regresa el resumen"""
+    mes_actual = datetime.now(tz=pytz.timezone(get_settings().TZ)).date().replace(day=1)
+    resumen = {"creadas": [], "citas_movidas": 0, "desprendidas": []}
+    with engine.connect() as conexion:
+        particiones = listar_particiones(conexion)
+        conexion.rollback()
+
+        # Crear las particiones del mes actual y de los meses siguientes que falten
+        for meses in range(meses_adelante + 1):
+            mes = sumar_meses(mes_actual, meses)
+            if nombre_particion(mes) not in particiones:
+                resumen["citas_movidas"] += crear_particion(conexion, mes)
+                resumen["creadas"].append(nombre_particion(mes))
+
+        # Desprender las particiones anteriores al corte, si se pidió retener una cantidad de meses
+        if meses_retener > 0:
+            corte = sumar_meses(mes_actual, -meses_retener)
+            for nombre, mes in sorted(particiones.items(), key=lambda particion: particion[1]):
+                if mes < corte:
+                    desprender_particion(conexion, nombre, archivo_esquema)
+                    resumen["desprendidas"].append(nombre)
+    return resumen
+
+
+def esquema(valor: str) -> str:
+    """Validar el nombre del esquema de archivo, porque va dentro del SQL"""
+    if not re.match(ESQUEMA_REGEXP, valor):
+        raise argparse.ArgumentTypeError(f"No es válido el nombre de esquema {valor}")
+    return valor
+
+
+def main() -> None:
+    """Leer los argumentos, mantener las particiones e imprimir el resumen"""
+    parser = argparse.ArgumentParser(description="Particiones mensuales de cit_citas")
+    parser.add_argument("--meses-adelante", type=int, default=3, help="Meses siguientes con partición")
+    parser.add_argument("--meses-retener", type=int, default=0, help="Meses anteriores a conservar, 0 para no desprender")
+    parser.add_argument("--archivo-esquema", type=esquema, default="archivo", help="Esquema al que se mueven las desprendidas")
+    parser.add_argument("--eliminar", action="store_true", help="Eliminar las desprendidas en lugar de archivarlas")
+    args = parser.parse_args()
+    resumen = mantener_particiones(args.meses_adelante, args.meses_retener, None if args.eliminar else args.archivo_esquema)
+    print(
+        f"Particiones: creadas {', '.join(resumen['creadas']) or 'ninguna'}, citas movidas {resumen['citas_movidas']}, "
+        f"desprendidas {', '.join(resumen['desprendidas']) or 'ninguna'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
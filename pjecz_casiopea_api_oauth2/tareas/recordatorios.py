@@ -0,0 +1,164 @@
+"""
+Recordatorios de las citas PENDIENTES del día siguiente
+
+    python -m pjecz_casiopea_api_oauth2.tareas.recordatorios [--fecha AAAA-MM-DD] [--lote 500]
+
+Las citas se leen con un cursor del lado del servidor, por lotes, y cada lote se envía por el
+transporte de correo mientras se lee el siguiente, así la memoria no crece con la cantidad de citas.
+Cada cita enviada se marca en recordatorio_enviado, al volver a ejecutarla solo se envían las que faltaron o fallaron.
+"""
+
+import argparse
+import logging
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+
+import pytz
+from sqlalchemy import Row, func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..config.settings import get_settings
+from ..dependencies.database import session_maker
+from ..dependencies.exceptions import MyAnyError
+from ..models.cit_citas import CitCita
+from ..models.cit_clientes import CitCliente
+from ..models.cit_servicios import CitServicio
+from ..models.oficinas import Oficina
+from ..services.sendmail import Email, PlantillaCitaRecordatorio
+from ..services.transporte_correo import get_transporte
+
+LOTE = 500
+
+bitacora = logging.getLogger(__name__)
+
+
+def crear_email(fila: Row) -> Email:
+    """Crear el email de recordatorio de una fila de la consulta"""
+    return Email(
+        fila.email,
+        PlantillaCitaRecordatorio(
+            id=str(fila.id),
+            nombre_cliente=f"{fila.nombres} {fila.apellido_primero} {fila.apellido_segundo}",
+            oficina=fila.oficina_descripcion,
+            servicio=fila.cit_servicio_descripcion,
+            fecha_hora_cita=fila.inicio,
+            notas=fila.notas,
+            codigo_qr_url=fila.codigo_acceso_url,
+            codigo_barras_url=fila.codigo_barras_url,
+        ),
+    )
+
+
+def marcar_enviados(cit_citas_ids: list[uuid.UUID], desde: datetime) -> None:
+    """Marcar las citas como recordadas, con el rango de inicio para que solo se toque la partición del día"""
+    if not cit_citas_ids:
+        return
+    database = session_maker()
+    try:
+        database.execute(
+            update(CitCita)
+            .where(CitCita.id.in_(cit_citas_ids))
+            .where(CitCita.inicio >= desde)
+            .where(CitCita.inicio < desde + timedelta(days=1))
+            .values(recordatorio_enviado=func.now())
+        )
+        database.commit()
+    finally:
+        database.close()
+
+
+def enviar_lote(filas: list[Row], desde: datetime) -> tuple[int, int]:
+    """Enviar los recordatorios de un lote, marcar los enviados y registrar cada uno que falle"""
+    mensajes = [crear_email(fila).get_mensaje() for fila in filas]
+    solicitudes, fallidos = get_transporte().enviar_lote_parcial(mensajes)
+    fallidos_ids = {id(mensaje) for mensaje, _ in fallidos}
+    for mensaje, error in fallidos:
+        bitacora.warning("Falló el recordatorio a %s: %s", mensaje.to_email, error)
+    marcar_enviados([fila.id for fila, mensaje in zip(filas, mensajes) if id(mensaje) not in fallidos_ids], desde)
+    return solicitudes, len(fallidos)
+
+
+def enviar_recordatorios(fecha: date, lote: int = LOTE) -> dict:
+    """Enviar los recordatorios de las citas PENDIENTES de la fecha dada, regresa el resumen"""
+    settings = get_settings()
+
+    # Consultar solo las columnas necesarias, sin cargar los objetos en la sesión
+    desde = datetime.combine(fecha, datetime.min.time())
+    consulta = (
+        select(
+            CitCita.id,
+            CitCita.inicio,
+            CitCita.notas,
+            CitCita.codigo_acceso_url,
+            CitCita.codigo_barras_url,
+            CitCliente.nombres,
+            CitCliente.apellido_primero,
+            CitCliente.apellido_segundo,
+            CitCliente.email,
+            CitServicio.descripcion.label("cit_servicio_descripcion"),
+            Oficina.descripcion.label("oficina_descripcion"),
+        )
+        .join(CitCita.cit_cliente)
+        .join(CitCita.cit_servicio)
+        .join(CitCita.oficina)
+        .where(CitCita.estado == "PENDIENTE")
+        .where(CitCita.estatus == "A")
+        .where(CitCita.inicio >= desde)
+        .where(CitCita.inicio < desde + timedelta(days=1))
+        .where(CitCita.recordatorio_enviado.is_(None))
+        .order_by(CitCita.inicio)
+        .execution_options(yield_per=lote)  # Cursor del lado del servidor, de lote en lote
+    )
+
+    resumen = {"citas": 0, "lotes": 0, "solicitudes": 0, "fallidos": 0, "errores": 0}
+    pendientes: set[Future] = set()
+
+    def recoger(terminados: set[Future]) -> None:
+        """Sumar los resultados de los envíos terminados, los errores son de lotes que no se pudieron marcar"""
+        for futuro in terminados:
+            try:
+                solicitudes, fallidos = futuro.result()
+            except (MyAnyError, SQLAlchemyError) as error:
+                bitacora.error("Falló un lote de recordatorios: %s", error)
+                resumen["errores"] += 1
+                continue
+            resumen["solicitudes"] += solicitudes
+            resumen["fallidos"] += fallidos
+
+    inicio = time.perf_counter()
+    database = session_maker()
+    try:
+        with ThreadPoolExecutor(max_workers=settings.CORREO_CONCURRENCIA) as ejecutor:
+            for filas in database.execute(consulta).partitions():
+                resumen["citas"] += len(filas)
+                resumen["lotes"] += 1
+
+                # No tener más lotes en vuelo que envíos simultáneos permitidos
+                if len(pendientes) >= settings.CORREO_CONCURRENCIA:
+                    terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    recoger(terminados)
+                pendientes.add(ejecutor.submit(enviar_lote, filas, desde))
+            recoger(wait(pendientes).done)
+    finally:
+        database.close()
+
+    resumen["segundos"] = round(time.perf_counter() - inicio, 3)
+    resumen["citas_por_segundo"] = round(resumen["citas"] / resumen["segundos"], 1) if resumen["segundos"] else 0.0
+    return resumen
+
+
+def main() -> None:
+    """Leer los argumentos, enviar los recordatorios e imprimir el resumen"""
+    parser = argparse.ArgumentParser(description="Recordatorios de las citas PENDIENTES del día siguiente")
+    parser.add_argument("--fecha", type=date.fromisoformat, help="Fecha de las citas, por defecto mañana")
+    parser.add_argument("--lote", type=int, default=LOTE, help="Citas por lote")
+    args = parser.parse_args()
+    fecha = args.fecha or datetime.now(tz=pytz.timezone(get_settings().TZ)).date() + timedelta(days=1)
+    resumen = enviar_recordatorios(fecha, args.lote)
+    print(f"Recordatorios del {fecha}: " + ", ".join(f"{clave} {valor}" for clave, valor in resumen.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+-- SQL de migración a la versión v1.5.0 para crear la tabla cit_codigos_barras,
+-- la reserva de códigos de barras ya generados y subidos que se asignan al crear una cita.
+
+CREATE TABLE cit_codigos_barras (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    codigo VARCHAR(13) NOT NULL,
+    url VARCHAR(512) NOT NULL,
+    usado BOOLEAN NOT NULL DEFAULT FALSE,
+    creado TIMESTAMP NOT NULL DEFAULT now(),
+    modificado TIMESTAMP NOT NULL DEFAULT now(),
+    estatus CHAR(1) NOT NULL DEFAULT 'A'
+);
+
+-- Crear la restricción para asegurar que nunca se repitan
+ALTER TABLE cit_codigos_barras
+ADD CONSTRAINT cit_codigos_barras_codigo_unique UNIQUE (codigo);
+
+-- Índice parcial con solo los disponibles, para reclamar uno con FOR UPDATE SKIP LOCKED
+CREATE INDEX cit_codigos_barras_disponibles_idx
+ON cit_codigos_barras (creado)
+WHERE usado = FALSE AND estatus = 'A';
@@ -0,0 +1,17 @@
+-- SQL de migración a la versión v1.5.0 para asignar los códigos de barras
+-- desde una secuencia, que se permuta con una llave en la aplicación.
+
+-- Crear la secuencia, cubre los 9 x 10^11 números base de 12 dígitos
+CREATE SEQUENCE cit_codigos_barras_seq
+MINVALUE 0
+MAXVALUE 899999999999
+START WITH 0
+NO CYCLE;
+
+-- Registrar los códigos aleatorios que ya tienen las citas, para que la
+-- inserción con ON CONFLICT DO NOTHING detecte cualquier choque con ellos
+INSERT INTO cit_codigos_barras (codigo, url, usado)
+SELECT codigo_barras, COALESCE(codigo_barras_url, ''), TRUE
+FROM cit_citas
+WHERE codigo_barras IS NOT NULL
+ON CONFLICT (codigo) DO NOTHING;
@@ -0,0 +1,30 @@
+-- SQL de migración a la versión v1.5.0 para crear índices parciales que solo contienen las filas vigentes,
+-- para la tarea de mantenimiento nocturno, los recordatorios y las verificaciones de solicitar.
+-- Se crean con CONCURRENTLY para no bloquear las escrituras, por eso no se deben ejecutar dentro de una transacción.
+
+-- Citas PENDIENTES por fecha de inicio
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cit_citas_pendientes_inicio_idx
+ON cit_citas (inicio)
+WHERE estado = 'PENDIENTE' AND estatus = 'A';
+
+-- Registros de clientes vigentes, por CURP, por email y por expiración
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cit_clientes_registros_vigentes_curp_idx
+ON cit_clientes_registros (curp)
+WHERE estatus = 'A';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cit_clientes_registros_vigentes_email_idx
+ON cit_clientes_registros (email)
+WHERE estatus = 'A';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cit_clientes_registros_vigentes_expiracion_idx
+ON cit_clientes_registros (expiracion)
+WHERE estatus = 'A';
+
+-- Recuperaciones de clientes vigentes, por cliente y por expiración
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cit_clientes_recuperaciones_vigentes_cliente_idx
+ON cit_clientes_recuperaciones (cit_cliente_id)
+WHERE estatus = 'A';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cit_clientes_recuperaciones_vigentes_expiracion_idx
+ON cit_clientes_recuperaciones (expiracion)
+WHERE estatus = 'A';
@@ -0,0 +1,104 @@
+-- SQL de migración a la versión v1.5.0 para particionar cit_citas por mes en inicio.
+-- Las consultas que filtran por un rango de inicio solo leen las particiones de esos meses
+-- y los índices de cada partición se mantienen pequeños. Las particiones futuras se crean
+-- y las antiguas se desprenden con python -m pjecz_casiopea_api_oauth2.tareas.particiones
+-- Ejecutar en una ventana de mantenimiento, se copian todas las citas a la tabla nueva.
+
+BEGIN;
+
+-- Conservar la tabla actual con otro nombre, junto con los nombres de sus índices
+ALTER TABLE cit_citas RENAME TO cit_citas_anterior;
+ALTER INDEX cit_citas_pkey RENAME TO cit_citas_anterior_pkey;
+ALTER INDEX IF EXISTS ix_cit_citas_estado RENAME TO cit_citas_anterior_estado_idx;
+ALTER INDEX IF EXISTS cit_citas_pendientes_inicio_idx RENAME TO cit_citas_anterior_pendientes_inicio_idx;
+ALTER TABLE cit_citas_anterior RENAME CONSTRAINT cit_citas_codigo_barras_unique TO cit_citas_anterior_codigo_barras_unique;
+ALTER TABLE cit_citas_anterior RENAME CONSTRAINT cit_citas_cit_cliente_id_fkey TO cit_citas_anterior_cit_cliente_id_fkey;
+ALTER TABLE cit_citas_anterior RENAME CONSTRAINT cit_citas_cit_servicio_id_fkey TO cit_citas_anterior_cit_servicio_id_fkey;
+ALTER TABLE cit_citas_anterior RENAME CONSTRAINT cit_citas_oficina_id_fkey TO cit_citas_anterior_oficina_id_fkey;
+
+-- Crear la tabla particionada con las mismas columnas
+CREATE TABLE cit_citas (LIKE cit_citas_anterior INCLUDING DEFAULTS) PARTITION BY RANGE (inicio);
+
+-- La llave primaria y los índices únicos de una tabla particionada deben incluir a inicio
+ALTER TABLE cit_citas ADD CONSTRAINT cit_citas_pkey PRIMARY KEY (id, inicio);
+
+-- Ya no puede haber un UNIQUE (codigo_barras) en toda la tabla. La unicidad la garantiza cit_codigos_barras:
+-- cada código de una cita está en cit_codigos_barras, con UNIQUE (codigo), los anteriores desde v1.5.0-02,
+-- y CodigoBarras.reclamar lo toma una sola vez, con usado = FALSE y FOR UPDATE SKIP LOCKED, en la misma
+-- transacción que guarda la cita. Este índice impide repetirlo en el mismo inicio.
+CREATE UNIQUE INDEX cit_citas_codigo_barras_inicio_unique ON cit_citas (codigo_barras, inicio);
+ALTER TABLE cit_citas ADD CONSTRAINT cit_citas_cit_cliente_id_fkey FOREIGN KEY (cit_cliente_id) REFERENCES cit_clientes(id);
+ALTER TABLE cit_citas ADD CONSTRAINT cit_citas_cit_servicio_id_fkey FOREIGN KEY (cit_servicio_id) REFERENCES cit_servicios(id);
+ALTER TABLE cit_citas ADD CONSTRAINT cit_citas_oficina_id_fkey FOREIGN KEY (oficina_id) REFERENCES oficinas(id);
+
+-- Índices, se crean en cada partición
+CREATE INDEX ix_cit_citas_estado ON cit_citas (estado);
+CREATE INDEX cit_citas_oficina_inicio_idx ON cit_citas (oficina_id, inicio);
+CREATE INDEX cit_citas_cit_cliente_inicio_idx ON cit_citas (cit_cliente_id, inicio);
+CREATE INDEX cit_citas_pendientes_inicio_idx ON cit_citas (inicio) WHERE estado = 'PENDIENTE' AND estatus = 'A';
+
+-- Partición por omisión, recibe las citas de los meses que aún no tengan partición
+CREATE TABLE cit_citas_default PARTITION OF cit_citas DEFAULT;
+
+-- Particiones mensuales desde el mes de la primera cita hasta tres meses adelante
+DO $$
+DECLARE
+    mes DATE;
+    ultimo DATE;
+BEGIN
+    SELECT date_trunc('month', COALESCE(min(inicio), now()))::DATE INTO mes FROM cit_citas_anterior;
+    ultimo := (date_trunc('month', now()) + INTERVAL '3 months')::DATE;
+    WHILE mes <= ultimo LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF cit_citas FOR VALUES FROM (%L) TO (%L)',
+            'cit_citas_' || to_char(mes, 'YYYY_MM'),
+            mes,
+            (mes + INTERVAL '1 month')::DATE
+        );
+        mes := (mes + INTERVAL '1 month')::DATE;
+    END LOOP;
+END $$;
+
+-- Copiar las citas
+INSERT INTO cit_citas SELECT * FROM cit_citas_anterior;
+
+-- Registrar otra vez los códigos de las citas, por las que se agendaron con códigos aleatorios
+-- después de v1.5.0-02, así ningún código de una cita queda disponible en la reserva
+INSERT INTO cit_codigos_barras (codigo, url, usado)
+SELECT codigo_barras, COALESCE(codigo_barras_url, ''), TRUE
+FROM cit_citas_anterior
+WHERE codigo_barras IS NOT NULL
+ON CONFLICT (codigo) DO NOTHING;
+UPDATE cit_codigos_barras
+SET usado = TRUE, modificado = now()
+WHERE usado = FALSE AND codigo IN (SELECT codigo_barras FROM cit_citas_anterior WHERE codigo_barras IS NOT NULL);
+
+-- LIKE no copia el dueño ni los permisos, se copian los de la tabla anterior a la tabla y a sus particiones
+DO $$
+DECLARE
+    dueno TEXT;
+    particion TEXT;
+    permiso RECORD;
+BEGIN
+    SELECT pg_get_userbyid(relowner) INTO dueno FROM pg_class WHERE oid = 'cit_citas_anterior'::regclass;
+    EXECUTE format('ALTER TABLE cit_citas OWNER TO %I', dueno);
+    FOR particion IN SELECT inhrelid::regclass::TEXT FROM pg_inherits WHERE inhparent = 'cit_citas'::regclass LOOP
+        EXECUTE format('ALTER TABLE %s OWNER TO %I', particion, dueno);
+    END LOOP;
+    FOR permiso IN
+        SELECT
+            CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(acl.grantee)) END AS rol,
+            acl.privilege_type
+        FROM pg_class, aclexplode(pg_class.relacl) AS acl
+        WHERE pg_class.oid = 'cit_citas_anterior'::regclass AND acl.grantee <> pg_class.relowner
+    LOOP
+        EXECUTE format('GRANT %s ON cit_citas TO %s', permiso.privilege_type, permiso.rol);
+    END LOOP;
+END $$;
+
+COMMIT;
+
+ANALYZE cit_citas;
+
+-- Después de verificar que la API funciona con la tabla particionada
+-- DROP TABLE cit_citas_anterior;
@@ -0,0 +1,41 @@
+-- SQL de migración a la versión v1.5.0 para notificar en el canal cache_invalidacion los cambios en los catálogos,
+-- en cit_dias_inhabiles y en cit_horas_bloqueadas. Cada proceso de la API escucha el canal y descarta sus cachés
+-- en memoria de la tabla que cambió, así ven al momento lo que se edita en el sistema de administración.
+-- Los triggers son por sentencia, una actualización masiva envía una sola notificación.
+
+CREATE OR REPLACE FUNCTION notificar_cache_invalidacion() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- PostgreSQL junta las notificaciones iguales de una misma transacción
+    PERFORM pg_notify('cache_invalidacion', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    tabla text;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY[
+        'autoridades',
+        'cit_categorias',
+        'cit_dias_inhabiles',
+        'cit_horas_bloqueadas',
+        'cit_oficinas_servicios',
+        'cit_servicios',
+        'distritos',
+        'domicilios',
+        'exp_juzgados',
+        'materias',
+        'oficinas'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tabla || '_cache_invalidacion', tabla);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION notificar_cache_invalidacion()',
+            tabla || '_cache_invalidacion',
+            tabla
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,25 @@
+-- SQL de migración a la versión v1.5.0 para crear la tabla cit_idempotencias,
+-- las huellas y respuestas guardadas de las solicitudes con Idempotency-Key de crear cita y solicitar registro.
+
+CREATE TABLE cit_idempotencias (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    alcance VARCHAR(512) NOT NULL,
+    llave VARCHAR(256) NOT NULL,
+    huella VARCHAR(64) NOT NULL,
+    terminado BOOLEAN NOT NULL DEFAULT FALSE,
+    status_code INTEGER,
+    media_type VARCHAR(128),
+    contenido BYTEA,
+    expiracion TIMESTAMP NOT NULL,
+    creado TIMESTAMP NOT NULL DEFAULT now(),
+    modificado TIMESTAMP NOT NULL DEFAULT now(),
+    estatus CHAR(1) NOT NULL DEFAULT 'A'
+);
+
+-- Una sola solicitud por llave en cada alcance, ruta y cliente, sirve para INSERT ... ON CONFLICT
+ALTER TABLE cit_idempotencias
+ADD CONSTRAINT cit_idempotencias_alcance_llave_unique UNIQUE (alcance, llave);
+
+-- Para que la tarea de mantenimiento elimine las expiradas
+CREATE INDEX cit_idempotencias_expiracion_idx
+ON cit_idempotencias (expiracion);
@@ -0,0 +1,40 @@
+-- SQL de migración a la versión v1.5.0 para crear la tabla cit_salas_espera,
+-- los turnos emitidos y la frontera de admitidos de la sala de espera de cada oficina,
+-- y la tabla cit_salas_espera_turnos con los turnos ya usados para agendar.
+-- Para darle a una oficina su propia tasa de admisión, en turnos por segundo:
+-- UPDATE cit_salas_espera SET tasa = 5 WHERE oficina_id = (SELECT id FROM oficinas WHERE clave = 'XXX');
+
+CREATE TABLE cit_salas_espera (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    oficina_id UUID NOT NULL REFERENCES oficinas(id),
+    emitidos INTEGER NOT NULL DEFAULT 0,
+    admitidos DOUBLE PRECISION NOT NULL DEFAULT 0,
+    admitidos_tiempo DOUBLE PRECISION NOT NULL,
+    tasa DOUBLE PRECISION,
+    creado TIMESTAMP NOT NULL DEFAULT now(),
+    modificado TIMESTAMP NOT NULL DEFAULT now(),
+    estatus CHAR(1) NOT NULL DEFAULT 'A'
+);
+
+-- Una sola sala por oficina, sirve para INSERT ... ON CONFLICT al emitir cada turno
+ALTER TABLE cit_salas_espera
+ADD CONSTRAINT cit_salas_espera_oficina_id_unique UNIQUE (oficina_id);
+
+-- Turnos ya usados para agendar una cita, así cada turno admitido agenda una sola
+CREATE TABLE cit_salas_espera_turnos (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    oficina_id UUID NOT NULL REFERENCES oficinas(id),
+    numero INTEGER NOT NULL,
+    expiracion TIMESTAMP NOT NULL,
+    creado TIMESTAMP NOT NULL DEFAULT now(),
+    modificado TIMESTAMP NOT NULL DEFAULT now(),
+    estatus CHAR(1) NOT NULL DEFAULT 'A'
+);
+
+-- Un solo uso por turno de cada oficina, sirve para INSERT ... ON CONFLICT al agendar
+ALTER TABLE cit_salas_espera_turnos
+ADD CONSTRAINT cit_salas_espera_turnos_oficina_id_numero_unique UNIQUE (oficina_id, numero);
+
+-- Para que la tarea de mantenimiento elimine los vencidos
+CREATE INDEX cit_salas_espera_turnos_expiracion_idx
+ON cit_salas_espera_turnos (expiracion);
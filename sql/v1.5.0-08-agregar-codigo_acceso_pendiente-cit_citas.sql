@@ -0,0 +1,14 @@
+-- SQL de migración a la versión v1.5.0 para marcar en cit_citas las citas creadas en modo degradado
+-- a las que les falta el código de acceso, así la tarea codigos_acceso las retoma aunque se reinicie la API.
+-- codigo_acceso_tomado_hasta marca la cita que un intento está trabajando, sin retener un candado de fila.
+-- Programar python -m pjecz_casiopea_api_oauth2.tareas.codigos_acceso cada cinco minutos.
+
+ALTER TABLE cit_citas
+ADD COLUMN codigo_acceso_pendiente BOOLEAN NOT NULL DEFAULT FALSE,
+ADD COLUMN codigo_acceso_intentos INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN codigo_acceso_tomado_hasta TIMESTAMP;
+
+-- Índice parcial con solo las pendientes, casi siempre vacío, se crea en cada partición
+CREATE INDEX cit_citas_codigo_acceso_pendientes_idx
+ON cit_citas (modificado)
+WHERE codigo_acceso_pendiente = TRUE;
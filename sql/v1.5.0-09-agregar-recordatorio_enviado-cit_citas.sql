@@ -0,0 +1,5 @@
+-- SQL de migración a la versión v1.5.0 para registrar en cit_citas cuándo se envió el recordatorio,
+-- así la tarea recordatorios se puede volver a ejecutar el mismo día y solo envía los que faltaron o fallaron.
+
+ALTER TABLE cit_citas
+ADD COLUMN recordatorio_enviado TIMESTAMP;
@@ -0,0 +1,162 @@
+"""
+Pruebas del circuit breaker, el presupuesto de reintentos y su uso con Control Acceso
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from pjecz_casiopea_api_oauth2.config.settings import get_settings
+from pjecz_casiopea_api_oauth2.dependencies import control_acceso, plazos
+from pjecz_casiopea_api_oauth2.dependencies.circuit_breaker import (
+    ABIERTO,
+    CERRADO,
+    SEMIABIERTO,
+    CircuitBreaker,
+    RetryBudget,
+)
+from pjecz_casiopea_api_oauth2.dependencies.exceptions import MyNotValidAnswerError, MyTimeoutError
+
+
+def test_abre_al_llegar_al_umbral():
+    """Se abre tras umbral_fallas fallas seguidas y entonces rechaza"""
+    circuito = CircuitBreaker("prueba", umbral_fallas=3, espera=60)
+    for _ in range(2):
+        circuito.registrar_falla()
+    assert circuito.estado == CERRADO
+    assert circuito.permitir()
+    circuito.registrar_falla()
+    assert circuito.estado == ABIERTO
+    assert not circuito.permitir()
+
+
+def test_exito_reinicia_las_fallas():
+    """Un éxito reinicia el conteo, las fallas deben ser seguidas"""
+    circuito = CircuitBreaker("prueba", umbral_fallas=2, espera=60)
+    circuito.registrar_falla()
+    circuito.registrar_exito()
+    circuito.registrar_falla()
+    assert circuito.estado == CERRADO
+
+
+def test_semiabierto_permite_solo_el_sondeo():
+    """Tras la espera pasa a SEMIABIERTO, permite un sondeo y su resultado cierra o vuelve a abrir"""
+    circuito = CircuitBreaker("prueba", umbral_fallas=1, espera=0.01)
+    circuito.registrar_falla()
+    time.sleep(0.02)
+    assert circuito.estado == SEMIABIERTO
+    assert circuito.permitir()
+    assert not circuito.permitir()
+    circuito.registrar_exito()
+    assert circuito.estado == CERRADO
+
+    # Si el sondeo falla se vuelve a abrir
+    circuito.registrar_falla()
+    time.sleep(0.02)
+    assert circuito.permitir()
+    circuito.registrar_falla()
+    assert circuito.estado == ABIERTO
+
+
+def test_presupuesto_de_reintentos():
+    """Permite el mínimo más la proporción de las solicitudes de la ventana"""
+    presupuesto = RetryBudget("prueba", proporcion=0.5, minimo=1, ventana=60)
+    for _ in range(4):
+        presupuesto.registrar_solicitud()
+    assert [presupuesto.retirar() for _ in range(4)] == [True, True, True, False]
+
+
+def test_presupuesto_se_renueva_con_la_ventana():
+    """Al pasar la ventana se reinician los conteos"""
+    presupuesto = RetryBudget("prueba", proporcion=0.0, minimo=1, ventana=0.01)
+    assert presupuesto.retirar()
+    assert not presupuesto.retirar()
+    time.sleep(0.02)
+    assert presupuesto.retirar()
+
+
+@pytest.fixture
+def circuito_semiabierto(monkeypatch):
+    """Circuito de Control Acceso en SEMIABIERTO, listo para un solo sondeo"""
+    circuito = CircuitBreaker("prueba", umbral_fallas=1, espera=0.01)
+    circuito.registrar_falla()
+    time.sleep(0.02)
+    monkeypatch.setattr(control_acceso, "circuit_breaker", circuito)
+    return circuito
+
+
+def test_sondeo_cancelado_no_queda_retenido(circuito_semiabierto):
+    """Si se cancela el sondeo, por ejemplo por el plazo de la solicitud, cuenta como falla y libera el lugar"""
+
+    async def lento(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    async def probar():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(lento), base_url="http://prueba") as cliente:
+            tarea = asyncio.create_task(control_acceso.solicitar_codigo_acceso_protegido(cliente, get_settings(), {}))
+            await asyncio.sleep(0.01)
+            tarea.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarea
+
+    asyncio.run(probar())
+    assert circuito_semiabierto.estado == ABIERTO
+    time.sleep(0.02)
+    assert circuito_semiabierto.permitir()
+
+
+def test_respuesta_que_no_es_json(circuito_semiabierto):
+    """Una respuesta que no es JSON es MyNotValidAnswerError y el sondeo cierra el circuito porque sí respondió"""
+
+    async def texto(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text="<html>error</html>")
+
+    async def probar():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(texto), base_url="http://prueba") as cliente:
+            with pytest.raises(MyNotValidAnswerError):
+                await control_acceso.solicitar_codigo_acceso_protegido(cliente, get_settings(), {})
+
+    asyncio.run(probar())
+    assert circuito_semiabierto.estado == CERRADO
+
+
+def test_soltar_devuelve_el_sondeo_sin_resultado():
+    """Soltar el sondeo no cierra ni abre el circuito, solo permite otro sondeo"""
+    circuito = CircuitBreaker("prueba", umbral_fallas=1, espera=0.01)
+    circuito.registrar_falla()
+    time.sleep(0.02)
+    assert circuito.permitir()
+    assert not circuito.permitir()
+    circuito.soltar()
+    assert circuito.estado == SEMIABIERTO
+    assert circuito.permitir()
+
+
+def test_espera_recortada_por_el_plazo(circuito_semiabierto):
+    """Con plazo, los intentos usan la fracción de lo que queda y agotarse así no cuenta como falla del sondeo"""
+    esperas = []
+
+    async def colgado(request: httpx.Request) -> httpx.Response:
+        espera = request.extensions["timeout"]["read"]
+        esperas.append(espera)
+        await asyncio.sleep(espera)
+        raise httpx.ReadTimeout("Sin respuesta", request=request)
+
+    async def probar():
+        token = plazos._plazo.set(plazos.Plazo(time.monotonic() + 0.4))
+        try:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(colgado), base_url="http://prueba") as cliente:
+                with pytest.raises(MyTimeoutError):
+                    await control_acceso.solicitar_codigo_acceso_protegido(cliente, get_settings(), {})
+            return plazos.restante()
+        finally:
+            plazos._plazo.reset(token)
+
+    queda = asyncio.run(probar())
+    assert len(esperas) == 1 and esperas[0] <= 0.4 * control_acceso.FRACCION_PLAZO
+    assert queda > 0.1  # Queda tiempo para agendar en modo degradado
+    assert circuito_semiabierto.estado == SEMIABIERTO
+    assert circuito_semiabierto.permitir()
@@ -0,0 +1,79 @@
+"""
+Pruebas de la permutación de los números de los códigos de barras
+"""
+
+import pytest
+
+from pjecz_casiopea_api_oauth2.services.codigo_barras import (
+    BASE_12_CANTIDAD,
+    BASE_12_MINIMO,
+    CodigoBarras,
+    es_ean13_valido,
+    firmar_imagen,
+    permutar,
+)
+
+LLAVE = b"llave-de-prueba"
+
+
+def test_permutar_sin_repetir_y_en_rango():
+    """Números consecutivos dan resultados distintos y dentro de los 12 dígitos base"""
+    resultados = [permutar(numero, LLAVE) for numero in range(20000)]
+    assert len(set(resultados)) == len(resultados)
+    assert all(0 <= resultado < BASE_12_CANTIDAD for resultado in resultados)
+
+
+def test_permutar_en_el_extremo_superior():
+    """Los últimos números del rango también quedan dentro y sin repetir, gracias al cycle-walking"""
+    numeros = range(BASE_12_CANTIDAD - 5000, BASE_12_CANTIDAD)
+    resultados = {permutar(numero, LLAVE) for numero in numeros}
+    assert len(resultados) == len(numeros)
+    assert all(0 <= resultado < BASE_12_CANTIDAD for resultado in resultados)
+
+
+def test_permutar_es_determinista_y_depende_de_la_llave():
+    """La misma llave da siempre el mismo resultado y otra llave da otro"""
+    assert permutar(12345, LLAVE) == permutar(12345, LLAVE)
+    assert [permutar(numero, LLAVE) for numero in range(10)] != [permutar(numero, b"otra-llave") for numero in range(10)]
+
+
+def test_permutar_dispersa_los_consecutivos():
+    """Dos consecutivos no quedan cerca, el código no es predecible"""
+    distancias = [abs(permutar(numero + 1, LLAVE) - permutar(numero, LLAVE)) for numero in range(100)]
+    assert min(distancias) > 1000
+
+
+@pytest.mark.parametrize(
+    "base_12, digito",
+    [
+        ("400638133393", "1"),
+        ("590123412345", "7"),
+        ("978014300723", "4"),
+        ("750103131130", "9"),
+        ("123456789012", "8"),
+    ],
+)
+def test_digito_verificador(base_12, digito):
+    """El dígito 13 calculado coincide con el de códigos EAN-13 conocidos y el resultado es válido"""
+    assert CodigoBarras._calcular_digito_verificador_ean13(base_12) == digito
+    assert es_ean13_valido(base_12 + digito)
+
+
+def test_digito_verificador_incorrecto():
+    """Con cualquier otro dígito 13 el código no es válido"""
+    base_12 = str(BASE_12_MINIMO + permutar(1, LLAVE))
+    digito = CodigoBarras._calcular_digito_verificador_ean13(base_12)
+    assert all(not es_ean13_valido(base_12 + otro) for otro in "0123456789" if otro != digito)
+
+
+def test_firmar_imagen():
+    """La firma es la misma para la misma imagen y cambia con el código, el formato, los dpi o la llave"""
+    firma = firmar_imagen("4006381333931", "png", 300, "llave")
+    assert firma == firmar_imagen("4006381333931", "png", 300, "llave")
+    otras = [
+        firmar_imagen("5901234123457", "png", 300, "llave"),
+        firmar_imagen("4006381333931", "png_compacto", 300, "llave"),
+        firmar_imagen("4006381333931", "png", 3000, "llave"),
+        firmar_imagen("4006381333931", "png", 300, "otra-llave"),
+    ]
+    assert firma not in otras
@@ -0,0 +1,38 @@
+"""
+Pruebas de la elección de la codificación según el Accept-Encoding
+"""
+
+import pytest
+
+from pjecz_casiopea_api_oauth2.dependencies.compresion import calidades_codificacion, elegir_codificacion
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, esperada",
+    [
+        (None, None),
+        ("", None),
+        ("identity", None),
+        ("deflate", None),
+        ("gzip", "gzip"),
+        ("GZIP", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br; q=0.8, gzip;q=0.8", "br"),
+        ("gzip;q=0.9, br;q=1.0", "br"),
+        ("br;q=0, gzip;q=0", None),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+        ("*;q=0", None),
+        ("gzip;q=abc", None),
+    ],
+)
+def test_elegir_codificacion(accept_encoding, esperada):
+    """La de mayor calidad, br si empatan, q=0 la rechaza y * cubre las que no se mencionan"""
+    assert elegir_codificacion(accept_encoding) == esperada
+
+
+def test_calidades_codificacion():
+    """Sin q la calidad es 1, con espacios y mayúsculas, y una q inválida cuenta como 0"""
+    assert calidades_codificacion(" Br ; q=0.3 ,gzip,, x;q=mal") == {"br": 0.3, "gzip": 1.0, "x": 0.0}
@@ -0,0 +1,96 @@
+"""
+Pruebas del ajuste del límite adaptativo de concurrencia
+"""
+
+import pytest
+
+from pjecz_casiopea_api_oauth2.dependencies.concurrencia import FACTOR_REDUCCION, LimiteAdaptativo
+
+OBJETIVO = 1.0
+
+
+class Reloj:
+    """Reloj monotónico que solo avanza cuando la prueba lo pide"""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+@pytest.fixture
+def reloj():
+    """Reloj controlado que se pasa al límite, sin cambiar time.monotonic"""
+    return Reloj()
+
+
+def crear_limite(reloj: Reloj, en_curso: int = 5) -> LimiteAdaptativo:
+    """Límite de 10 con máximo de 20, con el reloj y las solicitudes en curso dadas"""
+    limite = LimiteAdaptativo("prueba", maximo=20, objetivo=OBJETIVO, minimo=2, reloj=reloj)
+    limite.en_curso = en_curso
+    return limite
+
+
+def test_crece_uno_por_ronda(reloj):
+    """Cada solicitud a tiempo suma 1/limite, una ronda completa sube el límite en casi uno"""
+    limite = crear_limite(reloj, en_curso=10)
+    assert limite.limite == 10.0
+    for _ in range(10):
+        limite.ajustar(OBJETIVO / 2, fallo=False)
+    assert 10.9 < limite.limite < 11.0
+
+
+def test_no_crece_si_no_se_usa(reloj):
+    """Con menos de la mitad del límite en curso no sube"""
+    limite = crear_limite(reloj, en_curso=4)
+    limite.ajustar(OBJETIVO / 2, fallo=False)
+    assert limite.limite == 10.0
+
+
+def test_no_pasa_del_maximo(reloj):
+    """Por más solicitudes a tiempo que terminen se queda en el máximo"""
+    limite = crear_limite(reloj, en_curso=20)
+    for _ in range(1000):
+        limite.ajustar(OBJETIVO / 2, fallo=False)
+    assert limite.limite == 20.0
+
+
+@pytest.mark.parametrize("segundos, fallo", [(OBJETIVO * 2, False), (OBJETIVO / 2, True)])
+def test_lenta_o_fallida_reduce(reloj, segundos, fallo):
+    """Una solicitud que tarda más que el objetivo, o que falla aunque sea rápida, multiplica por FACTOR_REDUCCION"""
+    limite = crear_limite(reloj)
+    limite.ajustar(segundos, fallo)
+    assert limite.limite == pytest.approx(10.0 * FACTOR_REDUCCION)
+
+
+def test_una_reduccion_por_objetivo(reloj):
+    """Una ráfaga de lentas dentro del mismo objetivo reduce una sola vez, pasado el objetivo vuelve a reducir"""
+    limite = crear_limite(reloj)
+    for _ in range(50):
+        limite.ajustar(OBJETIVO * 2, fallo=False)
+    assert limite.limite == pytest.approx(10.0 * FACTOR_REDUCCION)
+    reloj.ahora += OBJETIVO / 2
+    limite.ajustar(OBJETIVO * 2, fallo=True)
+    assert limite.limite == pytest.approx(10.0 * FACTOR_REDUCCION)
+    reloj.ahora += OBJETIVO / 2
+    limite.ajustar(OBJETIVO * 2, fallo=False)
+    assert limite.limite == pytest.approx(10.0 * FACTOR_REDUCCION**2)
+
+
+def test_no_baja_del_minimo(reloj):
+    """Las reducciones se detienen en el mínimo"""
+    limite = crear_limite(reloj)
+    for _ in range(100):
+        reloj.ahora += OBJETIVO
+        limite.ajustar(OBJETIVO * 2, fallo=True)
+    assert limite.limite == 2.0
+
+
+def test_la_lenta_no_suma(reloj):
+    """Una solicitud lenta dentro del periodo sin reducción tampoco hace crecer el límite"""
+    limite = crear_limite(reloj)
+    limite.ajustar(OBJETIVO * 2, fallo=False)
+    reducido = limite.limite
+    limite.ajustar(OBJETIVO * 2, fallo=False)
+    assert limite.limite == reducido
@@ -0,0 +1,56 @@
+"""
+Pruebas del ETag y el GET condicional
+"""
+
+import pytest
+from fastapi import Response
+
+from pjecz_casiopea_api_oauth2.dependencies.etag import coincide_etag, crear_etag, responder_etag
+
+ETAG = '"abc"'
+
+
+@pytest.mark.parametrize(
+    "if_none_match, esperado",
+    [
+        (None, False),
+        ('"abc"', True),
+        ('"otro"', False),
+        ("*", True),
+        (" * ", True),
+        ('"uno", "abc" ,"dos"', True),
+        ('"uno","dos"', False),
+        ('W/"abc"', True),
+        ("abc", False),
+        ('"ab"', False),
+        ("", False),
+    ],
+)
+def test_coincide_etag(if_none_match, esperado):
+    """Lista separada por comas, comodín y comparación débil del RFC 9110"""
+    assert coincide_etag(if_none_match, ETAG) is esperado
+
+
+def test_coincide_etag_debil_contra_fuerte():
+    """Un ETag débil de la respuesta, por ejemplo tras comprimirla, coincide con el fuerte que tiene el cliente"""
+    assert coincide_etag('"abc"', 'W/"abc"')
+    assert coincide_etag('W/"abc"', 'W/"abc"')
+
+
+def test_crear_etag():
+    """Es fuerte, entre comillas y cambia con cualquiera de las partes"""
+    etag = crear_etag("catalogo", "1")
+    assert etag.startswith('"') and etag.endswith('"') and len(etag) == 34
+    assert etag == crear_etag("catalogo", "1")
+    assert etag != crear_etag("catalogo", "2")
+
+
+def test_responder_etag():
+    """304 sin cuerpo si coincide, si no agrega el ETag y el Cache-Control a la respuesta"""
+    response = Response()
+    assert responder_etag(response, '"otro"', ETAG) is None
+    assert response.headers["ETag"] == ETAG
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    no_modificado = responder_etag(Response(), ETAG, ETAG)
+    assert no_modificado.status_code == 304
+    assert no_modificado.headers["ETag"] == ETAG
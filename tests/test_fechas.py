@@ -0,0 +1,52 @@
+"""
+Pruebas de las fechas en español
+"""
+
+from datetime import datetime
+
+import pytest
+
+from pjecz_casiopea_api_oauth2.dependencies.fechas import MESES, formatear_fecha
+
+FORMATO_FECHA_Y_HORA = "%d de %B del %Y a las %I:%M %p"
+
+
+def test_formato_de_los_correos():
+    """El formato de las plantillas de correo queda en español"""
+    assert formatear_fecha(datetime(2026, 9, 18, 10, 15), FORMATO_FECHA_Y_HORA) == "18 de septiembre del 2026 a las 10:15 a. m."
+
+
+@pytest.mark.parametrize("mes", range(1, 13))
+def test_todos_los_meses(mes):
+    """Cada mes con su nombre completo y abreviado"""
+    fecha = datetime(2026, mes, 1)
+    assert formatear_fecha(fecha, "%B") == MESES[mes - 1]
+    assert formatear_fecha(fecha, "%b") == MESES[mes - 1][:3]
+
+
+def test_dias_de_la_semana():
+    """Del lunes 5 de enero al domingo 11 de enero del 2026, con acentos"""
+    nombres = [formatear_fecha(datetime(2026, 1, dia), "%A %a") for dia in range(5, 12)]
+    assert nombres == [
+        "lunes lun",
+        "martes mar",
+        "miércoles mié",
+        "jueves jue",
+        "viernes vie",
+        "sábado sáb",
+        "domingo dom",
+    ]
+
+
+@pytest.mark.parametrize(
+    "hora, esperado",
+    [(0, "12 a. m."), (11, "11 a. m."), (12, "12 p. m."), (23, "11 p. m.")],
+)
+def test_a_m_y_p_m(hora, esperado):
+    """Medianoche y mediodía quedan del lado correcto"""
+    assert formatear_fecha(datetime(2026, 1, 1, hora), "%I %p") == esperado
+
+
+def test_porcentaje_literal_y_directivas_sin_locale():
+    """%% sigue siendo un porcentaje literal y las demás directivas las resuelve strftime"""
+    assert formatear_fecha(datetime(2026, 3, 4, 5, 6), "%%B %Y-%m-%d %H:%M") == "%B 2026-03-04 05:06"
@@ -0,0 +1,62 @@
+"""
+Pruebas de la frontera de admitidos y la posición en la sala de espera
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from pjecz_casiopea_api_oauth2.dependencies import sala_espera
+from pjecz_casiopea_api_oauth2.dependencies.sala_espera import Estado, calcular_posicion
+
+RAFAGA = 10
+TIEMPO = 1000.0
+
+
+def crear_estado(emitidos: int = 500, admitidos: float = 100.0, tasa: float = 5.0) -> Estado:
+    """Sala con la frontera en admitidos al momento TIEMPO"""
+    return Estado(emitidos=emitidos, admitidos=admitidos, admitidos_tiempo=TIEMPO, tasa=tasa)
+
+
+@pytest.mark.parametrize(
+    "segundos, esperada",
+    [
+        (0.0, 100.0),
+        (1.0, 105.0),
+        (2.5, 112.5),
+        (-30.0, 100.0),  # Con el reloj atrás la frontera no retrocede
+    ],
+)
+def test_frontera_avanza_a_la_tasa(segundos, esperada):
+    """La frontera avanza tasa turnos por segundo desde admitidos_tiempo"""
+    assert crear_estado().frontera(RAFAGA, TIEMPO + segundos) == pytest.approx(esperada)
+
+
+def test_frontera_no_pasa_de_los_emitidos_mas_la_rafaga():
+    """Sin fila la frontera se queda en los emitidos más la ráfaga, por más tiempo que pase"""
+    estado = crear_estado(emitidos=120)
+    assert estado.frontera(RAFAGA, TIEMPO + 3600) == 130
+    assert estado.frontera(0, TIEMPO + 3600) == 120
+
+
+def test_frontera_adelantada_se_recorta():
+    """Si la frontera guardada ya rebasa los emitidos más la ráfaga, se recorta a ese tope"""
+    assert crear_estado(emitidos=50, admitidos=100.0).frontera(RAFAGA, TIEMPO) == 60
+
+
+@pytest.mark.parametrize(
+    "numero, segundos, esperada",
+    [
+        (100, 0.0, (0, 0)),
+        (90, 0.0, (0, 0)),
+        (101, 0.0, (1, 1)),
+        (112, 0.0, (12, 3)),
+        (112, 2.0, (2, 1)),
+        (112, 3.0, (0, 0)),
+    ],
+)
+def test_calcular_posicion(monkeypatch, numero, segundos, esperada):
+    """Turnos que faltan hasta la frontera y segundos estimados a la tasa, redondeados hacia arriba"""
+    monkeypatch.setattr(sala_espera.time, "time", lambda: TIEMPO + segundos)
+    settings = SimpleNamespace(SALA_ESPERA_RAFAGA=RAFAGA)
+    assert calcular_posicion(numero, crear_estado(), settings) == esperada
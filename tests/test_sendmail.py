@@ -0,0 +1,78 @@
+"""
+Pruebas de las plantillas de correo renderizadas desde varios hilos
+"""
+
+import dataclasses
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from pjecz_casiopea_api_oauth2.services.sendmail import PlantillaCitaCreada, PlantillaCitaRecordatorio
+
+CANTIDAD = 2000
+HILOS = 16
+FECHA_ENVIO = datetime(2026, 1, 1, 8, 0)
+
+
+def crear_plantilla(clase, numero: int):
+    """Plantilla con datos únicos del cliente número dado, cada dato lleva la marca cliente-NNNN"""
+    marca = f"cliente-{numero:04d}"
+    return clase(
+        id=f"{marca}-id",
+        nombre_cliente=f"{marca}-nombre",
+        oficina=f"{marca}-oficina",
+        servicio=f"{marca}-servicio",
+        fecha_hora_cita=datetime(2026, 1, 1, 9, 0) + timedelta(days=numero),
+        notas=f"{marca}-notas",
+        codigo_qr_url=f"https://qr/{marca}.png",
+        codigo_barras_url=f"https://barras/{marca}.png",
+    )
+
+
+@pytest.mark.parametrize("clase", [PlantillaCitaCreada, PlantillaCitaRecordatorio])
+def test_hilos_no_mezclan_datos_de_clientes(clase):
+    """Cada contenido renderizado en paralelo tiene todos los datos de su cliente y ninguno de otro"""
+    plantillas = [crear_plantilla(clase, numero) for numero in range(CANTIDAD)]
+    with ThreadPoolExecutor(max_workers=HILOS) as ejecutor:
+        contenidos = list(ejecutor.map(lambda plantilla: plantilla.get_contenido(FECHA_ENVIO).content, plantillas))
+
+    for numero, (plantilla, contenido) in enumerate(zip(plantillas, contenidos)):
+        assert set(re.findall(r"cliente-\d{4}", contenido)) == {f"cliente-{numero:04d}"}
+        for valor in (plantilla.id, plantilla.nombre_cliente, plantilla.oficina, plantilla.servicio, plantilla.notas):
+            assert valor in contenido
+        assert plantilla.codigo_qr_url in contenido
+        assert plantilla.codigo_barras_url in contenido
+
+
+def test_misma_instancia_desde_varios_hilos():
+    """Una sola instancia renderizada desde varios hilos da siempre el mismo contenido"""
+    plantilla = crear_plantilla(PlantillaCitaCreada, 7)
+    with ThreadPoolExecutor(max_workers=HILOS) as ejecutor:
+        contenidos = set(ejecutor.map(lambda _: plantilla.get_contenido(FECHA_ENVIO).content, range(CANTIDAD)))
+    assert len(contenidos) == 1
+
+
+@pytest.mark.parametrize("clase", [PlantillaCitaCreada, PlantillaCitaRecordatorio])
+def test_cuerpo_compartido_con_sustituciones(clase):
+    """Varios clientes comparten el cuerpo con etiquetas y sus sustituciones vuelven a dar su propio HTML"""
+    cuerpos = set()
+    for numero in range(20):
+        html, cuerpo, sustituciones = crear_plantilla(clase, numero).get_contenido_y_sustituciones(FECHA_ENVIO)
+        assert "cliente-" not in cuerpo
+        for etiqueta, valor in sustituciones:
+            cuerpo = cuerpo.replace(etiqueta, valor)
+        assert cuerpo == html
+        cuerpos.add(crear_plantilla(clase, numero).get_contenido_y_sustituciones(FECHA_ENVIO)[1])
+    assert len(cuerpos) == 1
+
+
+def test_sin_codigo_qr_es_otro_cuerpo():
+    """Los valores que cambian la estructura de la plantilla, como no tener código QR, dan otro cuerpo"""
+    con_qr = crear_plantilla(PlantillaCitaCreada, 1)
+    sin_qr = dataclasses.replace(crear_plantilla(PlantillaCitaCreada, 2), codigo_qr_url="")
+    _, cuerpo_con_qr, _ = con_qr.get_contenido_y_sustituciones(FECHA_ENVIO)
+    html, cuerpo_sin_qr, sustituciones = sin_qr.get_contenido_y_sustituciones(FECHA_ENVIO)
+    assert cuerpo_con_qr != cuerpo_sin_qr
+    assert "%codigo_qr_url%" not in dict(sustituciones)
@@ -0,0 +1,93 @@
+"""
+Pruebas del transporte de correos por SendGrid
+"""
+
+import json
+from datetime import datetime
+
+import httpx
+import pytest
+
+from pjecz_casiopea_api_oauth2.config.settings import get_settings
+from pjecz_casiopea_api_oauth2.dependencies.exceptions import MyRequestError
+from pjecz_casiopea_api_oauth2.services.sendmail import PlantillaCitaRecordatorio
+from pjecz_casiopea_api_oauth2.services.transporte_correo import Mensaje, TransporteSendGrid
+
+FECHA_ENVIO = datetime(2026, 1, 1, 8, 0)
+
+
+def crear_mensaje(numero: int) -> Mensaje:
+    """Mensaje de recordatorio del cliente número dado, con su cuerpo compartido y sus sustituciones"""
+    plantilla = PlantillaCitaRecordatorio(
+        id=f"id-{numero}",
+        nombre_cliente=f"Cliente {numero}",
+        oficina="Oficina",
+        servicio="Servicio",
+        fecha_hora_cita=datetime(2026, 1, 2, 9, numero % 60),
+        notas=f"Notas {numero}",
+        codigo_qr_url=f"https://qr/{numero}.png",
+        codigo_barras_url=f"https://barras/{numero}.png",
+    )
+    html, cuerpo, sustituciones = plantilla.get_contenido_y_sustituciones(FECHA_ENVIO)
+    return Mensaje(f"cliente{numero}@ejemplo.mx", plantilla.subject, html, cuerpo, sustituciones)
+
+
+def crear_transporte(solicitudes: list[dict]) -> TransporteSendGrid:
+    """Transporte de SendGrid que guarda las solicitudes en lugar de hacerlas"""
+
+    def guardar(request: httpx.Request) -> httpx.Response:
+        solicitudes.append(json.loads(request.content))
+        return httpx.Response(202)
+
+    transporte = TransporteSendGrid(get_settings())
+    transporte._cliente = httpx.Client(transport=httpx.MockTransport(guardar))
+    return transporte
+
+
+def test_una_solicitud_con_muchos_destinatarios():
+    """Los recordatorios de distintos clientes van en una sola solicitud, cada uno con sus sustituciones"""
+    solicitudes = []
+    mensajes = [crear_mensaje(numero) for numero in range(50)]
+    assert crear_transporte(solicitudes).enviar_lote(mensajes) == 1
+    assert len(solicitudes) == 1
+
+    # Cada personalización reconstruye el HTML de su destinatario sobre el cuerpo compartido
+    cuerpo = solicitudes[0]["content"][0]["value"]
+    personalizaciones = {p["to"][0]["email"]: p for p in solicitudes[0]["personalizations"]}
+    assert len(personalizaciones) == len(mensajes)
+    for mensaje in mensajes:
+        personalizacion = personalizaciones[mensaje.to_email]
+        assert len(personalizacion["to"]) == 1
+        html = cuerpo
+        for etiqueta, valor in personalizacion["substitutions"].items():
+            html = html.replace(etiqueta, valor)
+        assert html == mensaje.html
+
+
+def test_mensajes_sin_cuerpo_se_agrupan_por_html():
+    """Sin cuerpo con etiquetas se agrupan solo los de contenido idéntico y no llevan sustituciones"""
+    solicitudes = []
+    mensajes = [Mensaje(f"cliente{numero}@ejemplo.mx", "Aviso", "<p>Aviso</p>") for numero in range(3)]
+    mensajes.append(Mensaje("otro@ejemplo.mx", "Aviso", "<p>Otro</p>"))
+    assert crear_transporte(solicitudes).enviar_lote(mensajes) == 2
+    assert sorted(len(solicitud["personalizations"]) for solicitud in solicitudes) == [1, 3]
+    assert all("substitutions" not in p for solicitud in solicitudes for p in solicitud["personalizations"])
+
+
+def test_falla_de_una_solicitud_no_detiene_las_demas():
+    """Si falla la solicitud de un grupo se regresan solo sus mensajes y los demás grupos se envían"""
+    solicitudes = []
+
+    def responder(request: httpx.Request) -> httpx.Response:
+        contenido = json.loads(request.content)
+        solicitudes.append(contenido)
+        return httpx.Response(500 if contenido["content"][0]["value"] == "<p>Falla</p>" else 202)
+
+    transporte = TransporteSendGrid(get_settings())
+    transporte._cliente = httpx.Client(transport=httpx.MockTransport(responder))
+    mensajes = [Mensaje("uno@ejemplo.mx", "Aviso", "<p>Falla</p>"), Mensaje("dos@ejemplo.mx", "Aviso", "<p>Bien</p>")]
+    enviadas, fallidos = transporte.enviar_lote_parcial(mensajes)
+    assert enviadas == len(solicitudes) == 2
+    assert [mensaje.to_email for mensaje, _ in fallidos] == ["uno@ejemplo.mx"]
+    with pytest.raises(MyRequestError):
+        transporte.enviar_lote(mensajes)